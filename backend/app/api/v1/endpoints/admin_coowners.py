@@ -47,7 +47,7 @@ async def get_my_coowners(
     try:
         # Verificar que el usuario actual sea administrador
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol != 2:  # 2: Administrador
             raise HTTPException(
@@ -153,7 +153,7 @@ async def get_coowner_details(
     """
     try:
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol != 2:
             raise HTTPException(
@@ -219,7 +219,7 @@ async def update_coowner(
     """
     try:
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol != 2:
             raise HTTPException(
@@ -293,7 +293,7 @@ async def enable_coowner(
     """
     try:
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol != 2:
             raise HTTPException(
@@ -368,7 +368,7 @@ async def disable_coowner(
     """
     try:
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol != 2:
             raise HTTPException(
@@ -426,7 +426,7 @@ async def enable_all_coowners(
     """
     try:
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol != 2:
             raise HTTPException(
@@ -484,7 +484,7 @@ async def resend_coowner_credentials(
     """
     try:
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol != 2:
             raise HTTPException(
@@ -547,7 +547,7 @@ async def send_bulk_credentials(
     """
     try:
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol != 2:
             raise HTTPException(
@@ -684,7 +684,7 @@ async def toggle_coowners_access_bulk(
 ):
     try:
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol != 2:
             raise HTTPException(
@@ -750,7 +750,7 @@ async def delete_coowners_bulk(
     db: AsyncSession = Depends(get_db)
 ):
     user_service = UserService(db)
-    user = await user_service.get_user_by_username(current_user)
+    user = await user_service.get_principal_by_username(current_user)
 
     if not user or user.int_id_rol not in [1, 2]:
         raise HTTPException(status_code=403, detail="Sin permisos")
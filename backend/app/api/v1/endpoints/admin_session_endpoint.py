@@ -6,7 +6,7 @@ from pydantic import BaseModel
 from app.core.database import get_db
 from app.services.session_service import SessionService
 from app.auth.auth import get_current_user_obj
-from app.models.user_model import UserModel
+from app.auth.principal import AuthenticatedPrincipal
 from app.schemas.responses_schema import SuccessResponse
 from app.core.logging_config import get_logger
 
@@ -29,7 +29,7 @@ class SessionDeactivateResponse(BaseModel):
 async def admin_deactivate_user_sessions(
     user_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: UserModel = Depends(get_current_user_obj)
+    current_user: AuthenticatedPrincipal = Depends(get_current_user_obj)
 ):
     """
     Desactiva todas las sesiones de un usuario específico
@@ -75,7 +75,7 @@ async def admin_deactivate_user_session(
     user_id: int,
     session_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: UserModel = Depends(get_current_user_obj)
+    current_user: AuthenticatedPrincipal = Depends(get_current_user_obj)
 ):
     """
     Desactiva una sesión específica de un usuario
@@ -121,7 +121,7 @@ async def admin_deactivate_user_session(
 async def admin_get_user_sessions(
     user_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: UserModel = Depends(get_current_user_obj)
+    current_user: AuthenticatedPrincipal = Depends(get_current_user_obj)
 ):
     """
     Obtiene las sesiones activas de un usuario específico
@@ -15,6 +15,7 @@ from app.services.meeting_invitation_service import MeetingInvitationService
 from app.services.user_service import UserService
 from app.services.residential_unit_service import ResidentialUnitService
 from app.core.database import get_db
+from app.core.security import rate_limit
 from app.core.exceptions import ServiceException
 from app.services.pool_service import PollService
 
@@ -53,7 +54,7 @@ async def upload_invitations_excel(
     try:
         # Verificar que el usuario actual sea administrador
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         
         if not user or user.int_id_rol not in [1, 2]:  # 1: Super Admin, 2: Admin
             raise HTTPException(
@@ -121,7 +122,7 @@ async def create_invitation(
     """Crea una invitación individual"""
     try:
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         
         if not user:
             raise HTTPException(
@@ -410,7 +411,7 @@ async def create_batch_invitations(
     """
     try:
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         
         if not user:
             raise HTTPException(
@@ -474,7 +475,7 @@ async def get_admin_active_meetings(
     """
     try:
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         
         if not user:
             raise HTTPException(
@@ -566,7 +567,7 @@ async def get_admin_active_meeting_details(
     """
     try:
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         
         if not user:
             raise HTTPException(
@@ -720,7 +721,7 @@ async def get_meeting_in_progress(
     """
     try:
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         
         if not user:
             raise HTTPException(
@@ -803,7 +804,7 @@ async def close_user_session(
     """
     try:
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         
         if not user:
             raise HTTPException(
@@ -875,7 +876,7 @@ async def mark_user_absent(
 ):
     try:
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         if not user or user.int_id_rol not in (1, 2):
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Sin permisos")
 
@@ -908,7 +909,7 @@ async def unmark_user_absent(
 ):
     try:
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         if not user or user.int_id_rol not in (1, 2):
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Sin permisos")
 
@@ -946,6 +947,7 @@ async def unmark_user_absent(
     summary="Reporte de asistencia de una reunión",
     description="Obtiene el reporte de asistencia de una reunión específica"
 )
+@rate_limit(max_requests=10000, window_minutes=1)
 async def get_attendance_report(
     meeting_id: int,
     current_user: str = Depends(get_current_user),
@@ -961,7 +963,7 @@ async def get_attendance_report(
         from app.models.user_residential_unit_model import UserResidentialUnitModel
         
         user_service = UserService(db)
-        admin_user = await user_service.get_user_by_username(current_user)
+        admin_user = await user_service.get_principal_by_username(current_user)
         
         if not admin_user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
@@ -1096,6 +1098,7 @@ async def get_attendance_report(
     summary="Reporte de quórum de una reunión",
     description="Obtiene el análisis de quórum de una reunión específica"
 )
+@rate_limit(max_requests=10000, window_minutes=1)
 async def get_quorum_report(
     meeting_id: int,
     current_user: str = Depends(get_current_user),
@@ -1111,7 +1114,7 @@ async def get_quorum_report(
         from app.models.user_residential_unit_model import UserResidentialUnitModel
         
         user_service = UserService(db)
-        admin_user = await user_service.get_user_by_username(current_user)
+        admin_user = await user_service.get_principal_by_username(current_user)
         
         if not admin_user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
@@ -1217,6 +1220,7 @@ async def get_quorum_report(
     summary="Reporte de votaciones de una reunión",
     description="Obtiene el reporte de votaciones de una reunión específica"
 )
+@rate_limit(max_requests=10000, window_minutes=1)
 async def get_polls_report(
     meeting_id: int,
     current_user: str = Depends(get_current_user),
@@ -1235,7 +1239,7 @@ async def get_polls_report(
         from app.models.meeting_invitation_model import MeetingInvitationModel
         
         user_service = UserService(db)
-        admin_user = await user_service.get_user_by_username(current_user)
+        admin_user = await user_service.get_principal_by_username(current_user)
         
         if not admin_user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
@@ -1525,6 +1529,7 @@ async def get_polls_report(
     summary="Reporte de poderes de una reunión",
     description="Obtiene el reporte de poderes/delegaciones de una reunión específica"
 )
+@rate_limit(max_requests=10000, window_minutes=1)
 async def get_delegations_report(
     meeting_id: int,
     current_user: str = Depends(get_current_user),
@@ -1540,7 +1545,7 @@ async def get_delegations_report(
         from app.models.user_residential_unit_model import UserResidentialUnitModel
         
         user_service = UserService(db)
-        admin_user = await user_service.get_user_by_username(current_user)
+        admin_user = await user_service.get_principal_by_username(current_user)
         
         if not admin_user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
@@ -1685,7 +1690,7 @@ async def registrar_llamado(
             )
 
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol not in (1, 2):
             raise HTTPException(
@@ -1738,7 +1743,7 @@ async def get_llamado(
             )
 
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol not in (1, 2):
             raise HTTPException(
@@ -1781,7 +1786,7 @@ async def get_all_llamados(
 ):
     try:
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol not in (1, 2):
             raise HTTPException(
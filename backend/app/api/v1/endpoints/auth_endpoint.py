@@ -4,7 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_
 from datetime import timedelta
 from app.utils.timezone_utils import colombia_now
-from app.auth.auth import create_access_token, create_refresh_token, verify_refresh_token, get_current_user, get_token_jti, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
+from app.auth.auth import create_access_token_with_jti, create_refresh_token, verify_refresh_token, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
 from app.schemas.auth_token_schema import Token
 
 from app.schemas.responses_schema import SuccessResponse, ErrorResponse
@@ -12,10 +12,9 @@ from app.schemas.user_schema import UserCreate
 from app.schemas.data_user_schema import DataUserCreate, DataUserResponse
 from app.services.user_service import UserService
 from app.services.session_service import SessionService
-from app.core.security import security_manager, rate_limiter
+from app.core.security import security_manager, rate_limiter, rate_limit
 from app.core.database import get_db
 from app.models.user_residential_unit_model import UserResidentialUnitModel
-from app.models.data_user_model import DataUserModel
 from app.core.logging_config import get_logger
 from app.core.exceptions import (
     RateLimitException,
@@ -37,6 +36,7 @@ logger = get_logger(__name__)
     summary="Login de usuarios",
     description="Login de usuarios"
 )
+@rate_limit(max_requests=10000, window_minutes=1)
 async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
         Endpoint para login y obtención de token
@@ -51,19 +51,23 @@ async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends
 
     # Rate limit
     client_ip = request.headers.get("X-Forwarded-For", request.client.host).split(",")[0].strip()
-    if not rate_limiter.is_allowed(f"login:{client_ip}", max_requests=10, window_minutes=60):
+    if not await rate_limiter.is_allowed(f"login:{client_ip}", max_requests=10, window_minutes=60):
         raise RateLimitException()
 
-    # Verificar si el usuario existe
-    exists_user = await user_service.get_user_by_username(form_data.username)
-    
-    if not exists_user or not security_manager.verify_password(form_data.password, exists_user.str_password_hash):
+    # Usuario, datos personales, rol e invitación a reunión activa en una sola consulta
+    login_context = await user_service.get_login_context(form_data.username)
+
+    if not login_context:
         raise UserNotFoundException(
             message="El usuario no existe",
             error_code="USER_NOT_FOUND"
         )
 
-    is_valid, new_hash = security_manager.verify_and_update(
+    exists_user = login_context.UserModel
+    data_user = login_context.DataUserModel
+
+    # Una sola verificación Argon2 (fuera del event loop): también indica si hay que re-hashear
+    is_valid, new_hash = await security_manager.verify_and_update_async(
         form_data.password,
         exists_user.str_password_hash
     )
@@ -81,31 +85,19 @@ async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends
             error_code="USER_NOT_ALLOW_ENTRY"
         )
 
-    # Obtener los datos del usuario (DataUser) asociados
-    data_user_query = select(DataUserModel).where(DataUserModel.id == exists_user.int_data_user_id)
-    data_user_result = await db.execute(data_user_query)
-    data_user = data_user_result.scalar_one_or_none()
-
-    # Construir el nombre completo
-    full_name = None
-    email = None
-    
-    if data_user:
-        full_name = f"{data_user.str_firstname} {data_user.str_lastname}".strip()
-        email = data_user.str_email
-    
     if not data_user:
         raise HTTPException(status_code=401, detail="Credenciales inválidas")
-    
-    # 3. Si hay nuevo hash, actualizar en la base de datos
+
+    # Construir el nombre completo
+    full_name = f"{data_user.str_firstname} {data_user.str_lastname}".strip()
+    email = data_user.str_email
+
+    # Si hay nuevo hash, queda pendiente para la misma transacción de la sesión
     if new_hash:
         exists_user.str_password_hash = new_hash
-        await db.commit()
-        await db.refresh(exists_user)
-        logger.info(f"Hash de usuario migrado a Argon2", extra={"username": exists_user.str_username})
 
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
+    access_token, token_jti = create_access_token_with_jti(
         data={"sub": exists_user.str_username},
         expires_delta=access_token_expires,
     )
@@ -116,8 +108,7 @@ async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends
         expires_delta=refresh_token_expires,
     )
     
-    # Crear sesión en la base de datos
-    token_jti = get_token_jti(access_token)
+    # Crear sesión (Redis + auditoría opcional sin commit propio)
     if token_jti:
         try:
             session_service = SessionService(db)
@@ -125,55 +116,36 @@ async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends
                 user_id=exists_user.id,
                 token_jti=token_jti,
                 ip_address=client_ip,
-                device_info=request.headers.get("User-Agent", "Unknown")
+                device_info=request.headers.get("User-Agent", "Unknown"),
+                commit=False
             )
         except Exception as e:
             logger.warning(f"No se pudo crear la sesión: {str(e)}")
+
+    # Un único commit para el re-hash de la contraseña y la sesión de auditoría
+    if db.new or db.dirty:
+        await db.commit()
+        if new_hash:
+            logger.info(f"Hash de usuario migrado a Argon2", extra={"username": exists_user.str_username})
     
-    # Verificar si hay reunión activa donde el usuario está invitado
+    # Reunión "En Curso" donde el usuario está invitado (ya cargada en la consulta de login)
+    # Cualquier usuario con invitación a una reunión activa recibirá el modal
     active_meeting_info = None
-    try:
-        from app.models.meeting_model import MeetingModel
-        from app.models.meeting_invitation_model import MeetingInvitationModel
-        
-        logger.info(f"Buscando reunión activa para usuario {exists_user.id}, rol {exists_user.int_id_rol}")
-        
-        # Buscar reunión "En Curso" donde el usuario está invitado
-        # Cualquier usuario con invitación a una reunión activa recibirá el modal
-        meeting_query = (
-            select(MeetingModel, MeetingInvitationModel)
-            .join(
-                MeetingInvitationModel,
-                and_(
-                    MeetingInvitationModel.int_meeting_id == MeetingModel.id,
-                    MeetingInvitationModel.int_user_id == exists_user.id
-                )
-            )
-            .where(MeetingModel.str_status == "En Curso")
-        )
-        meeting_result = await db.execute(meeting_query)
-        meeting_data = meeting_result.first()
-        
-        logger.info(f"Datos de reunión encontrados: {meeting_data}")
-        
-        if meeting_data:
-            meeting, invitation = meeting_data
-            is_connected = (invitation.bln_actually_attended == True) and (invitation.dat_left_at is None)
-            
-            logger.info(f"Estado de conexión - attended: {invitation.bln_actually_attended}, left_at: {invitation.dat_left_at}, is_connected: {is_connected}")
-            
-            active_meeting_info = {
-                "id": meeting.id,
-                "title": meeting.str_title,
-                "description": meeting.str_description,
-                "meeting_type": meeting.str_meeting_type,
-                "already_participated": invitation.bln_actually_attended or False,
-                "is_connected": is_connected,
-                "joined_at": invitation.dat_joined_at.isoformat() if invitation.dat_joined_at else None,
-                "left_at": invitation.dat_left_at.isoformat() if invitation.dat_left_at else None,
-            }
-    except Exception as e:
-        logger.warning(f"Error al verificar reunión activa: {str(e)}")
+    meeting = login_context.MeetingModel
+    invitation = login_context.MeetingInvitationModel
+    if meeting and invitation:
+        is_connected = (invitation.bln_actually_attended == True) and (invitation.dat_left_at is None)
+
+        active_meeting_info = {
+            "id": meeting.id,
+            "title": meeting.str_title,
+            "description": meeting.str_description,
+            "meeting_type": meeting.str_meeting_type,
+            "already_participated": invitation.bln_actually_attended or False,
+            "is_connected": is_connected,
+            "joined_at": invitation.dat_joined_at.isoformat() if invitation.dat_joined_at else None,
+            "left_at": invitation.dat_left_at.isoformat() if invitation.dat_left_at else None,
+        }
     
     response_data = {
         "access_token": access_token, 
@@ -182,7 +154,7 @@ async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends
         "user": {
             "id": exists_user.id,
             "username": exists_user.str_username,
-            "role": exists_user.rol.str_name,
+            "role": login_context.str_rol_name,
             "name": full_name,
             "email": email
         }
@@ -200,6 +172,7 @@ async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends
 
 
 @router.post("/register-participation")
+@rate_limit(max_requests=10000, window_minutes=1)
 async def register_participation(
     meeting_id: int,
     db: AsyncSession = Depends(get_db),
@@ -306,7 +279,7 @@ async def refresh_token(request: Request, db: AsyncSession = Depends(get_db)):
             )
         
         user_service = UserService(db)
-        exists_user = await user_service.get_user_by_username(username)
+        exists_user = await user_service.get_principal_by_username(username)
         
         if not exists_user or not exists_user.bln_allow_entry:
             raise HTTPException(
@@ -316,13 +289,12 @@ async def refresh_token(request: Request, db: AsyncSession = Depends(get_db)):
             )
         
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
+        access_token, token_jti = create_access_token_with_jti(
             data={"sub": exists_user.str_username},
             expires_delta=access_token_expires,
         )
         
         client_ip = request.headers.get("X-Forwarded-For", request.client.host).split(",")[0].strip()
-        token_jti = get_token_jti(access_token)
         if token_jti:
             try:
                 session_service = SessionService(db)
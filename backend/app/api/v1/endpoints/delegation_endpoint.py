@@ -61,7 +61,7 @@ async def create_delegation(
         delegation_service = VotingDelegationService(db)
         user_service = UserService(db)
 
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -128,7 +128,7 @@ async def get_meeting_delegations(
         delegation_service = VotingDelegationService(db)
         user_service = UserService(db)
 
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -176,7 +176,7 @@ async def revoke_delegation(
         delegation_service = VotingDelegationService(db)
         user_service = UserService(db)
 
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -237,7 +237,7 @@ async def get_user_delegation_status(
         delegation_service = VotingDelegationService(db)
         user_service = UserService(db)
 
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
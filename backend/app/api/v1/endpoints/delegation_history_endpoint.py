@@ -59,7 +59,7 @@ async def get_delegation_history(
         user_service = UserService(db)
 
         # Verificar autenticación
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
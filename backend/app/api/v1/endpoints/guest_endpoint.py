@@ -38,7 +38,7 @@ async def create_guest(
     try:
         # CORREGIDO: Verificar permisos (Super admin o admin)
         user_service = UserService(db)
-        current_user_data = await user_service.get_user_by_username(current_user)
+        current_user_data = await user_service.get_principal_by_username(current_user)
         
         if current_user_data.int_id_rol not in [1, 2]:  # 1: Super Admin, 2: Admin
             raise HTTPException(
@@ -85,7 +85,7 @@ async def get_guests_by_unit(
     try:
         # Verificar permisos
         user_service = UserService(db)
-        current_user_data = await user_service.get_user_by_username(current_user)
+        current_user_data = await user_service.get_principal_by_username(current_user)
         
         if current_user_data.int_id_rol not in [1, 2]:
             raise HTTPException(
@@ -128,7 +128,7 @@ async def delete_guest(
     try:
         # CORREGIDO: Verificar permisos
         user_service = UserService(db)
-        current_user_data = await user_service.get_user_by_username(current_user)
+        current_user_data = await user_service.get_principal_by_username(current_user)
         
         if current_user_data.int_id_rol not in [1, 2]:
             raise HTTPException(
@@ -8,6 +8,7 @@ import uuid
 import logging
 
 from app.core.database import get_db
+from app.core.security import rate_limit
 from app.core.exceptions import ServiceException, ResourceNotFoundException
 from app.schemas.responses_schema import SuccessResponse
 from app.schemas.meeting_create_schema import (
@@ -18,16 +19,14 @@ from app.schemas.meeting_create_schema import (
 from app.schemas.meeting_attendance_schema import QRAttendanceRequest
 from app.services.meeting_service import MeetingService
 from app.services.email_service import EmailService
-from app.auth.auth import get_current_user
+from app.auth.auth import get_current_user, verify_access_token
 from app.services.user_service import UserService
 from app.celery_app import celery_app
 from app.core.config import settings
 import asyncio
 import json
 import redis.asyncio as aioredis
-from fastapi import HTTPException
 from fastapi.responses import StreamingResponse
-from jose import JWTError, jwt
 
 logger = logging.getLogger(__name__)
 
@@ -362,7 +361,7 @@ async def start_meeting(
         meeting_service = MeetingService(db)
         user_service = UserService(db)
         
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         meeting = await meeting_service.start_meeting(meeting_id, user.id)
 
         logger.info(f"✅ Reunión {meeting_id} iniciada con estado: {meeting.str_status}")
@@ -520,7 +519,7 @@ async def end_meeting(
         meeting_service = MeetingService(db)
         user_service = UserService(db)
 
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         meeting = await meeting_service.end_meeting(meeting_id, user.id)
 
         return SuccessResponse(
@@ -557,7 +556,7 @@ async def register_attendance(
     try:
         meeting_service = MeetingService(db)
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         user_id = user.id
 
         result = await meeting_service.register_attendance(meeting_id, user_id)
@@ -596,7 +595,7 @@ async def register_leave(
     try:
         meeting_service = MeetingService(db)
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         user_id = user.id
 
         result = await meeting_service.register_leave(meeting_id, user_id)
@@ -690,6 +689,7 @@ async def send_meeting_invitations(
     summary="Registrar asistencia presencial via escaneo QR",
     description="El administrador escanea el QR de un copropietario para registrar su asistencia en la reunion presencial activa"
 )
+@rate_limit(max_requests=10000, window_minutes=1)
 async def scan_qr_attendance(
     request: QRAttendanceRequest,
     db: AsyncSession = Depends(get_db),
@@ -711,7 +711,7 @@ async def scan_qr_attendance(
         user_service = UserService(db)
         
         # Obtener el usuario admin autenticado
-        admin_user = await user_service.get_user_by_username(current_user)
+        admin_user = await user_service.get_principal_by_username(current_user)
         
         if not admin_user:
             raise ServiceException(
@@ -769,13 +769,7 @@ async def meeting_attendance_events(meeting_id: int, token: str):
     from sqlalchemy.orm import sessionmaker
     from app.models.meeting_invitation_model import MeetingInvitationModel
 
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username = payload.get("sub")
-        if not username:
-            raise HTTPException(status_code=401, detail="Token inválido")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Token inválido o expirado")
+    await verify_access_token(token)
 
     async def event_generator():
         engine = create_async_engine(settings.ASYNC_DATABASE_URL, echo=False, pool_pre_ping=True)
@@ -2,13 +2,13 @@ from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
-from jose import jwt, JWTError
 import json
 import asyncio
 import redis.asyncio as aioredis
 
-from app.auth.auth import get_current_user
+from app.auth.auth import get_current_user, verify_access_token
 from app.core.database import get_db
+from app.core.security import rate_limit
 from app.core.config import settings
 from app.schemas.responses_schema import SuccessResponse
 from app.schemas.poll_schema import PollCreate, PollBase
@@ -60,7 +60,7 @@ async def create_poll(
         poll_service = PollService(db)
         user_service = UserService(db)
         
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -277,7 +277,7 @@ async def get_meeting_polls(
         user_service = UserService(db)
         
         # Obtener usuario actual
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -429,7 +429,7 @@ async def start_poll(
         poll_service = PollService(db)
         user_service = UserService(db)
         
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -475,7 +475,7 @@ async def end_poll(
         poll_service = PollService(db)
         user_service = UserService(db)
         
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -513,6 +513,7 @@ async def end_poll(
     summary="Votar en encuesta (público)",
     description="Registra un voto en la encuesta usando el código (no requiere autenticación)"
 )
+@rate_limit(max_requests=10000, window_minutes=1)
 async def vote_poll_by_code(
     poll_code: str,
     request: Request,
@@ -567,6 +568,7 @@ async def vote_poll_by_code(
     summary="Votar en encuesta (autenticado)",
     description="Registra un voto en la encuesta (requiere autenticación)"
 )
+@rate_limit(max_requests=10000, window_minutes=1)
 async def vote_poll(
     poll_id: int,
     request: Request,
@@ -579,7 +581,7 @@ async def vote_poll(
         poll_service = PollService(db)
         user_service = UserService(db)
 
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -622,6 +624,7 @@ async def vote_poll(
     summary="Estadísticas de encuesta",
     description="Obtiene estadísticas detalladas de una encuesta"
 )
+@rate_limit(max_requests=10000, window_minutes=1)
 async def get_poll_statistics(
     poll_id: int,
     current_user: str = Depends(get_current_user),
@@ -690,6 +693,7 @@ async def get_poll_statistics(
     summary="Resultados de encuesta",
     description="Obtiene los resultados detallados de una encuesta finalizada"
 )
+@rate_limit(max_requests=10000, window_minutes=1)
 async def get_poll_results(
     poll_id: int,
     current_user: str = Depends(get_current_user),
@@ -780,7 +784,7 @@ async def get_poll_votes(
     """
     try:
         user_service = UserService(db)
-        current = await user_service.get_user_by_username(current_user)
+        current = await user_service.get_principal_by_username(current_user)
         
         if not current or current.int_id_rol not in (1, 2):
             raise HTTPException(
@@ -1014,13 +1018,7 @@ async def get_poll_votes(
     tags=["Polls SSE"],
 )
 async def meeting_poll_events(meeting_id: int, token: str):
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username = payload.get("sub")
-        if not username:
-            raise HTTPException(status_code=401, detail="Token inválido")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Token inválido o expirado")
+    username = (await verify_access_token(token))["sub"]
 
     async def event_generator():
         r = await aioredis.from_url(settings.REDIS_URL, decode_responses=True)
@@ -25,6 +25,7 @@ import os
 
 from app.core.database import get_db
 from app.auth.auth import get_current_user_obj
+from app.auth.principal import AuthenticatedPrincipal
 from app.models.user_model import UserModel
 from app.models.data_user_model import DataUserModel
 from app.models.user_residential_unit_model import UserResidentialUnitModel
@@ -34,7 +35,7 @@ from app.services.simple_auto_login_service import simple_auto_login_service
 from app.services.qr_service import qr_service
 from app.services.email_service import EmailService
 from app.core.config import settings
-from app.core.security import security_manager
+from app.core.security import security_manager, rate_limit
 from app.celery_app import celery_app
 
 logger = logging.getLogger(__name__)
@@ -162,7 +163,7 @@ async def _get_user_complete_data(db: AsyncSession, user_id: int):
     return user_data
 
 
-def _check_admin_permissions(current_user: UserModel):
+def _check_admin_permissions(current_user: AuthenticatedPrincipal):
     """
     Verifica que el usuario actual tenga permisos de admin.
     
@@ -217,7 +218,7 @@ async def _update_user_password(db: AsyncSession, user: UserModel, password: str
 )
 async def generate_qr_simple(
     request: SimpleQRRequest,
-    current_user: UserModel = Depends(get_current_user_obj),
+    current_user: AuthenticatedPrincipal = Depends(get_current_user_obj),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -293,7 +294,7 @@ async def generate_qr_simple(
 )
 async def generate_enhanced_qr(
     request: EnhancedQRRequest,
-    current_user: UserModel = Depends(get_current_user_obj),
+    current_user: AuthenticatedPrincipal = Depends(get_current_user_obj),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -381,7 +382,7 @@ async def generate_enhanced_qr(
 async def send_enhanced_qr_email(
     request: SendQREmailRequest,
     background_tasks: BackgroundTasks = BackgroundTasks(),
-    current_user: UserModel = Depends(get_current_user_obj),
+    current_user: AuthenticatedPrincipal = Depends(get_current_user_obj),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -438,7 +439,7 @@ async def send_enhanced_qr_email(
 )
 async def generate_bulk_qr(
     request: BulkQRRequest,
-    current_user: UserModel = Depends(get_current_user_obj),
+    current_user: AuthenticatedPrincipal = Depends(get_current_user_obj),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -529,9 +530,10 @@ async def generate_bulk_qr(
     description="Genera solo los tokens de auto-login para múltiples usuarios sin generar las imágenes QR. Ideal para generar PDFs en el frontend.",
     response_model=SuccessResponse[BulkQRSimpleResponse]
 )
+@rate_limit(max_requests=10000, window_minutes=1)
 async def generate_qr_bulk_simple(
     request: BulkQRSimpleRequest,
-    current_user: UserModel = Depends(get_current_user_obj),
+    current_user: AuthenticatedPrincipal = Depends(get_current_user_obj),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -26,7 +26,7 @@ router = APIRouter()
 
 async def _verify_superadmin(current_user: str, db: AsyncSession):
     user_service = UserService(db)
-    user = await user_service.get_user_by_username(current_user)
+    user = await user_service.get_principal_by_username(current_user)
     if not user or user.int_id_rol != 1:
         raise HTTPException(status_code=403, detail="Solo Super Admin")
     return user
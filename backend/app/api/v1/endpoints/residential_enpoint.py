@@ -3,7 +3,6 @@ from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, Field
 from typing import Optional
-from jose import jwt, JWTError
 import asyncio
 import redis.asyncio as aioredis
 from app.core.config import settings
@@ -17,7 +16,7 @@ from app.services.residential_unit_service import ResidentialUnitService
 
 from app.schemas.resident_update_schema import ResidentUpdate
 from app.core.exceptions import ResourceNotFoundException
-from app.auth.auth import get_current_user
+from app.auth.auth import get_current_user, verify_access_token
 from app.services.user_service import UserService
 from app.celery_app import celery_app
 
@@ -189,7 +188,7 @@ async def update_resident(
     try:
         # Verificar permisos
         user_service = UserService(db)
-        current_user_data = await user_service.get_user_by_username(current_user)
+        current_user_data = await user_service.get_principal_by_username(current_user)
         
         if current_user_data.int_id_rol not in [1, 2]:
             raise HTTPException(
@@ -296,7 +295,7 @@ async def create_resident(
     try:
         # Verificar permisos (Super Admin o Admin)
         user_service = UserService(db)
-        current_user_data = await user_service.get_user_by_username(current_user)
+        current_user_data = await user_service.get_principal_by_username(current_user)
         
         if current_user_data.int_id_rol not in [1, 2]:
             raise HTTPException(
@@ -352,7 +351,7 @@ async def resend_credentials(
     """Reenvía las credenciales de acceso por correo via Celery"""
     try:
         user_service = UserService(db)
-        current_user_data = await user_service.get_user_by_username(current_user)
+        current_user_data = await user_service.get_principal_by_username(current_user)
         
         if current_user_data.int_id_rol not in [1, 2]:
             raise HTTPException(
@@ -403,7 +402,7 @@ async def delete_residential_unit(
         
         # Verificar permisos del usuario actual
         user_service = UserService(db)
-        current_user_data = await user_service.get_user_by_username(current_user)
+        current_user_data = await user_service.get_principal_by_username(current_user)
         
         # Solo Super Admin (rol 1) puede eliminar unidades residenciales
         if current_user_data.int_id_rol != 1:
@@ -445,13 +444,7 @@ async def delete_residential_unit(
     tags=["Residentes SSE"],
 )
 async def residents_events(unit_id: int, token: str):
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username = payload.get("sub")
-        if not username:
-            raise HTTPException(status_code=401, detail="Token inválido")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Token inválido o expirado")
+    username = (await verify_access_token(token))["sub"]
 
     async def event_generator():
         r = await aioredis.from_url(settings.REDIS_URL, decode_responses=True)
@@ -6,7 +6,7 @@ from pydantic import BaseModel
 from app.core.database import get_db
 from app.services.session_service import SessionService
 from app.auth.auth import get_current_user_obj
-from app.models.user_model import UserModel
+from app.auth.principal import AuthenticatedPrincipal
 from app.schemas.responses_schema import SuccessResponse
 from app.core.logging_config import get_logger
 
@@ -38,7 +38,7 @@ class SessionDeactivateResponse(BaseModel):
 )
 async def get_my_sessions(
     db: AsyncSession = Depends(get_db),
-    current_user: UserModel = Depends(get_current_user_obj)
+    current_user: AuthenticatedPrincipal = Depends(get_current_user_obj)
 ):
     """
     Obtiene las sesiones activas del usuario actual
@@ -66,7 +66,7 @@ async def get_my_sessions(
 async def deactivate_my_session(
     session_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: UserModel = Depends(get_current_user_obj)
+    current_user: AuthenticatedPrincipal = Depends(get_current_user_obj)
 ):
     """
     Desactiva una sesión específica del usuario actual
@@ -102,7 +102,7 @@ async def deactivate_my_session(
 )
 async def deactivate_all_my_sessions(
     db: AsyncSession = Depends(get_db),
-    current_user: UserModel = Depends(get_current_user_obj)
+    current_user: AuthenticatedPrincipal = Depends(get_current_user_obj)
 ):
     """
     Desactiva todas las sesiones del usuario actual
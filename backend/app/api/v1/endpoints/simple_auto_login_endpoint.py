@@ -9,12 +9,11 @@ from app.services.simple_auto_login_service import simple_auto_login_service
 from app.services.user_service import UserService
 from app.services.meeting_service import MeetingService
 from app.services.session_service import SessionService
-from app.auth.auth import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, get_token_jti
+from app.auth.auth import create_access_token_with_jti, ACCESS_TOKEN_EXPIRE_MINUTES
 from app.core.security import security_manager
 from app.core.logging_config import get_logger
 from app.core.exceptions import ServiceException
 from sqlalchemy import select
-from app.models.data_user_model import DataUserModel
 from app.models.meeting_model import MeetingModel
 
 logger = get_logger(__name__)
@@ -73,16 +72,20 @@ async def auto_login_simple(
         token_id = credentials.get("token_id")
         meeting_id = credentials.get("meeting_id")
         
-        # Obtener usuario de la base de datos primero
+        # Usuario, datos personales y rol en una sola consulta
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(username)
+        login_context = await user_service.get_login_context(username)
         
-        if not user:
+        if not login_context:
             logger.warning(f"Usuario no encontrado: {username}")
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Usuario no encontrado"
             )
+
+        user = login_context.UserModel
+        data_user = login_context.DataUserModel
+        rol_name = login_context.str_rol_name
         
         # Verificar si el token es válido para este usuario
         if token_id:
@@ -102,13 +105,6 @@ async def auto_login_simple(
                 detail="El usuario no tiene permiso para acceder al sistema"
             )
         
-        # Obtener datos del usuario (DataUser)
-        data_user_query = select(DataUserModel).where(
-            DataUserModel.id == user.int_data_user_id
-        )
-        data_user_result = await db.execute(data_user_query)
-        data_user = data_user_result.scalar_one_or_none()
-        
         # Construir nombre completo y email
         full_name = None
         email = None
@@ -119,13 +115,13 @@ async def auto_login_simple(
         
         # Generar JWT de acceso regular
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
+        access_token, token_jti = create_access_token_with_jti(
             data={"sub": user.str_username},
             expires_delta=access_token_expires
         )
         
-        # Crear sesión en la base de datos
-        token_jti = get_token_jti(access_token)
+        # Crear sesión (el registro de auditoría, si aplica, se confirma junto
+        # con la actualización del token de auto-login)
         if token_jti:
             try:
                 session_service = SessionService(db)
@@ -133,14 +129,15 @@ async def auto_login_simple(
                     user_id=user.id,
                     token_jti=token_jti,
                     ip_address=client_ip,
-                    device_info=request.headers.get("User-Agent", "Unknown")
+                    device_info=request.headers.get("User-Agent", "Unknown"),
+                    commit=False
                 )
             except Exception as e:
                 logger.warning(f"No se pudo crear la sesión: {str(e)}")
         
         logger.info(
             f"✅ Auto-login exitoso: user_id={user.id}, "
-            f"username={user.str_username}, role={user.rol.str_name}"
+            f"username={user.str_username}, role={rol_name}"
         )
         
         # Actualizar el token del usuario (nuevo: upsert)
@@ -151,6 +148,8 @@ async def auto_login_simple(
                 )
             except Exception as e:
                 logger.warning(f"No se pudo actualizar el token: {str(e)}")
+        elif db.new:
+            await db.commit()
         
         # Registro automatico de asistencia para copropietarios (rol 3) e invitados (rol 4)
         # Si hay una reunion presencial "En Curso" en su unidad residencial y tienen invitacion
@@ -184,7 +183,7 @@ async def auto_login_simple(
             "user": {
                 "id": user.id,
                 "username": user.str_username,
-                "role": user.rol.str_name,
+                "role": rol_name,
                 "name": full_name,
                 "email": email
             },
@@ -1,8 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query
 from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 import uuid
-import base64
 import logging
 
 from app.auth.auth import get_current_user
@@ -16,6 +15,7 @@ from app.core.exceptions import ServiceException
 from app.schemas.residential_unit_schema import AdministratorData, BulkToggleAccessRequest
 from app.schemas.email_notification_schema import BulkSendCredentialsRequest
 from app.celery_app import celery_app
+from app.utils.excel_upload_store import store_excel_upload
 
 logger = logging.getLogger(__name__)
 
@@ -31,12 +31,17 @@ router = APIRouter()
 async def upload_residents_excel(
     unit_id: int,
     file: UploadFile = File(..., description="Archivo Excel con los copropietarios"),
+    import_mode: str = Query(
+        "replace",
+        pattern="^(replace|diff)$",
+        description="replace: elimina y recrea los copropietarios; diff: aplica solo los cambios"
+    ),
     current_user: str = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     try:
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol not in [1, 2]:
             raise HTTPException(
@@ -59,13 +64,14 @@ async def upload_residents_excel(
                 detail="El archivo debe ser un Excel (.xlsx o .xls)"
             )
 
-        file_content = await file.read()
-        file_content_b64 = base64.b64encode(file_content).decode('utf-8')
+        # El archivo viaja por referencia (key en Redis), no dentro del mensaje del broker
         task_id = str(uuid.uuid4())
+        file_ref = await store_excel_upload(file, task_id)
 
         celery_app.send_task(
             'app.tasks.excel_tasks.process_excel_upload',
-            args=[file_content_b64, unit_id, user.id, task_id],
+            args=[file_ref, unit_id, user.id, task_id],
+            kwargs={'import_mode': import_mode},
             task_id=task_id,
             queue='email_tasks',
         )
@@ -137,6 +143,12 @@ async def get_excel_task_status(
                 "successful": int(data.get(b'successful', b'0')),
                 "failed": int(data.get(b'failed', b'0')),
                 "email_task_id": data.get(b'email_task_id', b'').decode(),
+                **({
+                    "diff": {
+                        k: int(data.get(k.encode(), b'0'))
+                        for k in ('inserted', 'updated', 'unchanged', 'removed')
+                    }
+                } if b'inserted' in data else {}),
             }
         )
     except Exception as e:
@@ -173,7 +185,7 @@ async def get_unit_administrator(
     try:
         # Verificar que el usuario actual sea super admin
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol != 1:  # 1: Super Admin
             raise HTTPException(
@@ -243,7 +255,7 @@ async def create_manual_administrator(
     try:
         # Verificar que el usuario actual sea super admin
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol != 1:  # 1: Super Admin
             raise HTTPException(
@@ -321,7 +333,7 @@ async def change_unit_administrator(
     try:
         # Verificar que el usuario actual sea super admin
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol != 1:  # 1: Super Admin
             raise HTTPException(
@@ -372,7 +384,7 @@ async def send_credentials_bulk(
     try:
         # Verificar que el usuario actual sea Super Admin
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol != 1:
             raise HTTPException(
@@ -458,7 +470,7 @@ async def get_dashboard_statistics(
     try:
         # Verificar que el usuario actual sea super admin
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol != 1:  # 1: Super Admin
             raise HTTPException(
@@ -543,7 +555,7 @@ async def get_active_meetings(
     try:
         # Verificar que el usuario actual sea super admin
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol != 1:  # 1: Super Admin
             raise HTTPException(
@@ -620,7 +632,7 @@ async def get_active_meeting_details(
     try:
         # Verificar que el usuario actual sea super admin
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol != 1:  # 1: Super Admin
             raise HTTPException(
@@ -779,7 +791,7 @@ async def toggle_resident_access(
         from app.services.user_service import UserService
 
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol != 1:  # 1: Super Admin
             raise HTTPException(
@@ -853,7 +865,7 @@ async def toggle_residents_access_bulk(
         from app.services.user_service import UserService
 
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol != 1:
             raise HTTPException(
@@ -97,7 +97,7 @@ async def get_support_info(
 ):
     try:
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol not in (1, 2):
             raise HTTPException(
@@ -150,7 +150,7 @@ async def upsert_support_info(
 ):
     try:
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol not in (1, 2):
             raise HTTPException(
@@ -204,7 +204,7 @@ async def delete_support_info(
 ):
     try:
         user_service = UserService(db)
-        user = await user_service.get_user_by_username(current_user)
+        user = await user_service.get_principal_by_username(current_user)
 
         if not user or user.int_id_rol not in (1, 2):
             raise HTTPException(
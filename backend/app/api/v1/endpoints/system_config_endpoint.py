@@ -32,7 +32,7 @@ async def verify_super_admin(
 ):
     """Dependency para verificar que el usuario es Super Admin"""
     user_service = UserService(db)
-    user = await user_service.get_user_by_username(current_user)
+    user = await user_service.get_principal_by_username(current_user)
 
     if not user or user.int_id_rol != 1:  # 1 = Super Admin
         raise HTTPException(
@@ -49,7 +49,7 @@ async def verify_admin_or_super(
 ):
     """Dependency para Super Admin y Admin (lectura de config necesaria para crear reuniones)"""
     user_service = UserService(db)
-    user = await user_service.get_user_by_username(current_user)
+    user = await user_service.get_principal_by_username(current_user)
 
     if not user or user.int_id_rol not in (1, 2):
         raise HTTPException(
@@ -1146,7 +1146,7 @@ async def test_smtp_account(
         }
 
         email_sender = EmailSender()
-        success, rate_limited = email_sender._send_single_with_account(
+        success, rate_limited = await email_sender._send_single_with_account(
             account_config,
             [smtp_user],
             f"✅ Prueba de Cuenta SMTP #{account_id} - GIRAMASTER",
@@ -1,14 +1,18 @@
+import calendar
+import threading
+import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 
 from app.core.config import settings
 from app.core.database import get_db
-from app.models.user_model import UserModel
+from app.services.user_service import UserService
+from app.services.session_service import is_session_revoked
 
 SECRET_KEY = settings.SECRET_KEY
 REFRESH_SECRET_KEY = settings.REFRESH_SECRET_KEY
@@ -18,7 +22,63 @@ REFRESH_TOKEN_EXPIRE_DAYS = settings.REFRESH_TOKEN_EXPIRE_DAYS
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-def create_access_token(data: dict, expires_delta: timedelta | None = None):
+
+class VerifiedTokenCache:
+    """
+    LRU acotado de access tokens ya verificados -> claims
+
+    Evita repetir la verificación de firma en endpoints consultados cada pocos
+    segundos (SSE, votaciones). Las entradas se descartan al llegar a su `exp`.
+    Protegido con lock por si se consulta desde código síncrono en el threadpool.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> dict | None:
+        with self._lock:
+            claims = self._entries.get(token)
+            if claims is None:
+                return None
+            if claims.get("exp", 0) <= time.time():
+                self._entries.pop(token, None)
+                return None
+            self._entries.move_to_end(token)
+            return claims
+
+    def set(self, token: str, claims: dict) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[token] = claims
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+verified_token_cache = VerifiedTokenCache(max_size=settings.JWT_CACHE_MAX_SIZE)
+
+
+def decode_access_token(token: str) -> dict:
+    """
+    Verifica un access token y retorna sus claims, usando el LRU de tokens verificados
+
+    Raises:
+        JWTError: Si el token es inválido o expiró
+    """
+    claims = verified_token_cache.get(token)
+    if claims is None:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        verified_token_cache.set(token, claims)
+    return claims
+
+
+def create_access_token_with_jti(data: dict, expires_delta: timedelta | None = None) -> tuple[str, str]:
+    """
+    Crea un access token y retorna (token, jti) sin tener que decodificarlo
+    """
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta if expires_delta else timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     jti = str(uuid.uuid4())
@@ -28,6 +88,14 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
         "type": "access"
     })
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+    # El token recién firmado ya es válido: registrar sus claims en el LRU
+    verified_token_cache.set(encoded_jwt, {**to_encode, "exp": int(calendar.timegm(expire.utctimetuple()))})
+    return encoded_jwt, jti
+
+
+def create_access_token(data: dict, expires_delta: timedelta | None = None):
+    encoded_jwt, _ = create_access_token_with_jti(data, expires_delta)
     return encoded_jwt
 
 
@@ -84,23 +152,27 @@ def get_token_jti(token: str) -> str | None:
     Returns:
         JTI del token o None si no existe
     """
+    cached = verified_token_cache.get(token)
+    if cached is not None:
+        return cached.get("jti")
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": False})
         return payload.get("jti")
     except JWTError:
         return None
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+async def verify_access_token(token: str) -> dict:
+    """
+    Verifica un access token y que su sesión no haya sido cerrada
+
+    Para los endpoints SSE que reciben el token por query param; las rutas
+    normales usan la dependencia `get_token_payload`.
+
+    Raises:
+        HTTPException 401: Si el token es inválido, expiró, no tiene usuario o su sesión fue cerrada
+    """
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        usuario_id: str = payload.get("sub")
-        if usuario_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token inválido o sin usuario",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return usuario_id
+        payload = decode_access_token(token)
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -108,37 +180,48 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-async def get_current_user_obj(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    if payload.get("sub") is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido o sin usuario",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    # Rechazar tokens cuya sesión fue cerrada (un solo round trip a Redis)
+    token_jti = payload.get("jti")
+    if token_jti and await is_session_revoked(token_jti):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="La sesión fue cerrada",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    return payload
+
+async def get_token_payload(token: str = Depends(oauth2_scheme)) -> dict:
     """
-    Obtiene el objeto completo UserModel del usuario autenticado
+    Dependencia compartida: claims del access token con la revocación ya verificada
     """
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        usuario_id = payload.get("sub")
-        
-        if usuario_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token inválido o sin usuario",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        # Obtener el objeto UserModel
-        result = await db.execute(select(UserModel).where(UserModel.str_username == usuario_id))
-        user_obj = result.scalar_one_or_none()
-        
-        if not user_obj:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Usuario no encontrado en la base de datos",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        return user_obj
-        
-    except JWTError:
+    return await verify_access_token(token)
+
+async def get_current_user(payload: dict = Depends(get_token_payload)) -> str:
+    """
+    Obtiene el username (`sub`) del token autenticado
+    """
+    return payload["sub"]
+
+async def get_current_user_obj(payload: dict = Depends(get_token_payload), db: AsyncSession = Depends(get_db)):
+    """
+    Obtiene el usuario autenticado (AuthenticatedPrincipal, cacheado en Redis)
+    """
+    # Obtener el principal (caché o una sola consulta a la base de datos)
+    user_obj = await UserService(db).get_principal_by_username(payload["sub"])
+
+    if not user_obj:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token inválido o expirado",
+            detail="Usuario no encontrado en la base de datos",
             headers={"WWW-Authenticate": "Bearer"},
-        )
\ No newline at end of file
+        )
+
+    return user_obj
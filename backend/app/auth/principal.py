@@ -0,0 +1,103 @@
+import json
+from dataclasses import dataclass, asdict
+from typing import Iterable, Optional
+
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+from app.core.logging_config import get_logger
+from app.core.redis_client import get_redis
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class AuthenticatedPrincipal:
+    """
+    Datos del usuario autenticado que necesitan los endpoints
+
+    Los nombres de los campos coinciden con los de UserModel para que los
+    endpoints que solo leen id/rol/acceso puedan usarlo sin cambios.
+    """
+    id: int
+    str_username: str
+    int_id_rol: int
+    str_rol_name: Optional[str]
+    bln_allow_entry: bool
+    int_data_user_id: int
+    int_residential_unit_id: Optional[int]
+
+
+class PrincipalCache:
+    """
+    Caché en Redis del usuario autenticado, compartida entre workers
+
+    Guarda `principal:{username}` con el principal serializado y un índice
+    `principal:id:{user_id}` -> username para invalidar por ID. Las entradas
+    tienen un TTL corto y se invalidan explícitamente al cambiar el rol o el
+    acceso del usuario y al revocar sus sesiones.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def _key(username: str) -> str:
+        return f"principal:{username}"
+
+    @staticmethod
+    def _id_key(user_id: int) -> str:
+        return f"principal:id:{user_id}"
+
+    async def get(self, username: str) -> Optional[AuthenticatedPrincipal]:
+        """Retorna el principal cacheado o None si no existe o Redis falla"""
+        if self.ttl_seconds <= 0:
+            return None
+        try:
+            cached = await get_redis().get(self._key(username))
+        except Exception as e:
+            logger.warning(f"No se pudo leer el principal de Redis: {e}")
+            return None
+        return AuthenticatedPrincipal(**json.loads(cached)) if cached else None
+
+    async def set(self, principal: AuthenticatedPrincipal) -> None:
+        """Guarda el principal y el índice por ID con el TTL configurado"""
+        if self.ttl_seconds <= 0:
+            return
+        try:
+            async with get_redis().pipeline(transaction=False) as pipe:
+                pipe.set(self._key(principal.str_username), json.dumps(asdict(principal)), ex=self.ttl_seconds)
+                pipe.set(self._id_key(principal.id), principal.str_username, ex=self.ttl_seconds)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"No se pudo guardar el principal en Redis: {e}")
+
+    async def invalidate_user_ids(
+        self,
+        user_ids: Iterable[int],
+        redis_client: Optional[aioredis.Redis] = None
+    ) -> None:
+        """
+        Elimina los principales cacheados de los usuarios indicados
+
+        Args:
+            user_ids: IDs de los usuarios modificados
+            redis_client: Cliente Redis a usar (las tareas de Celery pasan el suyo
+                porque corren en su propio event loop)
+        """
+        id_keys = [self._id_key(user_id) for user_id in user_ids]
+        if not id_keys:
+            return
+        r = redis_client or get_redis()
+        try:
+            usernames = await r.mget(id_keys)
+            keys = id_keys + [
+                self._key(username.decode() if isinstance(username, bytes) else username)
+                for username in usernames if username
+            ]
+            await r.delete(*keys)
+        except Exception as e:
+            logger.warning(f"No se pudo invalidar el principal en Redis: {e}")
+
+
+principal_cache = PrincipalCache(ttl_seconds=settings.PRINCIPAL_CACHE_TTL)
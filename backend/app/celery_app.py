@@ -27,7 +27,15 @@ celery_app.conf.update(
 )
 
 # Tareas periódicas (si las hay)
-celery_app.conf.beat_schedule = {}
+celery_app.conf.beat_schedule = {
+    # Respaldo opcional del outbox: el dispatcher ya se reprograma solo, Beat solo
+    # lo despierta si se perdió el mensaje programado (p. ej. Redis reiniciado)
+    'dispatch-email-outbox': {
+        'task': 'app.tasks.email_tasks.dispatch_email_outbox',
+        'schedule': 60.0,
+        'options': {'queue': 'email_tasks', 'expires': 55},
+    },
+}
 
 # Autodiscovery de tareas
 celery_app.autodiscover_tasks(['app.tasks'])
@@ -0,0 +1,49 @@
+"""
+Comandos de administración de la base de datos
+
+Uso:
+    python -m app.cli init-db    # Crea las tablas, ejecuta la semilla y copia las sesiones de tbl_user_sessions a Redis
+    python -m app.cli check-db   # Solo verifica la conexión
+
+Pensado para ejecutarse una vez por despliegue (Job init-db de Kubernetes
+o paso del pipeline) con DB_INIT_ON_STARTUP=false en la API, de modo que los procesos
+de la API arranquen sin reflejar el esquema.
+"""
+import argparse
+import asyncio
+import sys
+
+from app.core.database import init_db, close_db, check_db_connection, import_db_sessions
+from app.core.logging_config import get_logger
+from app.core.redis_client import close_redis
+
+logger = get_logger(__name__)
+
+
+async def _run(command: str) -> None:
+  try:
+    await check_db_connection()
+    if command == "init-db":
+      await init_db()
+      logger.info("Esquema y semilla aplicados")
+      await import_db_sessions()
+  finally:
+    await close_db()
+    await close_redis()
+
+
+def main() -> int:
+  parser = argparse.ArgumentParser(prog="python -m app.cli", description="Comandos de administración de GIRAMASTER")
+  parser.add_argument("command", choices=["init-db", "check-db"])
+  args = parser.parse_args()
+
+  try:
+    asyncio.run(_run(args.command))
+  except Exception as e:
+    logger.error(f"Error ejecutando {args.command}: {e}")
+    return 1
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
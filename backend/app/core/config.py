@@ -8,6 +8,8 @@ class Settings(BaseSettings):
   ENVIRONMENT: str = "development"
   HOST: str = "0.0.0.0"
   PORT: int = 8000
+  WEB_CONCURRENCY: int = 1  # Procesos de la API (>1 sirve con gunicorn + workers uvicorn)
+  DB_INIT_ON_STARTUP: bool = True  # create_all + seed al arrancar (false: usar `python -m app.cli init-db`)
 
   # Base de Datos
   HOST_DB: str = "localhost"
@@ -28,6 +30,8 @@ class Settings(BaseSettings):
   ACCESS_TOKEN_EXPIRE_MINUTES: int = 10080  # 7 días (7 * 24 * 60)
   REFRESH_TOKEN_EXPIRE_MINUTES: int = 10080  # 7 días
   REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+  JWT_CACHE_MAX_SIZE: int = 4096  # Tokens verificados que se mantienen en memoria por proceso
+  PASSWORD_HASH_WORKERS: int = 0  # Hilos para hashing Argon2 en paralelo (0 = según cuota de CPU y memoria del cgroup)
   
   # CORS
   ALLOWED_HOSTS_DEV: List[str] = ["http://localhost:3000", "http://localhost:5173", "http://127.0.0.1:3000", "http://127.0.0.1:5173"]
@@ -48,6 +52,14 @@ class Settings(BaseSettings):
     return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}"
   REDIS_CACHE_TTL: int = 60 * 60 * 1
   REDIS_SESSION_TTL: int = 60 * 60 * 24 * 7
+  REDIS_SOCKET_TIMEOUT: float = 0.5
+  PRINCIPAL_CACHE_TTL: int = 30  # Segundos que se cachea el usuario autenticado (0 = desactivado)
+  SESSION_DB_WRITE_THROUGH: bool = False  # Copiar las sesiones de Redis a tbl_user_sessions (auditoría)
+
+  # Rate limiting
+  RATE_LIMIT_BACKEND: str = "redis"  # redis | memory
+  RATE_LIMIT_LOCAL_MAX_KEYS: int = 10000  # Máximo de keys en el fallback en memoria
+  RATE_LIMIT_REDIS_RETRY_SECONDS: int = 30  # Tiempo sin consultar Redis tras un fallo
 
   # Async Database URL
   @property
@@ -92,6 +104,22 @@ class Settings(BaseSettings):
   SMTP_FROM_EMAIL: str = ""  # Email del remitente
   SMTP_FROM_NAME: str = "GIRAMASTER - Sistema de Asambleas"
   EMAIL_ENABLED: bool = True  # Activar/desactivar envío de emails
+  SMTP_STARTTLS: bool = True  # STARTTLS en puertos distintos de 465 (desactivar solo para sinks locales)
+  SMTP_TIMEOUT: int = 30  # Segundos por operación SMTP
+  SMTP_CONNECTIONS_PER_ACCOUNT: int = 3  # Conexiones autenticadas en paralelo por cuenta en envíos por lote
+  SMTP_REGISTRY_CACHE_TTL: int = 60  # Segundos que cada proceso cachea las cuentas SMTP de tbl_system_config (0 = desactivado)
+
+  # Outbox de correos (tbl_email_outbox) y su dispatcher
+  EMAIL_OUTBOX_BATCH_SIZE: int = 200  # Correos que el dispatcher reclama por ronda
+  EMAIL_OUTBOX_MAX_ATTEMPTS: int = 5  # Intentos antes de marcar un correo como fallido
+  EMAIL_OUTBOX_RETRY_BASE_SECONDS: int = 60  # Espera del primer reintento (se duplica en cada intento)
+  EMAIL_OUTBOX_RETRY_MAX_SECONDS: int = 3600  # Espera máxima entre reintentos
+  EMAIL_OUTBOX_LEASE_SECONDS: int = 600  # Tras este tiempo un correo "sending" huérfano vuelve a reclamarse
+  # Fracción de DAILY_LIMIT que una cuenta puede enviar de inmediato. Con 1.0 envía su límite completo
+  # (el 5.4.5 de Gmail sigue cortando) y se recarga en 24 h; con valores menores nunca supera DAILY_LIMIT
+  # en 24 h, pero el resto de un envío grande puede tardar hasta 24 h en salir.
+  SMTP_BUCKET_BURST_RATIO: float = 1.0
+  EMAIL_FANOUT_CHUNK_SIZE: int = 250  # Destinatarios por subtarea al preparar envíos masivos en paralelo
   
   # Generar Qrs - Ahora se recibe del frontend via request
   FRONTEND_URL: str = ""
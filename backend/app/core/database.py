@@ -62,6 +62,14 @@ async def init_db():
     logger.error(f"Error al inicializar la base de datos: {e}")
     raise
 
+async def import_db_sessions():
+  """Copia a Redis las sesiones vigentes de tbl_user_sessions (previas al store en Redis)"""
+  from app.services.session_service import SessionService
+
+  async with AsyncSessionLocal() as session:
+    count = await SessionService(session).import_db_sessions()
+    logger.info(f"Sesiones de tbl_user_sessions importadas a Redis: {count}")
+
 async def close_db():
   """Cierra la base de datos"""
   try:
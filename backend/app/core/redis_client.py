@@ -0,0 +1,51 @@
+import redis.asyncio as aioredis
+
+from app.core.config import settings
+
+_redis_client: aioredis.Redis | None = None
+_redis_bytes_client: aioredis.Redis | None = None
+
+
+def get_redis() -> aioredis.Redis:
+  """
+  Retorna el cliente Redis compartido del proceso
+
+  El cliente mantiene su propio pool de conexiones, por lo que debe
+  reutilizarse en lugar de crear uno nuevo con `from_url` en cada llamada.
+  """
+  global _redis_client
+  if _redis_client is None:
+    _redis_client = aioredis.from_url(
+      settings.REDIS_URL,
+      decode_responses=True,
+      socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+      socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    )
+  return _redis_client
+
+
+def get_redis_bytes() -> aioredis.Redis:
+  """
+  Retorna el cliente Redis compartido sin decodificar respuestas
+
+  Para valores binarios (ej: archivos Excel en tránsito hacia Celery).
+  """
+  global _redis_bytes_client
+  if _redis_bytes_client is None:
+    _redis_bytes_client = aioredis.from_url(
+      settings.REDIS_URL,
+      socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+      socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    )
+  return _redis_bytes_client
+
+
+async def close_redis() -> None:
+  """Cierra los clientes Redis compartidos (si existen)"""
+  global _redis_client, _redis_bytes_client
+  if _redis_client is not None:
+    await _redis_client.aclose()
+    _redis_client = None
+  if _redis_bytes_client is not None:
+    await _redis_bytes_client.aclose()
+    _redis_bytes_client = None
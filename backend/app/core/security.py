@@ -1,18 +1,29 @@
-from datetime import datetime, timedelta
-from app.utils.timezone_utils import colombia_now
+import asyncio
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from datetime import datetime
+from app.utils.timezone_utils import COLOMBIA_TZ
 from typing import Any, Union, Optional
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
+from fastapi.routing import APIRoute
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .config import settings
 from .database import get_db
+from .logging_config import get_logger
+from .redis_client import get_redis
+
+logger = get_logger(__name__)
 
 pwd_context = CryptContext(
     schemes=["argon2","bcrypt_sha256", "bcrypt"],
     deprecated=["bcrypt_sha256", "bcrypt"],
-    argon2__memory_cost = 65536,
+    argon2__memory_cost = 65536,  # KiB (ver ARGON2_HASH_MEMORY_BYTES)
     argon2__time_cost = 3,
     argon2__parallelism = 4,
     argon2__hash_len=32
@@ -20,6 +31,89 @@ pwd_context = CryptContext(
 
 security = HTTPBearer()
 
+_hash_executor: Optional[ThreadPoolExecutor] = None
+
+# Memoria que reserva cada hash Argon2 en curso (memory_cost está en KiB)
+ARGON2_HASH_MEMORY_BYTES = 65536 * 1024
+# Fracción del límite de memoria del contenedor que pueden ocupar los hashes en curso
+HASH_MEMORY_BUDGET_RATIO = 0.25
+# Tope cuando no hay límites de cgroup (desarrollo fuera de contenedores)
+HASH_WORKERS_DEFAULT_MAX = 4
+
+
+def _read_cgroup_file(path: str) -> Optional[str]:
+  try:
+    with open(path) as f:
+      return f.read().strip()
+  except OSError:
+    return None
+
+
+def _cgroup_cpu_limit() -> Optional[int]:
+  """Núcleos permitidos por la cuota de CPU del cgroup (v2 o v1), o None si no hay cuota"""
+  cpu_max = _read_cgroup_file("/sys/fs/cgroup/cpu.max")
+  if cpu_max:
+    quota, _, period = cpu_max.partition(" ")
+    if quota != "max" and period:
+      return max(1, -(-int(quota) // int(period)))
+    return None
+
+  quota = _read_cgroup_file("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+  period = _read_cgroup_file("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+  if quota and period and int(quota) > 0:
+    return max(1, -(-int(quota) // int(period)))
+  return None
+
+
+def _cgroup_memory_limit() -> Optional[int]:
+  """Límite de memoria del cgroup en bytes (v2 o v1), o None si no hay límite"""
+  for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+    value = _read_cgroup_file(path)
+    if value and value != "max":
+      limit = int(value)
+      # cgroup v1 reporta un valor cercano a 2^63 cuando no hay límite
+      return limit if limit < 1 << 60 else None
+  return None
+
+
+def _default_hash_workers() -> int:
+  """
+  Hilos de hashing cuando PASSWORD_HASH_WORKERS=0
+
+  os.cpu_count() devuelve los núcleos del nodo, no la cuota del pod: con un
+  límite de 500m y 512Mi, 16 hilos × 64 MiB bastarían para que el OOM killer
+  termine el contenedor. Se acota por la cuota de CPU y por el presupuesto de
+  memoria del cgroup; sin límites se usa un tope fijo pequeño.
+  """
+  workers = min(os.cpu_count() or 1, HASH_WORKERS_DEFAULT_MAX)
+
+  cpu_limit = _cgroup_cpu_limit()
+  if cpu_limit is not None:
+    workers = min(os.cpu_count() or 1, cpu_limit)
+
+  memory_limit = _cgroup_memory_limit()
+  if memory_limit is not None:
+    workers = min(workers, int(memory_limit * HASH_MEMORY_BUDGET_RATIO) // ARGON2_HASH_MEMORY_BYTES)
+
+  return max(1, workers)
+
+
+def _get_hash_executor() -> ThreadPoolExecutor:
+  """
+  Pool compartido para calcular hashes Argon2 fuera del event loop
+
+  argon2-cffi libera el GIL mientras calcula el hash, así que los hilos corren
+  en paralelo en varios núcleos. Se usan hilos y no procesos porque los workers
+  prefork de Celery son daemon y no pueden crear procesos hijos. El tamaño
+  limita también la memoria (64 MiB por hash en curso).
+  """
+  global _hash_executor
+  if _hash_executor is None:
+    workers = settings.PASSWORD_HASH_WORKERS or _default_hash_workers()
+    logger.info(f"Pool de hashing Argon2: {workers} hilos")
+    _hash_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="argon2")
+  return _hash_executor
+
 class SecurityManager:
   """ Administra la autenticación y autorización del sistema """
 
@@ -45,6 +139,38 @@ class SecurityManager:
       raise ValueError("La contraseña no puede estar vacía")
         
     return pwd_context.hash(password)
+
+  def submit_password_hash(self, password: str) -> "asyncio.Future[str]":
+    """
+    Programa el hash de la contraseña en el pool de hashing sin bloquear el event loop
+
+    Permite encolar muchas contraseñas (ej: importación masiva) y esperar los
+    resultados después con asyncio.gather.
+
+    Args:
+      password: Contraseña en texto plano
+
+    Returns:
+      Future con el hash de la contraseña
+
+    Raises:
+      ValueError: Si la contraseña está vacía
+    """
+    if not password or not password.strip():
+      raise ValueError("La contraseña no puede estar vacía")
+
+    return asyncio.get_running_loop().run_in_executor(
+      _get_hash_executor(), self.create_password_hash, password
+    )
+
+  async def verify_and_update_async(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Igual que verify_and_update, pero ejecutado en el pool de hashing para no
+    bloquear el event loop durante la verificación Argon2
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+      _get_hash_executor(), self.verify_and_update, plain_password, hashed_password
+    )
   
   def verify_password(self, plain_password: str, hashed_password: str) -> bool:
     """
@@ -142,13 +268,164 @@ class SecurityManager:
   
 security_manager = SecurityManager()
 
+# Ventana deslizante aproximada (contador de ventana actual + ventana anterior
+# ponderada). Se ejecuta atómicamente en Redis en un solo round trip.
+_SLIDING_WINDOW_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local limit = tonumber(ARGV[1])
+local weight = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+local estimated = math.floor(previous * weight) + current
+if estimated >= limit then
+  return {0, estimated}
+end
+current = redis.call('INCR', KEYS[1])
+if current == 1 then
+  redis.call('EXPIRE', KEYS[1], ttl)
+end
+return {1, estimated + 1}
+"""
+
+class LocalRateLimitStore:
+  """
+  Almacén en memoria para el rate limiting (fallback cuando Redis no está disponible)
+
+  Usa el mismo algoritmo de ventana deslizante que Redis, guardando solo dos
+  contadores por key. El número de keys está acotado (se descartan las menos
+  usadas) y las entradas expiran tras dos ventanas sin actividad.
+  """
+
+  def __init__(self, max_keys: int = 10000):
+    self.max_keys = max_keys
+    # key -> [window_id, previous_count, current_count, expires_at]
+    self._entries: OrderedDict[str, list] = OrderedDict()
+
+  def hit(self, key: str, max_requests: int, window_seconds: int, now: float) -> tuple[bool, int]:
+    """ Registra una solicitud si está permitida. Retorna (permitido, solicitudes_en_ventana) """
+    window_id = int(now // window_seconds)
+    weight = 1 - (now - window_id * window_seconds) / window_seconds
+
+    entry = self._entries.get(key)
+    if entry is None or entry[3] <= now:
+      entry = [window_id, 0, 0, 0.0]
+    elif entry[0] != window_id:
+      # Rotar ventanas: la actual pasa a ser la anterior solo si es contigua
+      previous = entry[2] if entry[0] == window_id - 1 else 0
+      entry = [window_id, previous, 0, 0.0]
+
+    estimated = int(entry[1] * weight) + entry[2]
+    allowed = estimated < max_requests
+    if allowed:
+      entry[2] += 1
+      estimated += 1
+
+    entry[3] = now + 2 * window_seconds
+    self._entries[key] = entry
+    self._entries.move_to_end(key)
+    self._evict(now)
+
+    return allowed, estimated
+
+  def _evict(self, now: float) -> None:
+    """ Elimina entradas expiradas y las menos usadas si se supera el máximo """
+    while self._entries:
+      oldest_key, oldest = next(iter(self._entries.items()))
+      if oldest[3] > now and len(self._entries) <= self.max_keys:
+        break
+      self._entries.pop(oldest_key)
+
+
+# Límites por defecto para rutas sin política - ALTO PARA PRUEBAS DE ESTRÉS
+DEFAULT_RATE_LIMITS = {"max_requests": 10000, "window_minutes": 1}
+
+# Límites por ruta (plantilla completa; el nombre de los parámetros no importa)
+ENDPOINT_RATE_LIMITS = {
+  # Auth
+  "/api/v1/auth/login": {"max_requests": 10000, "window_minutes": 1},
+  "/api/v1/auth/register-participation": {"max_requests": 10000, "window_minutes": 1},
+
+  # Residents / QR
+  "/api/v1/residents/generate-auto-login": {"max_requests": 10000, "window_minutes": 1},
+  "/api/v1/residents/send-qr-email": {"max_requests": 10000, "window_minutes": 1},
+  "/api/v1/residents/generate-qr-bulk-simple": {"max_requests": 10000, "window_minutes": 1},
+
+  # Meetings
+  "/api/v1/meetings/scan-qr-attendance": {"max_requests": 10000, "window_minutes": 1},
+
+  # Polls - estadísticas en tiempo real y voting
+  "/api/v1/polls/{id}/statistics": {"max_requests": 10000, "window_minutes": 1},
+  "/api/v1/polls/{id}/vote": {"max_requests": 10000, "window_minutes": 1},
+  "/api/v1/polls/{id}/results": {"max_requests": 10000, "window_minutes": 1},
+
+  # Admin reports
+  "/api/v1/administrator/meetings/{id}/report/attendance": {"max_requests": 10000, "window_minutes": 1},
+  "/api/v1/administrator/meetings/{id}/report/quorum": {"max_requests": 10000, "window_minutes": 1},
+  "/api/v1/administrator/meetings/{id}/report/polls": {"max_requests": 10000, "window_minutes": 1},
+  "/api/v1/administrator/meetings/{id}/report/delegations": {"max_requests": 10000, "window_minutes": 1},
+}
+
+# Límites por prefijo de router (para rutas sin decorador @rate_limit ni entrada en ENDPOINT_RATE_LIMITS)
+ROUTE_PREFIX_RATE_LIMITS = {
+  "/api/v1/delegations/": {"max_requests": 10000, "window_minutes": 1},
+  "/api/v1/delegation-history/": {"max_requests": 10000, "window_minutes": 1},
+  "/api/v1/meetings": {"max_requests": 10000, "window_minutes": 1},
+  "/api/v1/active-meetings": {"max_requests": 10000, "window_minutes": 1},
+  "/api/v1/polls/": {"max_requests": 10000, "window_minutes": 1},
+  "/api/v1/polls/code/": {"max_requests": 10000, "window_minutes": 1},
+  "/api/v1/guests/": {"max_requests": 10000, "window_minutes": 1},
+  "/api/v1/guest/": {"max_requests": 10000, "window_minutes": 1},
+}
+
+def _template_key(path_format: str) -> str:
+  """ Normaliza una plantilla de ruta ignorando el nombre de sus parámetros (`/polls/{poll_id}` -> `/polls/{}`) """
+  return re.sub(r"\{[^}:]+(:[^}]+)?\}", lambda m: "{path}" if m.group(1) == ":path" else "{}", path_format)
+
+_ENDPOINT_LIMITS_BY_TEMPLATE = {_template_key(path): limits for path, limits in ENDPOINT_RATE_LIMITS.items()}
+
+
+class _RouteNode:
+  """ Nodo del árbol de rutas: un segmento de la plantilla """
+
+  __slots__ = ("static", "param", "catch_all", "endpoints")
+
+  def __init__(self):
+    self.static: dict[str, "_RouteNode"] = {}
+    self.param: Optional["_RouteNode"] = None
+    # método -> (orden de registro, plantilla): rutas con `{x:path}` después de
+    # este nodo y rutas que terminan exactamente en él
+    self.catch_all: dict[str, tuple[int, str]] = {}
+    self.endpoints: dict[str, tuple[int, str]] = {}
+
+def rate_limit(max_requests: int, window_minutes: int = 1):
+  """
+  Decorador que asocia una política de rate limiting a un endpoint
+
+  Debe ir debajo del decorador de la ruta para que FastAPI registre la
+  función ya marcada. La política se resuelve en `RateLimiter.compile_routes`.
+
+  Example:
+    >>> @router.post("/{poll_id}/vote")
+    >>> @rate_limit(max_requests=10000, window_minutes=1)
+    >>> async def vote(...): ...
+  """
+  def decorator(func):
+    func.__rate_limit__ = {"max_requests": max_requests, "window_minutes": window_minutes}
+    return func
+  return decorator
+
 class RateLimiter:
   """ Gestiona el límite de solicitudes con seguridad mejorada """
 
   def __init__(self):
-    self.request_counts = {}
+    self.backend = settings.RATE_LIMIT_BACKEND
+    self.local_store = LocalRateLimitStore(max_keys=settings.RATE_LIMIT_LOCAL_MAX_KEYS)
+    self._script = None
+    self._redis_retry_at = 0.0
+    self._routes = _RouteNode()
+    self._policies: dict[tuple[str, str], dict] = {}
 
-  def is_allowed(
+  async def is_allowed(
     self,
     key: str,
     max_requests: int = 50,
@@ -156,105 +433,169 @@ class RateLimiter:
   ) -> tuple[bool, dict]:
     """ 
     Verifica si la solicitud está permitida
+
+    Usa Redis (compartido entre workers y réplicas) y, si no está disponible,
+    el almacén local en memoria.
     
     Returns:
       tuple: (permitido, info_adicional)
       info_adicional contiene: remaining_requests, reset_time
     """
 
-    current_time = colombia_now()
-    window_start = current_time - timedelta(minutes=window_minutes)
+    now = time.time()
+    window_seconds = window_minutes * 60
 
     # Sanitizar key para evitar inyección
     if not key or not isinstance(key, str):
-      key = f"unknown_{current_time.timestamp()}"
+      key = f"unknown_{now}"
 
     # Limitar longitud del key para prevenir DOS
     key = key[:100] if len(key) > 100 else key
 
-    # Limpiar registros antiguos
-    if key in self.request_counts:
-      self.request_counts[key] = [
-        req for req in self.request_counts[key]
-        if req > window_start
-      ]
-    else:
-      self.request_counts[key] = []
-
-    # Contar solicitudes actuales
-    current_requests = len(self.request_counts[key])
-    
-    # Verificar límite
-    if current_requests >= max_requests:
-      reset_time = window_start + timedelta(minutes=window_minutes)
-      return False, {
-        "remaining_requests": 0,
-        "reset_time": reset_time.isoformat(),
-        "limit": max_requests,
-        "window": window_minutes
-      }
-    
-    # Registrar nueva solicitud
-    self.request_counts[key].append(current_time)
-    
-    return True, {
-      "remaining_requests": max_requests - current_requests - 1,
-      "reset_time": (window_start + timedelta(minutes=window_minutes)).isoformat(),
+    result = await self._hit_redis(key, max_requests, window_seconds, now)
+    if result is None:
+      result = self.local_store.hit(key, max_requests, window_seconds, now)
+    allowed, current_requests = result
+
+    reset_time = datetime.fromtimestamp(
+      (int(now // window_seconds) + 1) * window_seconds, COLOMBIA_TZ
+    ).replace(tzinfo=None)
+
+    return allowed, {
+      "remaining_requests": max(max_requests - current_requests, 0),
+      "reset_time": reset_time.isoformat(),
       "limit": max_requests,
       "window": window_minutes
     }
 
-  def get_limits_for_endpoint(self, endpoint_path: str) -> dict:
+  async def _hit_redis(
+    self,
+    key: str,
+    max_requests: int,
+    window_seconds: int,
+    now: float,
+  ) -> tuple[bool, int] | None:
+    """ Ejecuta el script de ventana deslizante en Redis. Retorna None si Redis falla """
+    if self.backend != "redis" or now < self._redis_retry_at:
+      return None
+
+    window_id = int(now // window_seconds)
+    weight = 1 - (now - window_id * window_seconds) / window_seconds
+
+    try:
+      if self._script is None:
+        self._script = get_redis().register_script(_SLIDING_WINDOW_SCRIPT)
+      allowed, current_requests = await self._script(
+        keys=[f"ratelimit:{{{key}}}:{window_id}", f"ratelimit:{{{key}}}:{window_id - 1}"],
+        args=[max_requests, weight, 2 * window_seconds],
+      )
+      return bool(allowed), int(current_requests)
+    except Exception as e:
+      self._redis_retry_at = now + settings.RATE_LIMIT_REDIS_RETRY_SECONDS
+      logger.warning(f"Rate limiting en Redis no disponible, usando memoria local: {e}")
+      return None
+
+  def compile_routes(self, routes: list) -> None:
+    """
+    Resuelve una sola vez (al iniciar la aplicación) la política de cada ruta
+
+    La política sale del decorador `@rate_limit` del endpoint, de
+    ENDPOINT_RATE_LIMITS o, si no tiene, del prefijo más largo en
+    ROUTE_PREFIX_RATE_LIMITS, y se guarda por (método, plantilla de la ruta).
+    Las plantillas se organizan en un árbol por segmentos para que cada
+    solicitud encuentre su ruta sin recorrer la lista completa.
+    """
+    root = _RouteNode()
+    policies = {}
+
+    for index, route in enumerate(routes):
+      if not isinstance(route, APIRoute):
+        continue
+
+      template = route.path_format
+      limits = (
+        getattr(route.endpoint, "__rate_limit__", None)
+        or self._limits_for_path(template)
+        or DEFAULT_RATE_LIMITS
+      )
+
+      node = root
+      segments = template.split("/")[1:]
+      for position, segment in enumerate(segments):
+        if segment.startswith("{") and segment.endswith(":path}") and position == len(segments) - 1:
+          target = node.catch_all
+          break
+        if segment.startswith("{") and segment.endswith("}"):
+          if node.param is None:
+            node.param = _RouteNode()
+          node = node.param
+        else:
+          node = node.static.setdefault(segment, _RouteNode())
+      else:
+        target = node.endpoints
+
+      for method in route.methods:
+        target.setdefault(method, (index, template))
+        policies.setdefault((method, template), limits)
+
+    self._routes = root
+    self._policies = policies
+
+  def get_limits_for_endpoint(self, method: str, path: str) -> dict:
     """ Retorna límites específicos por endpoint """
-    
-    # Configuración de límites por endpoint - ALTO PARA PRUEBAS DE ESTRÉS
-    endpoint_limits = {
-      # Auth
-      "/api/v1/auth/login": {"max_requests": 10000, "window_minutes": 1},
-      "/api/v1/auth/register-participation": {"max_requests": 10000, "window_minutes": 1},
-      
-      # Residents / QR
-      "/api/v1/residents/generate-auto-login": {"max_requests": 10000, "window_minutes": 1},
-      "/api/v1/residents/send-qr-email": {"max_requests": 10000, "window_minutes": 1},
-      "/api/v1/residents/generate-qr-bulk-simple": {"max_requests": 10000, "window_minutes": 1},
-      
-      # Delegations
-      "/api/v1/delegations/": {"max_requests": 10000, "window_minutes": 1},
-      "/api/v1/delegation-history/": {"max_requests": 10000, "window_minutes": 1},
-      
-      # Meetings
-      "/api/v1/meetings": {"max_requests": 10000, "window_minutes": 1},
-      "/api/v1/meetings/scan-qr-attendance": {"max_requests": 10000, "window_minutes": 1},
-      
-      # Active meetings
-      "/api/v1/active-meetings": {"max_requests": 10000, "window_minutes": 1},
-      
-      # Polls - estadísticas en tiempo real y voting
-      "/api/v1/polls/": {"max_requests": 10000, "window_minutes": 1},
-      "/api/v1/polls/{id}/statistics": {"max_requests": 10000, "window_minutes": 1},
-      "/api/v1/polls/{id}/vote": {"max_requests": 10000, "window_minutes": 1},
-      "/api/v1/polls/{id}/results": {"max_requests": 10000, "window_minutes": 1},
-      "/api/v1/polls/code/": {"max_requests": 10000, "window_minutes": 1},
-      
-      # Admin reports
-      "/api/v1/administrator/meetings/{id}/report/attendance": {"max_requests": 10000, "window_minutes": 1},
-      "/api/v1/administrator/meetings/{id}/report/quorum": {"max_requests": 10000, "window_minutes": 1},
-      "/api/v1/administrator/meetings/{id}/report/polls": {"max_requests": 10000, "window_minutes": 1},
-      "/api/v1/administrator/meetings/{id}/report/delegations": {"max_requests": 10000, "window_minutes": 1},
-      
-      # Guests
-      "/api/v1/guests/": {"max_requests": 10000, "window_minutes": 1},
-    }
-    
-    # Buscar límite específico para el endpoint
-    for pattern, limits in endpoint_limits.items():
-      if pattern in endpoint_path or endpoint_path in pattern:
-        return limits
-    
-    # Límites por defecto según método HTTP - ALTO PARA PRUEBAS
-    if "POST" in endpoint_path or "PUT" in endpoint_path or "DELETE" in endpoint_path:
-      return {"max_requests": 10000, "window_minutes": 1}
-    else:
-      return {"max_requests": 10000, "window_minutes": 1}
+    template = self._match_template(method, path)
+    if template is not None:
+      return self._policies[(method, template)]
+
+    # Rutas no registradas (404, redirecciones de slash): por plantilla o prefijo del path
+    return self._limits_for_path(path) or DEFAULT_RATE_LIMITS
+
+  def _match_template(self, method: str, path: str) -> Optional[str]:
+    """
+    Plantilla de la ruta que atiende `path`, o None si ninguna coincide
+
+    Si varias plantillas coinciden (`/polls/{poll_id}` y `/polls/active`) gana
+    la registrada primero, igual que en el router de Starlette.
+    """
+    segments = path.split("/")[1:]
+    best: Optional[tuple[int, str]] = None
+    stack = [(self._routes, 0)]
+
+    while stack:
+      node, position = stack.pop()
+
+      # `{x:path}` consume el resto del path (incluido vacío) después del slash
+      candidate = node.catch_all.get(method) if position < len(segments) else None
+      if candidate is not None and (best is None or candidate < best):
+        best = candidate
+
+      if position == len(segments):
+        candidate = node.endpoints.get(method)
+        if candidate is not None and (best is None or candidate < best):
+          best = candidate
+        continue
+
+      segment = segments[position]
+      child = node.static.get(segment)
+      if child is not None:
+        stack.append((child, position + 1))
+      if node.param is not None and segment:
+        stack.append((node.param, position + 1))
+
+    return best[1] if best else None
+
+  @staticmethod
+  def _limits_for_path(path_format: str) -> dict | None:
+    """ Busca la política de la plantilla en ENDPOINT_RATE_LIMITS o la del prefijo más largo que la contenga """
+    limits = _ENDPOINT_LIMITS_BY_TEMPLATE.get(_template_key(path_format))
+    if limits is not None:
+      return limits
+
+    best_prefix = None
+    for prefix in ROUTE_PREFIX_RATE_LIMITS:
+      if (path_format == prefix.rstrip("/") or path_format.startswith(prefix.rstrip("/") + "/")) \
+          and (best_prefix is None or len(prefix) > len(best_prefix)):
+        best_prefix = prefix
+    return ROUTE_PREFIX_RATE_LIMITS[best_prefix] if best_prefix else None
 
 rate_limiter = RateLimiter()
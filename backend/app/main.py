@@ -13,8 +13,10 @@ from app.middleware.security_headers import SecurityHeadersMiddleware
 from app.middleware.rate_limit import RateLimitMiddleware
 
 from app.core.config import settings
+from app.core.security import rate_limiter
 from app.api.v1.api import api_router
-from app.core.database import init_db, close_db, check_db_connection
+from app.core.database import init_db, close_db, check_db_connection, import_db_sessions
+from app.core.redis_client import close_redis
 from app.core.logging_config import get_logger
 
 from app.core.exceptions_handlers import (
@@ -86,14 +88,17 @@ async def lifespan(app: FastAPI):
     await check_db_connection()
     logger.info("Base de datos conectada")
 
-    logger.info("Inicializando la base de datos")
-    await init_db()
-    logger.info("Base de datos inicializada")
+    if settings.DB_INIT_ON_STARTUP:
+      logger.info("Inicializando la base de datos")
+      await init_db()
+      logger.info("Base de datos inicializada")
+      await import_db_sessions()
 
     yield
     logger.info("Cerrando la base de datos")
     await close_db()
     logger.info("Base de datos cerrada")
+    await close_redis()
   except Exception as e:
     logger.error(f"Error al inicializar la aplicación: {e}")
     raise HTTPError(status_code=500, detail=f"Error al verificar la conexión a la base de datos: {e}")
@@ -167,6 +172,9 @@ app.add_middleware(SecurityHeadersMiddleware)  # Luego headers de seguridad
 
 app.include_router(api_router, prefix="/api/v1")
 
+# Resolver las políticas de rate limiting una sola vez por ruta
+rate_limiter.compile_routes(app.routes)
+
 @app.get("/")
 async def root():
   """Raiz de la API"""
@@ -1,24 +1,36 @@
-from fastapi import Request, HTTPException, status
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import status
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from app.core.security import rate_limiter
-import time
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
+class RateLimitMiddleware:
     """
-    Middleware para rate limiting mejorado
+    Middleware ASGI para rate limiting mejorado
+
+    Los headers informativos se agregan en el mensaje `http.response.start`,
+    sin envolver la respuesta (las conexiones SSE siguen sin buffer).
     """
-    
-    async def dispatch(self, request: Request, call_next):
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+
         # Obtener IP del cliente
-        client_ip = self._get_client_ip(request)
+        client_ip = self._get_client_ip(scope, request_headers)
         
         # Crear key para rate limiting
-        path = request.url.path
-        method = request.method
+        path = scope["path"]
+        method = scope["method"]
         
-        # Obtener límites específicos para el endpoint
-        limits = rate_limiter.get_limits_for_endpoint(f"{method} {path}")
+        # Obtener límites específicos para el endpoint (precompilados por ruta)
+        limits = rate_limiter.get_limits_for_endpoint(method, path)
         
         # Keys específicas por tipo de endpoint
         if "/auth/" in path:
@@ -29,7 +41,7 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
             rate_key = f"general_{method}_{client_ip}"
         
         # Verificar rate limiting
-        is_allowed, info = rate_limiter.is_allowed(
+        is_allowed, info = await rate_limiter.is_allowed(
             key=rate_key,
             max_requests=limits["max_requests"],
             window_minutes=limits["window_minutes"]
@@ -37,10 +49,10 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         
         if not is_allowed:
             # Obtener origen para CORS
-            origin = request.headers.get("Origin", "*")
+            origin = request_headers.get("Origin", "*")
             
             # Retornar error 429 Too Many Requests con headers CORS
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 content={
                     "detail": "Too many requests",
@@ -62,22 +74,32 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
                     "Access-Control-Expose-Headers": "X-RateLimit-Limit, X-RateLimit-Remaining, X-RateLimit-Reset, Retry-After"
                 }
             )
+            await response(scope, receive, send)
+            return
         
         # Agregar headers informativos de rate limiting
-        response = await call_next(request)
-        response.headers["X-RateLimit-Limit"] = str(limits["max_requests"])
-        response.headers["X-RateLimit-Remaining"] = str(info["remaining_requests"])
-        response.headers["X-RateLimit-Reset"] = str(info["reset_time"])
-        
-        return response
+        rate_limit_headers = {
+            "X-RateLimit-Limit": str(limits["max_requests"]),
+            "X-RateLimit-Remaining": str(info["remaining_requests"]),
+            "X-RateLimit-Reset": str(info["reset_time"]),
+        }
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                for name, value in rate_limit_headers.items():
+                    headers[name] = value
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
     
-    def _get_client_ip(self, request: Request) -> str:
+    def _get_client_ip(self, scope: Scope, headers: Headers) -> str:
         """
         Obtiene la IP real del cliente, considerando proxies
         """
         # Intentar obtener de headers comunes de proxy
-        forwarded_for = request.headers.get("X-Forwarded-For")
-        real_ip = request.headers.get("X-Real-IP")
+        forwarded_for = headers.get("X-Forwarded-For")
+        real_ip = headers.get("X-Real-IP")
         
         if forwarded_for:
             # X-Forwarded-For puede tener múltiples IPs, tomar la primera
@@ -86,4 +108,5 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
             return real_ip.strip()
         else:
             # Fallback a la conexión remota
-            return request.client.host if request.client else "unknown"
\ No newline at end of file
+            client = scope.get("client")
+            return client[0] if client else "unknown"
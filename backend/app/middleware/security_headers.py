@@ -1,21 +1,20 @@
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
+from app.core.config import settings
+
+
+class SecurityHeadersMiddleware:
     """
-    Middleware para agregar headers de seguridad HTTP
+    Middleware ASGI para agregar headers de seguridad HTTP
+
+    Los headers se inyectan en el mensaje `http.response.start` sin envolver ni
+    bufferizar el cuerpo, por lo que no afecta a los streams SSE.
     """
-    
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        
-        # Headers de seguridad básicos
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
         # Content Security Policy (CSP) - personalizable según necesidad
         csp_directives = [
             "default-src 'self'",
@@ -28,9 +27,8 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
             "base-uri 'self'",
             "form-action 'self'"
         ]
-        
+
         # En producción, hacer CSP más estricto
-        from app.core.config import settings
         if settings.ENVIRONMENT == "production":
             csp_directives = [
                 "default-src 'self'",
@@ -43,9 +41,7 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
                 "base-uri 'self'",
                 "form-action 'self'"
             ]
-        
-        response.headers["Content-Security-Policy"] = "; ".join(csp_directives)
-        
+
         # Permissions Policy (antes Feature Policy)
         permissions_policy = [
             "geolocation=()",
@@ -57,17 +53,41 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
             "gyroscope=()",
             "accelerometer=()"
         ]
-        
-        response.headers["Permissions-Policy"] = ", ".join(permissions_policy)
-        
-        # Security headers adicionales
-        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
+
+        # Los valores no dependen de la request: se calculan una sola vez
+        self.headers = {
+            # Headers de seguridad básicos
+            "X-Content-Type-Options": "nosniff",
+            "X-Frame-Options": "DENY",
+            "X-XSS-Protection": "1; mode=block",
+            "Referrer-Policy": "strict-origin-when-cross-origin",
+            "Content-Security-Policy": "; ".join(csp_directives),
+            "Permissions-Policy": ", ".join(permissions_policy),
+            # Security headers adicionales
+            "Strict-Transport-Security": "max-age=31536000; includeSubDomains",
+        }
 
         # SSE streams no deben tener COEP/CORP restrictivos (bloquearían el stream cross-origin)
-        if "/events" in request.url.path:
-            response.headers["Cross-Origin-Resource-Policy"] = "cross-origin"
-        else:
-            response.headers["Cross-Origin-Embedder-Policy"] = "require-corp"
-            response.headers["Cross-Origin-Resource-Policy"] = "same-origin"
+        self.sse_headers = {"Cross-Origin-Resource-Policy": "cross-origin"}
+        self.default_headers = {
+            "Cross-Origin-Embedder-Policy": "require-corp",
+            "Cross-Origin-Resource-Policy": "same-origin",
+        }
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        extra_headers = self.sse_headers if "/events" in scope["path"] else self.default_headers
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                for name, value in self.headers.items():
+                    headers[name] = value
+                for name, value in extra_headers.items():
+                    headers[name] = value
+            await send(message)
 
-        return response
\ No newline at end of file
+        await self.app(scope, receive, send_with_headers)
@@ -15,6 +15,7 @@ from .poll_model import PollModel
 from .poll_option_model import PollOptionModel
 from .poll_response_model import PollResponseModel
 from .email_notification_model import EmailNotificationModel
+from .email_outbox_model import EmailOutboxModel
 from .audit_log_model import AuditLogModel
 from .system_config_model import SystemConfigModel
 from .used_auto_login_token_model import UsedAutoLoginTokenModel
@@ -37,6 +38,7 @@ __all__ = [
     "PollOptionModel",
     "PollResponseModel",
     "EmailNotificationModel",
+    "EmailOutboxModel",
     "AuditLogModel",
     "SystemConfigModel",
     "UsedAutoLoginTokenModel",
@@ -0,0 +1,51 @@
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, JSON, Index
+from sqlalchemy.dialects.mysql import MEDIUMTEXT
+from app.core.database import Base
+from app.utils.timezone_utils import colombia_now
+
+
+class EmailOutboxModel(Base):
+    """
+    Correos pendientes de envío (outbox transaccional).
+
+    Los productores insertan aquí en la misma transacción que crea las
+    notificaciones y el dispatcher los envía respetando el límite diario de
+    cada cuenta SMTP. El estado vive en la base de datos, así que un worker
+    caído se retoma desde el último correo no confirmado.
+
+    Estados: pending → sending → sent | failed
+    """
+
+    __tablename__ = "tbl_email_outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    int_notification_id = Column(
+        Integer,
+        ForeignKey("tbl_email_notifications.id", ondelete="SET NULL", onupdate="CASCADE"),
+        nullable=True
+    )
+    json_to_emails = Column(JSON, nullable=False)
+    str_subject = Column(String(255), nullable=False)
+    txt_html_content = Column(Text().with_variant(MEDIUMTEXT(), "mysql"), nullable=False)
+    txt_text_content = Column(Text, nullable=True)
+    bln_attach_logo = Column(Boolean, default=True, nullable=False)
+
+    str_status = Column(String(20), default="pending", nullable=False)
+    int_attempts = Column(Integer, default=0, nullable=False)
+    dat_next_attempt_at = Column(DateTime, default=colombia_now, nullable=False)
+    dat_locked_until = Column(DateTime, nullable=True)  # Lease del dispatcher mientras está en "sending"
+    int_smtp_account_id = Column(Integer, nullable=True)
+    str_last_error = Column(String(500), nullable=True)
+
+    # Tarea que encoló el correo (progreso en email_task:{task_id})
+    str_task_id = Column(String(64), index=True, nullable=True)
+    # Datos del productor para registrar el envío (p. ej. la invitación a la reunión)
+    json_metadata = Column(JSON, nullable=True)
+
+    dat_sent_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=colombia_now)
+    updated_at = Column(DateTime, default=colombia_now, onupdate=colombia_now)
+
+    __table_args__ = (
+        Index('idx_outbox_status_next_attempt', 'str_status', 'dat_next_attempt_at'),
+    )
@@ -5,7 +5,7 @@ from datetime import datetime
 from app.utils.timezone_utils import colombia_now
 from typing import Optional, List
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, insert, update
 import logging
 
 from app.models.email_notification_model import EmailNotificationModel
@@ -63,6 +63,49 @@ class EmailNotificationService:
             logger.error(f"Error al crear notificación: {str(e)}")
             raise
     
+    async def create_notifications_bulk(
+        self,
+        user_ids: List[int],
+        template: str,
+        status: str = "pending",
+        meeting_id: Optional[int] = None
+    ) -> List[int]:
+        """
+        Crea un registro de notificación por usuario con un solo INSERT multi-fila
+        
+        Args:
+            user_ids: IDs de los usuarios que recibirán el email
+            template: Tipo de plantilla
+            status: Estado inicial de las notificaciones
+            meeting_id: ID de la reunión (opcional)
+        
+        Returns:
+            List[int]: IDs de las notificaciones, en el mismo orden de user_ids
+        """
+        if not user_ids:
+            return []
+        
+        now = colombia_now()
+        result = await self.db.execute(
+            insert(EmailNotificationModel).values([
+                {
+                    'int_user_id': user_id,
+                    'int_meeting_id': meeting_id,
+                    'str_template': template,
+                    'str_status': status,
+                    'dat_sent_at': now if status == "sent" else None,
+                    'created_at': now,
+                    'updated_at': now,
+                }
+                for user_id in user_ids
+            ])
+        )
+        # MySQL no soporta RETURNING; lastrowid es el primer ID del INSERT multi-fila
+        first_id = result.lastrowid
+        
+        logger.info(f"📧 {len(user_ids)} notificaciones creadas: template={template}, status={status}")
+        return list(range(first_id, first_id + len(user_ids)))
+    
     async def update_status(
         self,
         notification_id: int,
@@ -114,6 +157,34 @@ class EmailNotificationService:
             )
             raise
     
+    async def update_status_bulk(
+        self,
+        notification_ids: List[int],
+        status: str
+    ) -> None:
+        """
+        Actualiza el estado de varias notificaciones con un solo UPDATE (sin commit)
+        
+        Args:
+            notification_ids: IDs de las notificaciones
+            status: Nuevo estado (sent, failed)
+        """
+        if not notification_ids:
+            return
+        
+        now = colombia_now()
+        values = {'str_status': status, 'updated_at': now}
+        if status == "sent":
+            values['dat_sent_at'] = now
+        
+        await self.db.execute(
+            update(EmailNotificationModel)
+            .where(EmailNotificationModel.id.in_(notification_ids))
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        logger.info(f"{len(notification_ids)} notificaciones actualizadas a {status}")
+    
     async def get_user_notifications(
         self,
         user_id: int,
@@ -0,0 +1,647 @@
+"""
+Outbox transaccional de correos y su dispatcher.
+
+Los productores (tareas de credenciales e invitaciones) insertan los correos ya
+renderizados en tbl_email_outbox dentro de la misma transacción que crea las
+notificaciones. El dispatcher reclama lotes con SELECT ... FOR UPDATE SKIP LOCKED,
+reparte cada lote entre las cuentas SMTP disponibles según el saldo de su token
+bucket (derivado de DAILY_LIMIT), reintenta con backoff exponencial los errores
+transitorios (los rechazos 5xx definitivos fallan sin reintento) y actualiza
+notificaciones y progreso en bloque.
+
+La entrega es "al menos una vez": si un worker cae después de que Gmail aceptó
+un correo pero antes de registrarlo, ese correo se reenvía al vencer su lease.
+"""
+import asyncio
+import math
+import time
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.logging_config import get_logger
+from app.models.email_outbox_model import EmailOutboxModel
+from app.services.email_notification_service import EmailNotificationService
+from app.services.system_config_service import SystemConfigService
+from app.utils.email_sender import EmailSender
+from app.utils.timezone_utils import colombia_now
+
+logger = get_logger(__name__)
+
+OUTBOX_PENDING = "pending"
+OUTBOX_SENDING = "sending"
+OUTBOX_SENT = "sent"
+OUTBOX_FAILED = "failed"
+
+EMAIL_TASK_KEY = "email_task"
+EMAIL_TASK_PROGRESS_TTL = 86400
+
+# Próxima ejecución programada del dispatcher (timestamp), para no encadenar duplicados
+OUTBOX_SCHEDULED_DISPATCH_KEY = "email_outbox:scheduled_dispatch"
+OUTBOX_MIN_RESCHEDULE_SECONDS = 5
+
+# Estados del detalle de EmailSender en los que el correo no llegó a Gmail
+_NOT_DELIVERED_STATUSES = ("error_conexion", "error_autenticacion")
+# Rechazo 5xx definitivo del destinatario o del mensaje: reintentar no cambia el resultado
+_REJECTED_STATUS = "rechazado"
+
+# Token bucket atómico: recarga por tiempo transcurrido y toma hasta `requested`
+# tokens enteros. Un `requested` negativo devuelve tokens (hasta la capacidad).
+_TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local requested = tonumber(ARGV[4])
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil or ts == nil then
+  tokens = capacity
+  ts = now
+end
+
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local granted = 0
+if requested >= 0 then
+  granted = math.min(requested, math.floor(tokens))
+  tokens = tokens - granted
+else
+  tokens = math.min(capacity, tokens - requested)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], 172800)
+return granted
+"""
+
+
+def request_outbox_dispatch(countdown: Optional[float] = None) -> None:
+    """
+    Encola una ejecución del dispatcher. Si el broker falla no se pierde nada:
+    la siguiente ejecución (o Celery Beat, si está desplegado) drena el outbox.
+    """
+    from app.celery_app import celery_app
+
+    try:
+        celery_app.send_task(
+            'app.tasks.email_tasks.dispatch_email_outbox',
+            queue='email_tasks',
+            countdown=countdown
+        )
+    except Exception as e:
+        logger.warning(f"No se pudo encolar el dispatcher del outbox: {e}")
+
+
+async def schedule_outbox_dispatch(redis, delay_seconds: float) -> None:
+    """
+    Programa el dispatcher para cuando venza el próximo correo diferido, en
+    reintento o con lease vencido, sin depender de Celery Beat.
+
+    Si ya hay una ejecución programada para esa hora o antes no se encola otra:
+    esa ejecución volverá a programar la siguiente.
+    """
+    delay_seconds = max(delay_seconds, OUTBOX_MIN_RESCHEDULE_SECONDS)
+    run_at = time.time() + delay_seconds
+    try:
+        scheduled = await redis.get(OUTBOX_SCHEDULED_DISPATCH_KEY)
+        if scheduled is not None and time.time() < float(scheduled) <= run_at:
+            return
+        await redis.set(OUTBOX_SCHEDULED_DISPATCH_KEY, str(run_at), ex=int(delay_seconds) + 300)
+    except Exception as e:
+        logger.warning(f"No se pudo registrar la ejecución programada del outbox: {e}")
+
+    request_outbox_dispatch(countdown=delay_seconds)
+    logger.info(f"⏰ Dispatcher del outbox programado en {delay_seconds:.0f}s")
+
+
+async def increment_email_task_progress(redis, task_id: str, successful: int = 0, failed: int = 0) -> None:
+    """
+    Suma correos terminados (enviados o descartados) al progreso email_task:{task_id}.
+
+    Los trozos de preparación y los dispatchers escriben en paralelo, por eso los
+    contadores se actualizan con HINCRBY; la tarea pasa a "completed" cuando
+    current alcanza el total que fijó la tarea coordinadora.
+    """
+    if not task_id or successful + failed <= 0:
+        return
+
+    key = f"{EMAIL_TASK_KEY}:{task_id}"
+    try:
+        if not await redis.exists(key):
+            return
+        pipe = redis.pipeline()
+        pipe.hincrby(key, 'successful', successful)
+        pipe.hincrby(key, 'failed', failed)
+        pipe.hincrby(key, 'current', successful + failed)
+        pipe.hget(key, 'total')
+        _, _, current, total = await pipe.execute()
+
+        total = int(total or 0)
+        mapping = {'progress': str(min(int(current * 100 / total), 100)) if total else '100'}
+        if current >= total:
+            mapping['status'] = 'completed'
+            mapping['progress'] = '100'
+        await redis.hset(key, mapping=mapping)
+        await redis.expire(key, EMAIL_TASK_PROGRESS_TTL)
+    except Exception as e:
+        logger.warning(f"No se pudo actualizar el progreso de {key}: {e}")
+
+
+class SmtpTokenBucket:
+    """
+    Token bucket por cuenta SMTP, guardado en Redis y compartido por todos los workers.
+
+    La ráfaga (capacidad) es DAILY_LIMIT * SMTP_BUCKET_BURST_RATIO. Con ratio < 1 el
+    resto del límite se recarga de forma continua durante 24 h, así que en cualquier
+    ventana de 24 horas una cuenta nunca supera su DAILY_LIMIT. Con ratio 1 (el valor
+    por defecto) la cuenta envía su límite completo de inmediato y lo recupera en
+    24 h; el 5.4.5 de Gmail y el failover entre cuentas siguen siendo el tope real.
+    """
+
+    KEY_PREFIX = "smtp_bucket"
+
+    def __init__(self, redis):
+        self.redis = redis
+        self._script = None
+
+    @staticmethod
+    def _parameters(account: dict) -> Tuple[float, float]:
+        daily_limit = max(int(account.get("daily_limit") or 0), 1)
+        ratio = min(max(settings.SMTP_BUCKET_BURST_RATIO, 0.0), 1.0)
+        capacity = max(daily_limit * ratio, 1.0)
+        refill = daily_limit - capacity if capacity < daily_limit else daily_limit
+        rate = max(refill, 1.0) / 86400
+        return capacity, rate
+
+    @classmethod
+    def seconds_per_token(cls, account: dict) -> float:
+        """Tiempo que tarda la cuenta en recuperar un token"""
+        _, rate = cls._parameters(account)
+        return 1 / rate
+
+    async def _call(self, account: dict, requested: int) -> int:
+        if self._script is None:
+            self._script = self.redis.register_script(_TOKEN_BUCKET_SCRIPT)
+        capacity, rate = self._parameters(account)
+        granted = await self._script(
+            keys=[f"{self.KEY_PREFIX}:{account['id']}"],
+            args=[capacity, rate, time.time(), requested],
+        )
+        return int(granted)
+
+    async def acquire(self, account: dict, count: int) -> int:
+        """Toma hasta `count` tokens; retorna cuántos concedió"""
+        if count <= 0:
+            return 0
+        return await self._call(account, count)
+
+    async def refund(self, account: dict, count: int) -> None:
+        """Devuelve tokens de correos que no llegaron al servidor SMTP"""
+        if count > 0:
+            await self._call(account, -count)
+
+
+class EmailOutboxService:
+    """Acceso a tbl_email_outbox: encolar, reclamar y registrar resultados"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def enqueue_many(
+        self,
+        emails_data: List[Dict[str, Any]],
+        task_id: Optional[str] = None
+    ) -> int:
+        """
+        Inserta los correos en el outbox con un solo INSERT multi-fila (sin commit,
+        para que queden en la misma transacción que sus notificaciones).
+
+        Cada email usa el formato de EmailSender.send_batch_optimized
+        (to_emails, subject, html_content, text_content, attach_logo, notification_id)
+        y opcionalmente 'metadata' con datos que el dispatcher necesita al confirmar el envío.
+
+        Returns:
+            int: Número de correos encolados
+        """
+        if not emails_data:
+            return 0
+
+        now = colombia_now()
+        await self.db.execute(
+            insert(EmailOutboxModel).values([
+                {
+                    'int_notification_id': email_data.get('notification_id'),
+                    'json_to_emails': email_data.get('to_emails', []),
+                    'str_subject': email_data.get('subject', '')[:255],
+                    'txt_html_content': email_data.get('html_content', ''),
+                    'txt_text_content': email_data.get('text_content'),
+                    'bln_attach_logo': email_data.get('attach_logo', True),
+                    'str_status': OUTBOX_PENDING,
+                    'int_attempts': 0,
+                    'dat_next_attempt_at': now,
+                    'str_task_id': task_id,
+                    'json_metadata': email_data.get('metadata'),
+                    'created_at': now,
+                    'updated_at': now,
+                }
+                for email_data in emails_data
+            ])
+        )
+        logger.info(f"📥 {len(emails_data)} correos encolados en el outbox (task_id={task_id})")
+        return len(emails_data)
+
+    async def claim_due(self, limit: int) -> List[EmailOutboxModel]:
+        """
+        Reclama hasta `limit` correos listos para enviar y hace commit del lease.
+
+        Incluye los que quedaron en "sending" con el lease vencido (worker caído).
+        SKIP LOCKED permite que varios dispatchers trabajen en paralelo sin repetir filas.
+        """
+        now = colombia_now()
+        due = or_(
+            and_(
+                EmailOutboxModel.str_status == OUTBOX_PENDING,
+                EmailOutboxModel.dat_next_attempt_at <= now
+            ),
+            and_(
+                EmailOutboxModel.str_status == OUTBOX_SENDING,
+                EmailOutboxModel.dat_locked_until < now
+            ),
+        )
+        result = await self.db.execute(
+            select(EmailOutboxModel)
+            .where(due)
+            .order_by(EmailOutboxModel.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        rows = list(result.scalars().all())
+
+        if rows:
+            await self.db.execute(
+                update(EmailOutboxModel)
+                .where(EmailOutboxModel.id.in_([row.id for row in rows]))
+                .values(
+                    str_status=OUTBOX_SENDING,
+                    dat_locked_until=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS),
+                    updated_at=now
+                )
+                .execution_options(synchronize_session=False)
+            )
+        await self.db.commit()
+        return rows
+
+    async def release(self, rows: List[EmailOutboxModel], delay_seconds: float = 0) -> None:
+        """Devuelve correos a "pending" sin contar un intento (p. ej. sin tokens disponibles)"""
+        if not rows:
+            return
+        now = colombia_now()
+        await self.db.execute(
+            update(EmailOutboxModel)
+            .where(EmailOutboxModel.id.in_([row.id for row in rows]))
+            .values(
+                str_status=OUTBOX_PENDING,
+                dat_next_attempt_at=now + timedelta(seconds=delay_seconds),
+                dat_locked_until=None,
+                updated_at=now
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await self.db.commit()
+
+    async def seconds_until_next_due(self) -> Optional[float]:
+        """
+        Segundos hasta que vuelva a haber correos para reclamar: el próximo pendiente
+        (diferido o en reintento) o el próximo lease de "sending" que vence.
+        Retorna None si el outbox no tiene nada pendiente.
+        """
+        next_attempt = (await self.db.execute(
+            select(func.min(EmailOutboxModel.dat_next_attempt_at))
+            .where(EmailOutboxModel.str_status == OUTBOX_PENDING)
+        )).scalar()
+        lease_expiry = (await self.db.execute(
+            select(func.min(EmailOutboxModel.dat_locked_until))
+            .where(EmailOutboxModel.str_status == OUTBOX_SENDING)
+        )).scalar()
+
+        due_times = [value for value in (next_attempt, lease_expiry) if value is not None]
+        if not due_times:
+            return None
+        return max((min(due_times) - colombia_now()).total_seconds(), 0.0)
+
+    @staticmethod
+    def _retry_delay(attempts: int) -> int:
+        """Backoff exponencial: base, 2*base, 4*base... hasta el máximo configurado"""
+        delay = settings.EMAIL_OUTBOX_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0))
+        return min(delay, settings.EMAIL_OUTBOX_RETRY_MAX_SECONDS)
+
+    async def record_results(
+        self,
+        sent: Dict[int, List[EmailOutboxModel]],
+        errors: List[Tuple[EmailOutboxModel, str]],
+        rejected: Optional[List[Tuple[EmailOutboxModel, str]]] = None
+    ) -> Dict[str, Dict[str, int]]:
+        """
+        Registra el resultado de una ronda y hace commit.
+
+        Args:
+            sent: Correos aceptados por el servidor SMTP, agrupados por ID de cuenta
+            errors: Correos con error y su mensaje; se reprograman con backoff o,
+                    al agotar EMAIL_OUTBOX_MAX_ATTEMPTS, se marcan como fallidos
+            rejected: Correos rechazados de forma definitiva (5xx); se marcan
+                    como fallidos sin reintentos
+
+        Returns:
+            Dict[task_id, {'successful', 'failed'}] con los correos que terminaron
+            en esta ronda, para actualizar el progreso de cada tarea
+        """
+        now = colombia_now()
+        finished: Dict[str, Dict[str, int]] = {}
+        sent_notification_ids = []
+        failed_notification_ids = []
+        sent_rows = []
+
+        for account_id, rows in sent.items():
+            if not rows:
+                continue
+            await self.db.execute(
+                update(EmailOutboxModel)
+                .where(EmailOutboxModel.id.in_([row.id for row in rows]))
+                .values(
+                    str_status=OUTBOX_SENT,
+                    int_attempts=EmailOutboxModel.int_attempts + 1,
+                    int_smtp_account_id=account_id,
+                    dat_sent_at=now,
+                    dat_locked_until=None,
+                    str_last_error=None,
+                    updated_at=now
+                )
+                .execution_options(synchronize_session=False)
+            )
+            for row in rows:
+                sent_rows.append(row)
+                if row.int_notification_id:
+                    sent_notification_ids.append(row.int_notification_id)
+                if row.str_task_id:
+                    finished.setdefault(row.str_task_id, {'successful': 0, 'failed': 0})['successful'] += 1
+
+        # Una sola sentencia por combinación (estado, intentos, error)
+        error_groups: Dict[Tuple[str, int, str], List[EmailOutboxModel]] = {}
+        for row, error in errors:
+            attempts = (row.int_attempts or 0) + 1
+            status = OUTBOX_FAILED if attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS else OUTBOX_PENDING
+            error_groups.setdefault((status, attempts, (error or "")[:500]), []).append(row)
+        for row, error in rejected or []:
+            attempts = (row.int_attempts or 0) + 1
+            error_groups.setdefault((OUTBOX_FAILED, attempts, (error or "")[:500]), []).append(row)
+
+        for (status, attempts, error), rows in error_groups.items():
+            await self.db.execute(
+                update(EmailOutboxModel)
+                .where(EmailOutboxModel.id.in_([row.id for row in rows]))
+                .values(
+                    str_status=status,
+                    int_attempts=attempts,
+                    dat_next_attempt_at=now + timedelta(seconds=self._retry_delay(attempts)),
+                    dat_locked_until=None,
+                    str_last_error=error or None,
+                    updated_at=now
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if status != OUTBOX_FAILED:
+                continue
+            for row in rows:
+                if row.int_notification_id:
+                    failed_notification_ids.append(row.int_notification_id)
+                if row.str_task_id:
+                    finished.setdefault(row.str_task_id, {'successful': 0, 'failed': 0})['failed'] += 1
+
+        notification_service = EmailNotificationService(self.db)
+        await notification_service.update_status_bulk(sent_notification_ids, status="sent")
+        await notification_service.update_status_bulk(failed_notification_ids, status="failed")
+
+        await self._mark_invitations_sent(sent_rows)
+
+        await self.db.commit()
+        return finished
+
+    async def _mark_invitations_sent(self, rows: List[EmailOutboxModel]) -> None:
+        """Marca como enviadas las invitaciones a reuniones de los correos confirmados"""
+        by_meeting: Dict[int, Dict[str, Any]] = {}
+        for row in rows:
+            invitation = (row.json_metadata or {}).get('meeting_invitation')
+            if not invitation:
+                continue
+            group = by_meeting.setdefault(
+                invitation['meeting_id'],
+                {'created_by': invitation.get('created_by'), 'entries': []}
+            )
+            group['entries'].append(invitation)
+
+        if not by_meeting:
+            return
+
+        from app.services.meeting_invitation_service import MeetingInvitationService
+
+        invitation_service = MeetingInvitationService(self.db)
+        for meeting_id, group in by_meeting.items():
+            await invitation_service.mark_invitations_sent(
+                meeting_id, group['entries'], created_by=group['created_by']
+            )
+
+
+class EmailOutboxDispatcher:
+    """
+    Drena el outbox por rondas de EMAIL_OUTBOX_BATCH_SIZE correos.
+
+    En cada ronda los correos se reparten entre las cuentas disponibles en
+    proporción a su DAILY_LIMIT (limitado por el saldo de su token bucket) y
+    las cuentas envían en paralelo, cada una con su pool de conexiones.
+    """
+
+    def __init__(self, db: AsyncSession, redis):
+        self.db = db
+        self.redis = redis
+        self.outbox = EmailOutboxService(db)
+        self.config_service = SystemConfigService(db)
+        self.bucket = SmtpTokenBucket(redis)
+        self.sender = EmailSender(db)
+
+    async def run(self, max_rounds: int = 50) -> Dict[str, int]:
+        """Ejecuta rondas hasta vaciar lo pendiente, quedarse sin cuentas/tokens o llegar a max_rounds"""
+        totals = {'sent': 0, 'errors': 0, 'deferred': 0, 'requeued': 0}
+        for _ in range(max_rounds):
+            round_stats = await self.dispatch_round()
+            for k in totals:
+                totals[k] += round_stats[k]
+            if round_stats['sent'] + round_stats['errors'] + round_stats['requeued'] == 0:
+                break
+
+        logger.info(
+            f"📤 Outbox: {totals['sent']} enviados, {totals['errors']} con error, "
+            f"{totals['deferred']} diferidos, {totals['requeued']} reencolados"
+        )
+
+        # Lo diferido, en reintento o huérfano no tiene otro productor que lo despierte
+        delay = await self.next_dispatch_delay()
+        if delay is not None:
+            await schedule_outbox_dispatch(self.redis, delay)
+        return totals
+
+    async def next_dispatch_delay(self) -> Optional[float]:
+        """
+        Segundos hasta la próxima ronda útil, o None si el outbox quedó vacío.
+        Sin cuentas SMTP disponibles (todas excedidas hoy) se vuelve a revisar
+        cada EMAIL_OUTBOX_RETRY_MAX_SECONDS en vez de reintentar de inmediato.
+        """
+        delay = await self.outbox.seconds_until_next_due()
+        if delay is None:
+            return None
+        if not await self.config_service.get_available_smtp_accounts(limit=1):
+            return max(delay, settings.EMAIL_OUTBOX_RETRY_MAX_SECONDS)
+        return delay
+
+    async def dispatch_round(self) -> Dict[str, int]:
+        round_stats = {'sent': 0, 'errors': 0, 'deferred': 0, 'requeued': 0}
+
+        accounts = await self.config_service.get_available_smtp_accounts()
+        if not accounts:
+            logger.warning("⚠️ Sin cuentas SMTP disponibles; el outbox queda pendiente")
+            return round_stats
+
+        rows = await self.outbox.claim_due(settings.EMAIL_OUTBOX_BATCH_SIZE)
+        if not rows:
+            return round_stats
+
+        allocation, unassigned = await self._allocate(accounts, rows)
+        if unassigned:
+            wait = min(SmtpTokenBucket.seconds_per_token(account) for account in accounts)
+            await self.outbox.release(unassigned, delay_seconds=wait)
+            round_stats['deferred'] += len(unassigned)
+            logger.info(f"⏳ {len(unassigned)} correos diferidos {wait:.0f}s por límite de las cuentas SMTP")
+
+        results = await asyncio.gather(
+            *(
+                self.sender.send_batch_with_account(account, [self._email_data(row) for row in account_rows])
+                for account, account_rows in allocation
+            ),
+            return_exceptions=True
+        )
+
+        sent: Dict[int, List[EmailOutboxModel]] = {}
+        errors: List[Tuple[EmailOutboxModel, str]] = []
+        rejected: List[Tuple[EmailOutboxModel, str]] = []
+        exceeded_rows: List[EmailOutboxModel] = []
+
+        for (account, account_rows), result in zip(allocation, results):
+            if isinstance(result, Exception):
+                logger.error(f"❌ Error enviando con cuenta SMTP {account['id']}: {result}")
+                errors.extend((row, str(result)) for row in account_rows)
+                await self.bucket.refund(account, len(account_rows))
+                continue
+
+            rate_limited, stats, not_attempted = result
+            rows_by_id = {row.id: row for row in account_rows}
+            not_delivered = 0
+
+            for detail in stats.get('detalles', []):
+                row = rows_by_id.pop(detail.get('outbox_id'), None)
+                if row is None:
+                    continue
+                if detail.get('status') == 'exitoso':
+                    sent.setdefault(account['id'], []).append(row)
+                elif detail.get('status') == _REJECTED_STATUS:
+                    rejected.append((row, detail.get('error') or detail.get('status')))
+                else:
+                    errors.append((row, detail.get('error') or detail.get('status')))
+                    if detail.get('status') in _NOT_DELIVERED_STATUSES:
+                        not_delivered += 1
+
+            for email_data in not_attempted:
+                row = rows_by_id.pop(email_data['outbox_id'], None)
+                if row is not None:
+                    exceeded_rows.append(row)
+
+            # Cualquier fila sin detalle se trata como error para no dejarla en "sending"
+            errors.extend((row, "Sin resultado del envío") for row in rows_by_id.values())
+
+            if rate_limited:
+                await self.config_service.mark_smtp_account_exceeded(account['id'])
+                logger.warning(
+                    f"⚠️ Cuenta SMTP {account['id']} excedió su límite; "
+                    f"{len(not_attempted)} correos vuelven al outbox"
+                )
+            else:
+                await self.bucket.refund(account, not_delivered)
+
+        # Los no intentados por límite de Gmail quedan disponibles para otra cuenta
+        await self.outbox.release(exceeded_rows)
+        round_stats['requeued'] = len(exceeded_rows)
+
+        finished = await self.outbox.record_results(sent, errors, rejected)
+        await self._update_progress(finished)
+
+        round_stats['sent'] = sum(len(rows) for rows in sent.values())
+        round_stats['errors'] = len(errors) + len(rejected)
+        return round_stats
+
+    async def _allocate(
+        self,
+        accounts: List[Dict],
+        rows: List[EmailOutboxModel]
+    ) -> Tuple[List[Tuple[Dict, List[EmailOutboxModel]]], List[EmailOutboxModel]]:
+        """
+        Asigna filas a cuentas en proporción a DAILY_LIMIT; una segunda pasada
+        cubre con las cuentas que aún tienen saldo lo que las demás no pudieron tomar.
+        """
+        remaining = len(rows)
+        total_limit = sum(max(int(account.get('daily_limit') or 0), 1) for account in accounts)
+        grants = {account['id']: 0 for account in accounts}
+
+        for account in accounts:
+            if remaining <= 0:
+                break
+            share = math.ceil(len(rows) * max(int(account.get('daily_limit') or 0), 1) / total_limit)
+            granted = await self.bucket.acquire(account, min(share, remaining))
+            grants[account['id']] += granted
+            remaining -= granted
+
+        for account in accounts:
+            if remaining <= 0:
+                break
+            granted = await self.bucket.acquire(account, remaining)
+            grants[account['id']] += granted
+            remaining -= granted
+
+        allocation = []
+        position = 0
+        for account in accounts:
+            count = grants[account['id']]
+            if count:
+                allocation.append((account, rows[position:position + count]))
+                position += count
+        return allocation, rows[position:]
+
+    @staticmethod
+    def _email_data(row: EmailOutboxModel) -> Dict[str, Any]:
+        return {
+            'to_emails': row.json_to_emails,
+            'subject': row.str_subject,
+            'html_content': row.txt_html_content,
+            'text_content': row.txt_text_content,
+            'attach_logo': row.bln_attach_logo,
+            'outbox_id': row.id,
+        }
+
+    async def _update_progress(self, finished: Dict[str, Dict[str, int]]) -> None:
+        """Suma los correos terminados al progreso email_task:{task_id} que consulta el frontend"""
+        for task_id, counts in finished.items():
+            await increment_email_task_progress(
+                self.redis, task_id, successful=counts['successful'], failed=counts['failed']
+            )
@@ -17,10 +17,11 @@ from app.models.data_user_model import DataUserModel
 from app.models.user_residential_unit_model import UserResidentialUnitModel
 from app.models.residential_unit_model import ResidentialUnitModel
 from app.utils.email_sender import EmailSender
+from app.utils.email_templates import get_email_template
 from app.services.email_notification_service import EmailNotificationService
+from app.services.email_outbox_service import EmailOutboxService, request_outbox_dispatch
 from app.core.config import settings
 from app.services.qr_service import qr_service
-from jinja2 import Template
         
 logger = logging.getLogger(__name__)
 
@@ -65,11 +66,6 @@ class EmailService:
             qr_base64: QR en base64 ya generado (opcional)
         """
         try:
-            template_path = self.templates_dir / "email_qr_access.html"
-            
-            with open(template_path, 'r', encoding='utf-8') as file:
-                template_content = file.read()
-            
             qr_image_url = qr_base64 or f"https://api.qrserver.com/v1/create-qr-code/?size=200x200&data={auto_login_url}"
             
             # Obtener información de soporte técnico
@@ -78,7 +74,7 @@ class EmailService:
             support_data = await support_service.get_support_info(residential_unit_id)
             
             # Renderizar template
-            template = Template(template_content)
+            template = get_email_template("email_qr_access.html")
             html_content = template.render(
                 resident_name=resident_name,
                 username=username,
@@ -108,14 +104,12 @@ class EmailService:
             logger.error(f"❌ Error al enviar correo con QR a {to_email}: {str(e)}")
             raise
     
-    def _load_template(self, template_name: str) -> str:
-        """Carga una plantilla HTML desde el sistema de archivos"""
-        template_path = self.templates_dir / template_name
+    def _load_template(self, template_name: str):
+        """Obtiene una plantilla compilada del entorno Jinja2 compartido"""
         try:
-            with open(template_path, 'r', encoding='utf-8') as f:
-                return f.read()
+            return get_email_template(template_name)
         except FileNotFoundError:
-            logger.error(f"Plantilla no encontrada: {template_path}")
+            logger.error(f"Plantilla no encontrada: {self.templates_dir / template_name}")
             raise
     
     def _format_datetime(self, dt: datetime) -> tuple:
@@ -144,13 +138,12 @@ class EmailService:
         
         return date_str, time_str
     
-    def _render_template(self, template: str, data: dict) -> str:
+    def _render_template(self, template, data: dict) -> str:
         """
-        Renderiza una plantilla con los datos proporcionados usando Jinja2.
+        Renderiza una plantilla compilada con los datos proporcionados usando Jinja2.
         Soporta condicionales {% if %}, bucles {% for %}, y filtros de Jinja2.
         """
-        template_obj = Template(template)
-        return template_obj.render(**data)
+        return template.render(**data)
     
     async def send_meeting_invitation(
         self,
@@ -160,8 +153,9 @@ class EmailService:
         frontend_url: Optional[str] = None
     ) -> dict:
         """
-        Envía invitaciones por correo a usuarios de una reunión.
-        Registra cada envío en tbl_email_notifications.
+        Encola en el outbox las invitaciones por correo a usuarios de una reunión.
+        Registra cada envío en tbl_email_notifications; el dispatcher del outbox
+        actualiza su estado al enviarlo.
         Si no se especifican user_ids, se envía a todos los usuarios de la unidad residencial.
         
         Args:
@@ -309,54 +303,34 @@ class EmailService:
                 emails_to_send.append({
                     "to_emails": [data_user.str_email],
                     "subject": f"Invitación: {meeting.str_title}",
-                    "html_content": html_content
+                    "html_content": html_content,
+                    "notification_id": notification.id
                 })
             
-            # ENVIAR EMAILS usando credenciales de DB
-            stats = await self.email_sender.send_bulk_emails_async(emails_to_send)
-            
-            # ACTUALIZAR ESTADO DE NOTIFICACIONES
-            # Necesito identificar cuáles emails se enviaron exitosamente
-            # send_bulk_emails retorna: {'exitosos': int, 'fallidos': int, 'detalles': list}
-            
-            # Si send_bulk_emails NO retorna detalles de cada email individual,
-            # asumimos que todos se enviaron (o fallaron todos)
-            if stats.get('exitosos', 0) > 0:
-                # Marcar todas las notificaciones como "sent"
-                for email, notification_id in notification_mapping.items():
-                    await notification_service.update_status(
-                        notification_id=notification_id,
-                        status="sent",
-                        commit=False  # No hacer commit individual
-                    )
-            
-            if stats.get('fallidos', 0) > 0:
-                # Si hay fallidos pero no tenemos detalles, log de advertencia
-                logger.warning(
-                    f" {stats['fallidos']} emails fallaron. "
-                    f"No se puede actualizar estado individual de notificaciones."
-                )
+            # ENCOLAR EN EL OUTBOX: el dispatcher envía y actualiza cada notificación
+            queued = await EmailOutboxService(db).enqueue_many(emails_to_send)
             
             # 6️⃣ ACTUALIZAR CONTADOR DE INVITADOS EN LA REUNIÓN
             total_invitados = len(notification_mapping)
             meeting.int_total_invitated = total_invitados
             meeting.updated_at = colombia_now()
 
-            # 7️⃣ COMMIT DE TODAS LAS NOTIFICACIONES Y ACTUALIZACIÓN DE REUNIÓN
+            # 7️⃣ COMMIT DE NOTIFICACIONES, OUTBOX Y ACTUALIZACIÓN DE REUNIÓN
             await db.commit()
+            request_outbox_dispatch()
 
             logger.info(
-                f"Invitaciones enviadas para reunión {meeting_id}: "
-                f"{stats['exitosos']} exitosos, {stats['fallidos']} fallidos. "
+                f"Invitaciones encoladas para reunión {meeting_id}: {queued} correos. "
                 f"📧 {len(notification_mapping)} notificaciones registradas. "
                 f"👥 Total de invitados registrados: {total_invitados}"
             )
 
-            # Agregar info de notificaciones al resultado
-            stats['notifications_created'] = len(notification_mapping)
-            stats['total_invitados'] = total_invitados
-
-            return stats
+            return {
+                "total": len(emails_to_send),
+                "encolados": queued,
+                "notifications_created": len(notification_mapping),
+                "total_invitados": total_invitados
+            }
             
         except Exception as e:
             await db.rollback()
@@ -410,11 +384,6 @@ class EmailService:
             bool: True si se envió exitosamente, False en caso contrario
         """
         try:
-            template_path = self.templates_dir / "email_admin_credentials.html"
-            
-            with open(template_path, 'r', encoding='utf-8') as file:
-                template_content = file.read()
-
             auto_login_url = None
             if auto_login_token:
                 effective_url = (frontend_url or settings.FRONTEND_URL or "").rstrip("/")
@@ -427,7 +396,7 @@ class EmailService:
             support_data = await support_service.get_support_info(residential_unit_id)
             
             # Renderizar el template con los datos usando Jinja2
-            template = Template(template_content)
+            template = get_email_template("email_admin_credentials.html")
             html_content = template.render(
                 firstname=firstname,
                 lastname=lastname,
@@ -484,17 +453,12 @@ class EmailService:
         frontend_url: Optional[str] = None,
     ) -> bool:
         try:
-            template_path = self.templates_dir / "email_coproprietario_credentials.html"
-
-            with open(template_path, 'r', encoding='utf-8') as file:
-                template_content = file.read()
-
             auto_login_url = None
             if auto_login_token:
                 auto_login_url = f"{frontend_url}/auto-login/{auto_login_token}"
                 logger.info(f"🔗 URL de auto-login generada para {to_email}")
 
-            template = Template(template_content)
+            template = get_email_template("email_coproprietario_credentials.html")
             html_content = template.render(
                 firstname=firstname,
                 lastname=lastname,
@@ -564,11 +528,6 @@ class EmailService:
             frontend_url: URL base del frontend para construir auto-login URL
         """
         try:
-            template_path = self.templates_dir / "email_guest_credentials.html"
-            
-            with open(template_path, 'r', encoding='utf-8') as file:
-                template_content = file.read()
-            
             auto_login_url = None
             if auto_login_token:
                 auto_login_url = f"{frontend_url}/auto-login/{auto_login_token}"
@@ -580,7 +539,7 @@ class EmailService:
             support_data = await support_service.get_support_info(residential_unit_id)
             
             # Renderizar template
-            template = Template(template_content)
+            template = get_email_template("email_guest_credentials.html")
             html_content = template.render(
                 firstname=firstname,
                 lastname=lastname,
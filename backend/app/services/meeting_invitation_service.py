@@ -1,10 +1,9 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.orm import selectinload
 from datetime import datetime
 from app.utils.timezone_utils import colombia_now
 from typing import List, Dict, Optional
-import pandas as pd
 from decimal import Decimal
 
 from app.models.meeting_invitation_model import MeetingInvitationModel
@@ -16,6 +15,7 @@ from app.schemas.meeting_invitation_schema import MeetingInvitationCreate
 from app.schemas.user_schema import UserCreate
 from app.schemas.data_user_schema import DataUserCreate
 from app.core.security import security_manager
+from app.auth.principal import principal_cache
 from app.core.logging_config import get_logger
 from app.services.email_service import EmailService
 
@@ -71,6 +71,8 @@ class MeetingInvitationService:
             
             await self.db.commit()
             await self.db.refresh(invitation)
+            if user_activated:
+                await principal_cache.invalidate_user_ids([user.id])
             
             logger.info(
                 f"✅ Invitación creada - User: {invitation_data.int_user_id}, "
@@ -159,6 +161,7 @@ class MeetingInvitationService:
                 raise ValueError(f"La reunión con ID {meeting_id} no existe")
 
             # Leer el archivo Excel
+            import pandas as pd
             df = pd.read_excel(file_content)
             
             # Validar columnas requeridas
@@ -300,6 +303,68 @@ class MeetingInvitationService:
             logger.error(f"Error al actualizar invitación: {e}")
             raise
 
+    async def mark_invitations_sent(
+        self,
+        meeting_id: int,
+        entries: List[Dict],
+        created_by: Optional[int] = None
+    ) -> None:
+        """
+        Registra como enviadas las invitaciones de los usuarios cuyo correo salió (sin commit).
+
+        Actualiza en bloque las invitaciones existentes y crea las que faltan.
+        Cada entrada trae user_id, voting_weight y apartment_number.
+        """
+        if not entries:
+            return
+
+        now = colombia_now()
+        user_ids = [entry["user_id"] for entry in entries]
+
+        await self.db.execute(
+            update(MeetingInvitationModel)
+            .where(
+                MeetingInvitationModel.int_meeting_id == meeting_id,
+                MeetingInvitationModel.int_user_id.in_(user_ids)
+            )
+            .values(
+                str_invitation_status="sent",
+                dat_sent_at=now,
+                int_delivery_attemps=MeetingInvitationModel.int_delivery_attemps + 1,
+                updated_at=now
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+        result = await self.db.execute(
+            select(MeetingInvitationModel.int_user_id).where(
+                MeetingInvitationModel.int_meeting_id == meeting_id,
+                MeetingInvitationModel.int_user_id.in_(user_ids)
+            )
+        )
+        existing_ids = {row[0] for row in result.all()}
+
+        for entry in entries:
+            if entry["user_id"] in existing_ids:
+                continue
+            existing_ids.add(entry["user_id"])
+            voting_weight = Decimal(str(entry.get("voting_weight") or "1.0"))
+            self.db.add(MeetingInvitationModel(
+                int_meeting_id=meeting_id,
+                int_user_id=entry["user_id"],
+                dec_voting_weight=voting_weight,
+                dec_quorum_base=voting_weight,
+                str_apartment_number=entry.get("apartment_number") or "N/A",
+                str_invitation_status="sent",
+                str_response_status="no_response",
+                dat_sent_at=now,
+                int_delivery_attemps=1,
+                bln_will_attend=False,
+                bln_actually_attended=False,
+                created_by=created_by,
+                updated_by=created_by
+            ))
+
     async def delete_invitation(self, invitation_id: int) -> bool:
         """Elimina una invitación"""
         try:
@@ -443,6 +508,7 @@ class MeetingInvitationService:
                         logger.info(f"🔓 Usuario {user_id} ({user.str_username}) activado automáticamente al recibir invitación a reunión {meeting_id}")
                 
                 await self.db.commit()
+                await principal_cache.invalidate_user_ids(successfully_invited_ids)
             
             # Actualizar contador de invitados en la reunión
             meeting = await self.db.get(MeetingModel, meeting_id)
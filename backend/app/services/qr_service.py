@@ -2,12 +2,9 @@
 Servicio mejorado para generación de códigos QR personalizados por usuario.
 Utiliza qrcode para generación local de QR con más opciones de personalización.
 """
-import qrcode
-import qrcode.constants
 from io import BytesIO
 import base64
 from typing import Optional, Dict, Tuple
-from PIL import Image, ImageDraw, ImageFont
 from pathlib import Path
 import logging
 from datetime import datetime
@@ -51,6 +48,11 @@ class QRCodeService:
             str: Imagen QR en formato base64
         """
         try:
+            # Importación diferida: qrcode y PIL solo se cargan al generar QRs
+            import qrcode
+            import qrcode.constants
+            from PIL import Image, ImageDraw, ImageFont
+
             # Configuración avanzada del QR
             qr = qrcode.QRCode(
                 version=1,  # Controla el tamaño del QR (1-40)
@@ -170,6 +172,11 @@ class QRCodeService:
             str: Imagen QR en formato base64
         """
         try:
+            # Importación diferida: qrcode y PIL solo se cargan al generar QRs
+            import qrcode
+            import qrcode.constants
+            from PIL import Image
+
             qr = qrcode.QRCode(
                 version=1,
                 error_correction=qrcode.constants.ERROR_CORRECT_M,
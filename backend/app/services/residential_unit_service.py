@@ -1,18 +1,17 @@
 from ast import Dict
+import asyncio
 from datetime import datetime
 from app.utils.timezone_utils import colombia_now
-from decimal import Decimal
-from typing import List, Optional
-import pandas as pd
-from io import BytesIO
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, List, Optional
 import secrets
 import string
+import time
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, insert, and_, func, or_
+from sqlalchemy import select, delete, insert, update, and_, func, or_
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import selectinload
 import logging
-from pathlib import Path
 
 from app.models.residential_unit_model import ResidentialUnitModel
 from app.models.user_residential_unit_model import UserResidentialUnitModel
@@ -21,6 +20,7 @@ from app.models.data_user_model import DataUserModel
 from app.schemas.residential_unit_schema import AdministratorData, ResidentialUnitCreate, ResidentialUnitResponse
 from app.core.exceptions import ServiceException, ResourceNotFoundException
 from app.core.security import security_manager 
+from app.auth.principal import principal_cache
 from app.services.email_notification_service import EmailNotificationService
 
 from app.services.simple_auto_login_service import simple_auto_login_service
@@ -43,10 +43,17 @@ def _normalize_phone_co(phone) -> Optional[str]:
         return f'+{digits}'
     return f'+57{digits}'
 from app.services.support_service import SupportService
+from app.utils.excel_reader import ExcelRowReader
+from app.utils.email_templates import get_email_template
 from app.core.logging_config import get_logger
 
 logger = get_logger(__name__)
 
+# Tamaño adaptativo de los lotes de la carga masiva de copropietarios
+RESIDENT_BATCH_MIN_SIZE = 50
+RESIDENT_BATCH_MAX_SIZE = 1000
+RESIDENT_BATCH_TARGET_SECONDS = 0.5
+
 class ResidentialUnitService:
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -226,6 +233,7 @@ class ResidentialUnitService:
         try:
             # Extraer datos del administrador antes de crear la unidad
             admin_data = residential_unit_data.administrator
+            access_changed_user_ids = []
 
             # Crear la unidad residencial (sin el campo administrator)
             unit_dict = residential_unit_data.model_dump(exclude={'administrator'})
@@ -260,6 +268,7 @@ class ResidentialUnitService:
                         # Actualizar bln_allow_entry en tbl_users
                         existing_user.bln_allow_entry = True
                         existing_user.updated_at = colombia_now()
+                        access_changed_user_ids.append(existing_user.id)
 
                         logger.info(f"Usuario {existing_user.id} asignado como administrador de la unidad {residential_unit.id}")
 
@@ -330,6 +339,7 @@ class ResidentialUnitService:
             # Commit de todas las operaciones
             await self.db.commit()
             await self.db.refresh(residential_unit)
+            await principal_cache.invalidate_user_ids(access_changed_user_ids)
 
             return ResidentialUnitResponse.model_validate(residential_unit)
 
@@ -563,7 +573,13 @@ class ResidentialUnitService:
             return 0
 
         user_ids = [r.int_user_id for r in records]
+        await self._delete_residents(user_ids)
+        await self._publish_resident_event(unit_id, "residents_cleared")
+        logger.info(f"🗑️ {len(user_ids)} copropietarios eliminados de unidad {unit_id} antes de reimportar")
+        return len(user_ids)
 
+    async def _delete_residents(self, user_ids: List[int]) -> None:
+        """Elimina los usuarios indicados y sus DataUsers si ningún otro usuario los referencia."""
         du_result = await self.db.execute(
             select(UserModel.int_data_user_id).where(UserModel.id.in_(user_ids))
         )
@@ -586,40 +602,119 @@ class ResidentialUnitService:
                 await self.db.execute(delete(DataUserModel).where(DataUserModel.id.in_(deletable)))
 
         await self.db.commit()
-        await self._publish_resident_event(unit_id, "residents_cleared")
-        logger.info(f"🗑️ {len(user_ids)} copropietarios eliminados de unidad {unit_id} antes de reimportar")
-        return len(user_ids)
+        await principal_cache.invalidate_user_ids(user_ids)
+
+    async def _fetch_taken_usernames(self, base_usernames: List[str]) -> set:
+        """Una sola query con los usernames existentes que chocan con las bases (exactos y con sufijo)."""
+        taken = set()
+        unique_bases = list(set(base_usernames))
+        # Trozos para no exceder el tamaño de la consulta en archivos muy grandes
+        for start in range(0, len(unique_bases), 1000):
+            like_clauses = []
+            for uname in unique_bases[start:start + 1000]:
+                like_clauses.append(UserModel.str_username == uname)
+                like_clauses.append(UserModel.str_username.like(f"{uname}.%"))
+            existing_result = await self.db.execute(
+                select(UserModel.str_username).where(or_(*like_clauses))
+            )
+            taken.update(row[0] for row in existing_result.all())
+        return taken
+
+    async def _insert_residents_bulk(
+        self,
+        rows: Iterable[dict],
+        unit_id: int,
+        results: dict,
+        progress_callback=None
+    ) -> None:
+        """
+        Inserta las filas válidas en lotes con tamaño adaptativo a medida que el
+        iterable las entrega, sin cargar el archivo completo en memoria.
 
-    async def _insert_resident_batch(self, batch: list, unit_id: int, results: dict):
-        """Inserta un lote de copropietarios en 3 bulk INSERTs: DataUsers → Users → UserResidentialUnits."""
-        base_usernames = [b['base_username'] for b in batch]
+        El tamaño del lote se ajusta para que cada transacción dure cerca de
+        RESIDENT_BATCH_TARGET_SECONDS.
 
-        # Una sola query para encontrar conflictos de username (exacto y con sufijo)
-        like_clauses = []
-        for uname in set(base_usernames):
-            like_clauses.append(UserModel.str_username == uname)
-            like_clauses.append(UserModel.str_username.like(f"{uname}.%"))
-        existing_result = await self.db.execute(
-            select(UserModel.str_username).where(or_(*like_clauses))
-        )
-        existing_in_db = {row[0] for row in existing_result.all()}
+        Si las filas ya están en una lista (modo diff) los usernames ocupados se
+        consultan una sola vez para todo el archivo. En streaming se consultan por
+        lote: es una consulta indexada extra por lote a cambio de no retener las
+        bases de username de todo el archivo antes de insertar.
+        """
+        prefetched = isinstance(rows, list)
+        if prefetched:
+            taken_usernames = await self._fetch_taken_usernames([row['base_username'] for row in rows])
+        else:
+            taken_usernames = set()
+        batch_size = RESIDENT_BATCH_MIN_SIZE
+        batch = []
+
+        for row in rows:
+            batch.append(row)
+            if len(batch) < batch_size:
+                continue
+
+            elapsed = await self._insert_resident_batch(
+                batch, unit_id, results, taken_usernames, fetch_taken=not prefetched
+            )
+            if progress_callback:
+                await progress_callback(results['successful'] + results['failed'], results['total_rows'])
+
+            # Ajustar el siguiente lote a la velocidad medida de la BD
+            if elapsed > 0:
+                batch_size = int(len(batch) * RESIDENT_BATCH_TARGET_SECONDS / elapsed)
+            batch_size = max(RESIDENT_BATCH_MIN_SIZE, min(RESIDENT_BATCH_MAX_SIZE, batch_size))
+            batch = []
+
+        if batch:
+            await self._insert_resident_batch(
+                batch, unit_id, results, taken_usernames, fetch_taken=not prefetched
+            )
+            if progress_callback:
+                await progress_callback(results['successful'] + results['failed'], results['total_rows'])
+
+    async def _insert_resident_batch(
+        self,
+        batch: list,
+        unit_id: int,
+        results: dict,
+        taken_usernames: set,
+        fetch_taken: bool = True
+    ) -> float:
+        """
+        Inserta un lote de copropietarios en 3 INSERT multi-fila: DataUsers → Users → UserResidentialUnits.
+
+        Args:
+            taken_usernames: Usernames ocupados; se completa con los asignados en el lote
+            fetch_taken: Si es True, antes se agregan los existentes en la BD que chocan
+                con el lote (False cuando el llamador ya los consultó para todo el archivo)
+
+        Returns:
+            Segundos que tomó la parte de base de datos (para ajustar el tamaño del lote)
+        """
+        # Esperar los hashes Argon2 del lote (encolados al parsear cada fila)
+        password_hashes = await asyncio.gather(*(b['password_hash'] for b in batch))
+        for b, password_hash in zip(batch, password_hashes):
+            b['password_hash'] = password_hash
+
+        if fetch_taken:
+            taken_usernames.update(await self._fetch_taken_usernames([b['base_username'] for b in batch]))
 
-        used_in_batch: set = set()
         final_usernames = []
-        for base_uname in base_usernames:
+        for b in batch:
+            base_uname = b['base_username']
             username = base_uname
             counter = 0
-            while username in existing_in_db or username in used_in_batch:
+            while username in taken_usernames:
                 counter += 1
                 username = f"{base_uname}.{counter}"
             final_usernames.append(username)
-            used_in_batch.add(username)
+            taken_usernames.add(username)
 
+        started_at = time.perf_counter()
         now = colombia_now()
-        from sqlalchemy import text
 
-        # Bulk insert DataUsers — MySQL no soporta RETURNING; usamos LAST_INSERT_ID()
-        await self.db.execute(
+        # Bulk insert DataUsers — MySQL no soporta RETURNING; lastrowid es el primer
+        # ID del INSERT multi-fila (LAST_INSERT_ID) sin una consulta adicional
+        du_result = await self.db.execute(
             insert(DataUserModel).values([
                 {'str_firstname': b['firstname'], 'str_lastname': b['lastname'],
                  'str_email': b['email'], 'str_phone': b['phone'],
@@ -627,11 +722,11 @@ class ResidentialUnitService:
                 for b in batch
             ])
         )
-        first_du_id = (await self.db.execute(text("SELECT LAST_INSERT_ID()"))).scalar()
+        first_du_id = du_result.lastrowid
         data_user_ids = list(range(first_du_id, first_du_id + len(batch)))
 
         # Bulk insert Users
-        await self.db.execute(
+        user_result = await self.db.execute(
             insert(UserModel).values([
                 {'int_data_user_id': du_id, 'str_username': uname,
                  'str_password_hash': b['password_hash'], 'int_id_rol': 3,
@@ -640,7 +735,7 @@ class ResidentialUnitService:
                 for du_id, uname, b in zip(data_user_ids, final_usernames, batch)
             ])
         )
-        first_u_id = (await self.db.execute(text("SELECT LAST_INSERT_ID()"))).scalar()
+        first_u_id = user_result.lastrowid
         user_ids = list(range(first_u_id, first_u_id + len(batch)))
 
         # Bulk insert UserResidentialUnits
@@ -655,18 +750,245 @@ class ResidentialUnitService:
         )
 
         await self.db.commit()
+        elapsed = time.perf_counter() - started_at
         await self._publish_resident_event(unit_id, "batch_added", len(batch))
         results['successful'] += len(batch)
         results['users_created'] += len(batch)
         results['user_ids'].extend(user_ids)
-        logger.info(f"💾 Batch de {len(batch)} registros insertados en bulk")
+        logger.info(f"💾 Batch de {len(batch)} registros insertados en bulk ({elapsed:.2f}s)")
+        return elapsed
+
+    def _parse_resident_row(self, row_dict: dict, hash_password: bool = True) -> dict:
+        """
+        Valida una fila del Excel de copropietarios y la convierte al formato de batch.
+        Lanza ValueError con el mensaje para el reporte de errores si la fila es inválida.
+
+        Con hash_password=False la fila conserva la contraseña en 'password' y el
+        hash se encola después (solo para las filas que realmente se insertan).
+        """
+        email = str(row_dict['email']).strip().lower()
+        firstname = str(row_dict['firstname']).strip()
+        lastname = str(row_dict['lastname']).strip()
+        apartment_number = str(row_dict['apartment_number']).strip()
+        raw_phone = row_dict.get('phone')
+        phone = _normalize_phone_co(str(raw_phone).strip() if raw_phone is not None else None)
+        raw_password = row_dict.get('password')
+        password_from_excel = str(raw_password).strip() if raw_password is not None else ''
+        password = password_from_excel if password_from_excel and len(password_from_excel) >= 8 \
+            else self._generate_secure_password(firstname, lastname, apartment_number)
+
+        try:
+            voting_weight = Decimal(str(row_dict['voting_weight']))
+            if voting_weight <= 0 or voting_weight > 100:
+                raise ValueError("El peso de votación debe estar entre 0 y 100")
+        except (ValueError, TypeError, InvalidOperation):
+            raise ValueError(f"Peso de votación inválido: {row_dict.get('voting_weight')}. Debe ser un número (ej: 0.25 o 1)")
+
+        if len(firstname) < 2:
+            raise ValueError("El nombre debe tener al menos 2 caracteres")
+        if len(lastname) < 2:
+            raise ValueError("El apellido debe tener al menos 2 caracteres")
+        if '@' not in email:
+            raise ValueError("Email inválido")
+        if len(apartment_number) == 0:
+            raise ValueError("Número de apartamento requerido")
+
+        parsed = {
+            'email': email,
+            'firstname': firstname,
+            'lastname': lastname,
+            'phone': phone,
+            'base_username': f"{firstname.lower()}.{lastname.lower()}.{apartment_number}".replace(" ", ""),
+            'apartment_number': apartment_number,
+            'voting_weight': voting_weight,
+        }
+        if hash_password:
+            # Se calcula en el pool de hashing mientras se siguen parseando filas
+            parsed['password_hash'] = security_manager.submit_password_hash(password)
+        else:
+            parsed['password'] = password
+        return parsed
+
+    @staticmethod
+    def _resident_key(apartment_number: str, email: str) -> tuple:
+        """Llave de una fila del modo diferencial: apartamento + email normalizados."""
+        return (str(apartment_number).strip().lower(), str(email).strip().lower())
+
+    @classmethod
+    def _match_existing_residents(cls, parsed_rows: list, existing_rows: list) -> list:
+        """
+        Empareja cada fila del Excel con un copropietario actual (o None si es nuevo).
+
+        Se empareja por apartamento + email exactos, luego por email (cambio de
+        apartamento) y por último por apartamento (corrección de email). Cada
+        copropietario actual se usa una sola vez y las pasadas exactas van primero
+        para que una coincidencia parcial no le quite su fila a una exacta.
+        """
+        matches = [None] * len(parsed_rows)
+        unclaimed = list(existing_rows)
+
+        key_functions = [
+            lambda apartment, email: (apartment, email),
+            lambda apartment, email: email,
+            lambda apartment, email: apartment,
+        ]
+        for key_of in key_functions:
+            candidates = {}
+            for row in unclaimed:
+                candidates.setdefault(key_of(*cls._resident_key(row.str_apartment_number, row.str_email)), []).append(row)
+
+            claimed = set()
+            for index, parsed in enumerate(parsed_rows):
+                if matches[index] is not None:
+                    continue
+                rows = candidates.get(key_of(*cls._resident_key(parsed['apartment_number'], parsed['email'])))
+                if rows:
+                    matches[index] = rows.pop(0)
+                    claimed.add(matches[index].uru_id)
+            unclaimed = [row for row in unclaimed if row.uru_id not in claimed]
+
+        return matches
+
+    async def _sync_residents_diff(
+        self,
+        reader: ExcelRowReader,
+        unit_id: int,
+        results: dict,
+        progress_callback=None
+    ) -> None:
+        """
+        Reimportación diferencial: compara el Excel con los copropietarios actuales
+        (por email o apartamento, ver _match_existing_residents) y aplica solo los cambios.
+
+        - inserted: filas nuevas → bulk INSERT (solo aquí se generan contraseñas)
+        - updated: email, nombre, teléfono, apartamento o coeficiente cambiaron →
+          bulk UPDATE por PK (el usuario conserva credenciales y sesiones)
+        - unchanged: no se tocan (conservan credenciales, sesiones y tokens)
+        - removed: copropietarios que ya no están en el Excel → se eliminan
+
+        El detalle queda en results['diff'].
+        """
+        existing_result = await self.db.execute(
+            select(
+                UserResidentialUnitModel.id.label('uru_id'),
+                UserResidentialUnitModel.int_user_id,
+                UserResidentialUnitModel.str_apartment_number,
+                UserResidentialUnitModel.dec_default_voting_weight,
+                DataUserModel.id.label('data_user_id'),
+                DataUserModel.str_email,
+                DataUserModel.str_firstname,
+                DataUserModel.str_lastname,
+                DataUserModel.str_phone,
+            )
+            .join(UserModel, UserModel.id == UserResidentialUnitModel.int_user_id)
+            .join(DataUserModel, DataUserModel.id == UserModel.int_data_user_id)
+            .where(
+                and_(
+                    UserResidentialUnitModel.int_residential_unit_id == unit_id,
+                    UserResidentialUnitModel.bool_is_admin == False,
+                    UserResidentialUnitModel.str_apartment_number != 'SOPORTE'
+                )
+            )
+        )
+        existing_rows = existing_result.all()
+
+        parsed_rows = []
+        seen_keys = set()
+
+        for row_number, row_dict in reader.rows():
+            try:
+                parsed = self._parse_resident_row(row_dict, hash_password=False)
+                key = self._resident_key(parsed['apartment_number'], parsed['email'])
+                if key in seen_keys:
+                    raise ValueError("Fila duplicada: el apartamento y email ya aparecen en el archivo")
+                seen_keys.add(key)
+                parsed_rows.append(parsed)
+            except Exception as e:
+                results['errors'].append({
+                    'row': row_number,
+                    'email': row_dict.get('email', 'N/A'),
+                    'apartment': row_dict.get('apartment_number', 'N/A'),
+                    'error': str(e)
+                })
+                results['failed'] += 1
+
+        to_insert = []
+        data_user_updates = []
+        unit_updates = []
+        matched_uru_ids = set()
+        unchanged = 0
+
+        for parsed, current in zip(parsed_rows, self._match_existing_residents(parsed_rows, existing_rows)):
+            if current is None:
+                to_insert.append(parsed)
+                continue
+            matched_uru_ids.add(current.uru_id)
+
+            changed = False
+            if (current.str_email, current.str_firstname, current.str_lastname, current.str_phone or None) != \
+                    (parsed['email'], parsed['firstname'], parsed['lastname'], parsed['phone']):
+                data_user_updates.append({
+                    'id': current.data_user_id,
+                    'str_email': parsed['email'],
+                    'str_firstname': parsed['firstname'],
+                    'str_lastname': parsed['lastname'],
+                    'str_phone': parsed['phone'],
+                    'updated_at': colombia_now(),
+                })
+                changed = True
+            if current.dec_default_voting_weight is None or \
+                    Decimal(current.dec_default_voting_weight) != parsed['voting_weight'] or \
+                    current.str_apartment_number != parsed['apartment_number']:
+                unit_updates.append({
+                    'id': current.uru_id,
+                    'str_apartment_number': parsed['apartment_number'],
+                    'dec_default_voting_weight': parsed['voting_weight'],
+                    'updated_at': colombia_now(),
+                })
+                changed = True
+            if not changed:
+                unchanged += 1
+
+        removed_user_ids = [row.int_user_id for row in existing_rows if row.uru_id not in matched_uru_ids]
+        results['total_rows'] = len(parsed_rows) + results['failed']
+
+        # Eliminados primero: libera usernames para las filas nuevas
+        if removed_user_ids:
+            await self._delete_residents(removed_user_ids)
+            await self._publish_resident_event(unit_id, "residents_cleared")
+
+        # Actualizaciones en bulk por llave primaria
+        if data_user_updates:
+            await self.db.execute(update(DataUserModel), data_user_updates)
+        if unit_updates:
+            await self.db.execute(update(UserResidentialUnitModel), unit_updates)
+        if data_user_updates or unit_updates:
+            await self.db.commit()
+
+        results['successful'] += len(parsed_rows) - len(to_insert)
+        if progress_callback:
+            await progress_callback(results['successful'] + results['failed'], results['total_rows'])
+
+        # Nuevos: hashes en paralelo y bulk INSERT por lotes
+        for b in to_insert:
+            b['password_hash'] = security_manager.submit_password_hash(b.pop('password'))
+        await self._insert_residents_bulk(to_insert, unit_id, results, progress_callback)
+
+        results['diff'] = {
+            'inserted': len(to_insert),
+            'updated': len(parsed_rows) - len(to_insert) - unchanged,
+            'unchanged': unchanged,
+            'removed': len(removed_user_ids),
+        }
+        logger.info(f"🔁 Reimportación diferencial unidad {unit_id}: {results['diff']}")
 
     async def process_residents_excel_file(
         self,
         file_content: bytes,
         unit_id: int,
         created_by: int,
-        progress_callback=None
+        progress_callback=None,
+        import_mode: str = "replace"
     ) -> dict:
         """
         Procesa el archivo Excel y crea copropietarios masivamente insertando en 3 tablas:
@@ -681,6 +1003,8 @@ class ResidentialUnitService:
             file_content: Contenido del archivo Excel en bytes
             unit_id: ID de la unidad residencial
             created_by: ID del usuario que está creando los registros
+            import_mode: "replace" elimina y recrea todos los copropietarios;
+                "diff" aplica solo inserciones, cambios y eliminaciones
 
         Returns:
             Dict con estadísticas del proceso:
@@ -689,6 +1013,7 @@ class ResidentialUnitService:
             - failed: Filas que fallaron
             - users_created: Número de usuarios creados
             - errors: Lista de errores detallados
+            - diff: Conteos inserted/updated/unchanged/removed (solo modo "diff")
         """
         try:
             # Obtener información de la unidad residencial para los correos
@@ -698,93 +1023,59 @@ class ResidentialUnitService:
             
             residential_unit_name = residential_unit.str_name
 
-            # Eliminar copropietarios existentes antes de reimportar
-            await self._delete_existing_residents(unit_id)
-
-            # Leer el archivo Excel
-            df = pd.read_excel(BytesIO(file_content))
-            
-            # Validar columnas requeridas
+            # Abrir el Excel en modo streaming y validar columnas antes de tocar la BD
+            reader = ExcelRowReader(file_content)
             required_columns = ['email', 'firstname', 'lastname', 'apartment_number', 'voting_weight']
-            missing_columns = [col for col in required_columns if col not in df.columns]
+            missing_columns = reader.missing_columns(required_columns)
             
             if missing_columns:
+                reader.close()
                 raise ValueError(
                     f"Columnas faltantes en el Excel: {', '.join(missing_columns)}. "
                     f"Columnas requeridas: email, firstname, lastname, apartment_number, voting_weight"
                 )
 
             results = {
-                'total_rows': len(df),
+                'total_rows': reader.total_rows,
                 'successful': 0,
                 'failed': 0,
                 'users_created': 0,
                 'user_ids': [],
                 'errors': []
             }
-            
-            batch_size = 50
-            batch = []
-
-            for index, row in df.iterrows():
-                row_dict = row.to_dict()
-                try:
-                    email = str(row_dict['email']).strip().lower()
-                    firstname = str(row_dict['firstname']).strip()
-                    lastname = str(row_dict['lastname']).strip()
-                    apartment_number = str(row_dict['apartment_number']).strip()
-                    phone = _normalize_phone_co(str(row_dict.get('phone', '')).strip() if pd.notna(row_dict.get('phone')) else None)
-                    password_from_excel = str(row_dict.get('password', '')).strip()
-                    password = password_from_excel if password_from_excel and len(password_from_excel) >= 8 \
-                        else self._generate_secure_password(firstname, lastname, apartment_number)
-
+            if import_mode == "diff":
+                with reader:
+                    await self._sync_residents_diff(reader, unit_id, results, progress_callback)
+                return results
+
+            def parsed_rows():
+                # Las filas se validan a medida que se insertan los lotes
+                processed_rows = 0
+                for row_number, row_dict in reader.rows():
+                    processed_rows += 1
                     try:
-                        voting_weight = Decimal(str(row_dict['voting_weight']))
-                        if voting_weight <= 0 or voting_weight > 100:
-                            raise ValueError("El peso de votación debe estar entre 0 y 100")
-                    except (ValueError, TypeError):
-                        raise ValueError(f"Peso de votación inválido: {row_dict.get('voting_weight')}. Debe ser un número (ej: 0.25 o 1)")
-
-                    if len(firstname) < 2:
-                        raise ValueError("El nombre debe tener al menos 2 caracteres")
-                    if len(lastname) < 2:
-                        raise ValueError("El apellido debe tener al menos 2 caracteres")
-                    if '@' not in email:
-                        raise ValueError("Email inválido")
-                    if len(apartment_number) == 0:
-                        raise ValueError("Número de apartamento requerido")
-
-                    batch.append({
-                        'email': email,
-                        'firstname': firstname,
-                        'lastname': lastname,
-                        'phone': phone,
-                        'password_hash': security_manager.create_password_hash(password),
-                        'base_username': f"{firstname.lower()}.{lastname.lower()}.{apartment_number}".replace(" ", ""),
-                        'apartment_number': apartment_number,
-                        'voting_weight': voting_weight,
-                    })
-
-                    if len(batch) >= batch_size:
-                        await self._insert_resident_batch(batch, unit_id, results)
-                        if progress_callback:
-                            await progress_callback(results['successful'] + results['failed'], results['total_rows'])
-                        batch = []
+                        yield self._parse_resident_row(row_dict)
+                    except Exception as e:
+                        results['errors'].append({
+                            'row': row_number,
+                            'email': row_dict.get('email', 'N/A'),
+                            'apartment': row_dict.get('apartment_number', 'N/A'),
+                            'error': str(e)
+                        })
+                        results['failed'] += 1
+                        logger.error(f"Error procesando fila {row_number}: {e}")
+
+                # La dimensión declarada puede incluir filas vacías: reportar las procesadas
+                results['total_rows'] = processed_rows
+
+            with reader:
+                if progress_callback:
+                    await progress_callback(0, results['total_rows'])
 
-                except Exception as e:
-                    results['errors'].append({
-                        'row': index + 2,
-                        'email': row_dict.get('email', 'N/A'),
-                        'apartment': row_dict.get('apartment_number', 'N/A'),
-                        'error': str(e)
-                    })
-                    results['failed'] += 1
-                    logger.error(f"Error procesando fila {index + 2}: {e}")
+                # Eliminar copropietarios existentes antes de reimportar
+                await self._delete_existing_residents(unit_id)
 
-            if batch:
-                await self._insert_resident_batch(batch, unit_id, results)
-                if progress_callback:
-                    await progress_callback(results['successful'] + results['failed'], results['total_rows'])
+                await self._insert_residents_bulk(parsed_rows(), unit_id, results, progress_callback)
 
             logger.info(
                 f"Proceso completado exitosamente: {results['successful']} copropietarios procesados, "
@@ -1052,16 +1343,13 @@ class ResidentialUnitService:
             bool: True si el envío fue exitoso, False en caso contrario
         """
         try:
-            # Leer template HTML
-            template_path = Path(__file__).parent.parent / "templates" / "email_coproprietario_credentials.html"
-            
-            if not template_path.exists():
-                logger.error(f"Template de email no encontrado: {template_path}")
+            # Plantilla compilada del entorno Jinja2 compartido
+            try:
+                template = get_email_template("email_coproprietario_credentials.html")
+            except FileNotFoundError as e:
+                logger.error(f"Template de email no encontrado: {e}")
                 return False
             
-            with open(template_path, 'r', encoding='utf-8') as f:
-                html_template = f.read()
-            
             # El voting_weight ya viene guardado en escala porcentual (0-100), no como fracción
             voting_weight_percent = float(voting_weight)
             
@@ -1075,9 +1363,6 @@ class ResidentialUnitService:
             if auto_login_token:
                 auto_login_url = f"{frontend_url}/auto-login/{auto_login_token}"
             
-            # Usar Jinja2 para renderizar el template correctamente
-            from jinja2 import Template
-            template = Template(html_template)
             html_content = template.render(
                 firstname=firstname,
                 lastname=lastname,
@@ -1240,6 +1525,11 @@ class ResidentialUnitService:
                 logger.info(f"Contraseña actualizada para {user.str_username}")
             
             # Actualizar estado de acceso
+            access_changed = (
+                'is_active' in update_data
+                and update_data['is_active'] is not None
+                and update_data['is_active'] != user.bln_allow_entry
+            )
             if 'is_active' in update_data and update_data['is_active'] is not None:
                 user.bln_allow_entry = update_data['is_active']
             
@@ -1258,6 +1548,8 @@ class ResidentialUnitService:
             await self.db.refresh(user)
             await self.db.refresh(data_user)
             await self.db.refresh(user_unit)
+            if access_changed:
+                await principal_cache.invalidate_user_ids([user.id])
             
             logger.info(f"Copropietario actualizado: {user.str_username}")
             
@@ -1586,12 +1878,7 @@ class ResidentialUnitService:
                         auto_login_url = f"{frontend_url}/auto-login/{auto_login_token}"
                     
                     try:
-                        template_path = Path(__file__).parent.parent / "templates" / "email_coproprietario_credentials.html"
-                        with open(template_path, 'r', encoding='utf-8') as file:
-                            template_content = file.read()
-                        
-                        from jinja2 import Template
-                        template = Template(template_content)
+                        template = get_email_template("email_coproprietario_credentials.html")
                         html_content = template.render(
                             firstname=data_user.str_firstname,
                             lastname=data_user.str_lastname,
@@ -1747,6 +2034,7 @@ class ResidentialUnitService:
         Crea un administrador manual (sin ser copropietario) y lo asigna a una unidad residencial.
         """
         
+        removed_admin_user_id = None
         try:
             # ============================================
             # PASO 1: Buscar DataUser existente por email o crear uno nuevo
@@ -1851,6 +2139,7 @@ class ResidentialUnitService:
                 if old_admin_unit.str_apartment_number == "ADMIN":
                     old_admin_user.bln_allow_entry = False
                     old_admin_user.updated_at = colombia_now()
+                    removed_admin_user_id = old_admin_user.id
 
                 logger.info(
                     f"Administrador anterior removido: Usuario ID {old_admin_user.id}"
@@ -1949,6 +2238,8 @@ class ResidentialUnitService:
             await self.db.commit()
             await self.db.refresh(user)
             await self.db.refresh(data_user)
+            if removed_admin_user_id:
+                await principal_cache.invalidate_user_ids([removed_admin_user_id])
 
             logger.info(
                 f"Administrador creado exitosamente: {username} para unidad {unit_id}"
@@ -2077,6 +2368,9 @@ class ResidentialUnitService:
 
             # Confirmar cambios
             await self.db.commit()
+            await principal_cache.invalidate_user_ids(
+                [new_admin_user.id] + ([old_admin_data[1].id] if old_admin_data else [])
+            )
 
             # Obtener datos del nuevo administrador para respuesta
             await self.db.refresh(new_admin_user)
@@ -1,255 +1,379 @@
-import uuid
-from datetime import datetime, timedelta
+from datetime import timedelta
 from app.utils.timezone_utils import colombia_now
 from typing import List, Optional, Dict, Any
 
+import redis.asyncio as aioredis
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
+from sqlalchemy import delete, select, update
 
 from app.models.user_session_model import UserSessionModel
 from app.core.logging_config import get_logger
 from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.auth.principal import principal_cache
 
 logger = get_logger(__name__)
 
+SESSION_KEY = "session:{jti}"
+USER_SESSIONS_KEY = "user_sessions:{user_id}"
+SESSION_SEQ_KEY = "session:seq"
+
+# Marca is_active=0 solo en los hashes de sesión que todavía existen: un HSET
+# sobre una sesión que expiró entre la lectura y la escritura crearía un hash
+# parcial sin `id` y sin TTL.
+_DEACTIVATE_SESSIONS_SCRIPT = """
+local count = 0
+for _, key in ipairs(KEYS) do
+  if redis.call('HEXISTS', key, 'id') == 1 then
+    redis.call('HSET', key, 'is_active', '0')
+    count = count + 1
+  end
+end
+return count
+"""
+
+
+async def is_session_revoked(token_jti: str) -> bool:
+    """
+    Verifica en un solo round trip a Redis si la sesión de un token fue revocada
+
+    Las sesiones desconocidas (creadas antes del store en Redis o ya expiradas)
+    no se consideran revocadas: la expiración la controla el propio JWT.
+    """
+    try:
+        is_active = await get_redis().hget(SESSION_KEY.format(jti=token_jti), "is_active")
+    except Exception as e:
+        logger.warning(f"No se pudo verificar la sesión en Redis: {e}")
+        return False
+    return is_active == "0"
+
 
 class SessionService:
     """
     Servicio para gestionar sesiones de usuarios
+
+    Las sesiones viven en Redis: un hash `session:{jti}` por sesión (con TTL igual
+    a la vida del token) y un set `user_sessions:{user_id}` con los jti del usuario.
+    Si SESSION_DB_WRITE_THROUGH está activo también se escriben en
+    `tbl_user_sessions` para auditoría.
     """
-    
-    def __init__(self, db: AsyncSession):
+
+    def __init__(self, db: AsyncSession, redis_client: Optional[aioredis.Redis] = None):
         self.db = db
-    
+        self.redis = redis_client or get_redis()
+        self.write_through = settings.SESSION_DB_WRITE_THROUGH
+
     async def create_session(
         self,
         user_id: int,
         token_jti: str,
         ip_address: Optional[str] = None,
         device_info: Optional[str] = None,
-        expires_in_minutes: int = None
-    ) -> UserSessionModel:
+        expires_in_minutes: int = None,
+        commit: bool = True
+    ) -> Dict[str, Any]:
         """
         Crea una nueva sesión para el usuario
-        
+
         Args:
             user_id: ID del usuario
             token_jti: JWT ID único
             ip_address: Dirección IP del cliente
             device_info: Información del dispositivo
             expires_in_minutes: Minutos hasta expiración (default: ACCESS_TOKEN_EXPIRE_MINUTES)
-            
+            commit: Si es False el registro de auditoría queda pendiente en la
+                transacción del llamador (solo aplica con SESSION_DB_WRITE_THROUGH)
+
         Returns:
-            UserSessionModel: La sesión creada
+            Dict con los datos de la sesión creada
         """
         if expires_in_minutes is None:
             expires_in_minutes = settings.ACCESS_TOKEN_EXPIRE_MINUTES
-        
-        expires_at = colombia_now() + timedelta(minutes=expires_in_minutes)
-        
-        session = UserSessionModel(
-            user_id=user_id,
-            token_jti=token_jti,
-            ip_address=ip_address,
-            device_info=device_info,
-            expires_at=expires_at,
-            is_active=True
-        )
-        
-        self.db.add(session)
-        await self.db.commit()
-        await self.db.refresh(session)
-        
+
+        created_at = colombia_now()
+        expires_at = created_at + timedelta(minutes=expires_in_minutes)
+        ttl_seconds = expires_in_minutes * 60
+
+        session_id = await self.redis.incr(SESSION_SEQ_KEY)
+        session = {
+            "id": str(session_id),
+            "user_id": str(user_id),
+            "token_jti": token_jti,
+            "device_info": (device_info or "")[:255],
+            "ip_address": ip_address or "",
+            "created_at": created_at.isoformat(),
+            "expires_at": expires_at.isoformat(),
+            "is_active": "1",
+        }
+
+        session_key = SESSION_KEY.format(jti=token_jti)
+        user_key = USER_SESSIONS_KEY.format(user_id=user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(session_key, mapping=session)
+            pipe.expire(session_key, ttl_seconds)
+            pipe.sadd(user_key, token_jti)
+            pipe.expire(user_key, max(ttl_seconds, settings.REDIS_SESSION_TTL))
+            await pipe.execute()
+
+        if self.write_through:
+            self.db.add(UserSessionModel(
+                user_id=user_id,
+                token_jti=token_jti,
+                ip_address=ip_address,
+                device_info=device_info,
+                created_at=created_at,
+                expires_at=expires_at,
+                is_active=True
+            ))
+            if commit:
+                await self.db.commit()
+
         logger.info(f"✅ Sesión creada para usuario {user_id} (jti: {token_jti})")
-        return session
-    
+        return self._serialize(session)
+
     async def get_active_sessions(self, user_id: int) -> List[Dict[str, Any]]:
         """
         Obtiene las sesiones activas de un usuario
-        
+
         Args:
             user_id: ID del usuario
-            
+
         Returns:
             Lista de sesiones activas
         """
-        query = select(UserSessionModel).where(
-            and_(
-                UserSessionModel.user_id == user_id,
-                UserSessionModel.is_active == True,
-                UserSessionModel.expires_at > colombia_now()
-            )
-        ).order_by(UserSessionModel.created_at.desc())
-        
-        result = await self.db.execute(query)
-        sessions = result.scalars().all()
-        
-        return [
-            {
-                "id": session.id,
-                "token_jti": session.token_jti,
-                "device_info": session.device_info,
-                "ip_address": session.ip_address,
-                "created_at": session.created_at.isoformat() if session.created_at else None,
-                "expires_at": session.expires_at.isoformat() if session.expires_at else None,
-                "is_active": session.is_active
-            }
-            for session in sessions
-        ]
-    
-    async def get_session_by_jti(self, token_jti: str) -> Optional[UserSessionModel]:
+        sessions = await self._get_user_sessions(user_id)
+        active = [self._serialize(session) for session in sessions if session["is_active"] == "1"]
+        active.sort(key=lambda session: session["created_at"] or "", reverse=True)
+        return active
+
+    async def get_session_by_jti(self, token_jti: str) -> Optional[Dict[str, Any]]:
         """
         Obtiene una sesión por su JTI
-        
+
         Args:
             token_jti: JWT ID único
-            
+
         Returns:
-            UserSessionModel o None
+            Dict con la sesión o None
         """
-        query = select(UserSessionModel).where(UserSessionModel.token_jti == token_jti)
-        result = await self.db.execute(query)
-        return result.scalar_one_or_none()
-    
+        session = await self.redis.hgetall(SESSION_KEY.format(jti=token_jti))
+        return self._serialize(session) if session and "id" in session else None
+
     async def deactivate_session(self, session_id: int, user_id: int) -> bool:
         """
         Desactiva una sesión específica
-        
+
         Args:
             session_id: ID de la sesión
             user_id: ID del usuario (para verificación de propiedad)
-            
+
         Returns:
             True si se desactivó, False si no se encontró
         """
-        query = select(UserSessionModel).where(
-            and_(
-                UserSessionModel.id == session_id,
-                UserSessionModel.user_id == user_id
-            )
-        )
-        result = await self.db.execute(query)
-        session = result.scalar_one_or_none()
-        
+        sessions = await self._get_user_sessions(user_id)
+        session = next((s for s in sessions if s["id"] == str(session_id)), None)
+
         if not session:
             logger.warning(f"Sesión {session_id} no encontrada para usuario {user_id}")
             return False
-        
-        session.is_active = False
-        await self.db.commit()
-        
+
+        await self._deactivate_jtis([session["token_jti"]])
+        await principal_cache.invalidate_user_ids([user_id])
+
         logger.info(f"🔒 Sesión {session_id} desactivada para usuario {user_id}")
         return True
-    
+
     async def deactivate_session_by_jti(self, token_jti: str) -> bool:
         """
         Desactiva una sesión por su JTI
-        
+
         Args:
             token_jti: JWT ID único
-            
+
         Returns:
             True si se desactivó, False si no se encontró
         """
-        query = select(UserSessionModel).where(UserSessionModel.token_jti == token_jti)
-        result = await self.db.execute(query)
-        session = result.scalar_one_or_none()
-        
-        if not session:
+        user_id = await self.redis.hget(SESSION_KEY.format(jti=token_jti), "user_id")
+
+        if not user_id:
             logger.warning(f"Sesión con jti {token_jti} no encontrada")
             return False
-        
-        session.is_active = False
-        await self.db.commit()
-        
+
+        await self._deactivate_jtis([token_jti])
+        await principal_cache.invalidate_user_ids([int(user_id)])
+
         logger.info(f"🔒 Sesión con jti {token_jti} desactivada")
         return True
-    
+
     async def deactivate_all_sessions(self, user_id: int) -> int:
         """
         Desactiva todas las sesiones de un usuario
-        
+
         Args:
             user_id: ID del usuario
-            
+
         Returns:
             Número de sesiones desactivadas
         """
-        query = select(UserSessionModel).where(
-            and_(
-                UserSessionModel.user_id == user_id,
-                UserSessionModel.is_active == True
-            )
-        )
-        result = await self.db.execute(query)
-        sessions = result.scalars().all()
-        
-        count = 0
-        for session in sessions:
-            session.is_active = False
-            count += 1
-        
-        await self.db.commit()
-        
+        sessions = await self._get_user_sessions(user_id)
+        jtis = [session["token_jti"] for session in sessions if session["is_active"] == "1"]
+
+        await self._deactivate_jtis(jtis)
+        await principal_cache.invalidate_user_ids([user_id])
+
+        count = len(jtis)
         logger.info(f"🔒 {count} sesiones desactivadas para usuario {user_id}")
         return count
-    
+
     async def deactivate_user_session_by_admin(
-        self, 
-        target_user_id: int, 
+        self,
+        target_user_id: int,
         session_id: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Desactiva sesiones de un usuario (para uso por admin/superadmin)
-        
+
         Args:
             target_user_id: ID del usuario objetivo
             session_id: ID de sesión específica (opcional)
-            
+
         Returns:
             Dict con resultado
         """
         if session_id:
-            query = select(UserSessionModel).where(
-                and_(
-                    UserSessionModel.id == session_id,
-                    UserSessionModel.user_id == target_user_id
-                )
-            )
-            result = await self.db.execute(query)
-            session = result.scalar_one_or_none()
-            
-            if not session:
+            if not await self.deactivate_session(session_id, target_user_id):
                 return {"success": False, "message": "Sesión no encontrada"}
-            
-            session.is_active = False
-            await self.db.commit()
-            
+
             return {"success": True, "message": "Sesión cerrada exitosamente", "count": 1}
         else:
             count = await self.deactivate_all_sessions(target_user_id)
             return {"success": True, "message": f"{count} sesiones cerradas exitosamente", "count": count}
-    
+
     async def cleanup_expired_sessions(self) -> int:
         """
-        Limpia sesiones expiradas (para llamado periódico)
-        
+        Limpia sesiones expiradas de la tabla de auditoría (para llamado periódico)
+
+        En Redis las sesiones expiran solas por TTL.
+
         Returns:
             Número de sesiones eliminadas
         """
-        query = select(UserSessionModel).where(
-            UserSessionModel.expires_at < colombia_now()
+        if not self.write_through:
+            return 0
+
+        result = await self.db.execute(
+            delete(UserSessionModel).where(UserSessionModel.expires_at < colombia_now())
         )
-        result = await self.db.execute(query)
-        sessions = result.scalars().all()
-        
-        count = 0
-        for session in sessions:
-            await self.db.delete(session)
-            count += 1
-        
+        count = result.rowcount or 0
+
         if count > 0:
             await self.db.commit()
             logger.info(f"🧹 {count} sesiones expiradas eliminadas")
-        
+
         return count
+
+    async def import_db_sessions(self) -> int:
+        """
+        Copia a Redis las sesiones vigentes de `tbl_user_sessions` que aún no existen allí
+
+        Las sesiones creadas antes del store en Redis solo viven en la tabla: sin
+        este paso no aparecen en el listado de sesiones y un cierre hecho antes de
+        la migración no se respetaría. Las revocadas se copian con is_active=0.
+        Es idempotente (no toca hashes existentes); se ejecuta desde `init-db`.
+
+        Returns:
+            Número de sesiones copiadas
+        """
+        now = colombia_now()
+        result = await self.db.execute(
+            select(UserSessionModel).where(UserSessionModel.expires_at > now)
+        )
+        rows = result.scalars().all()
+        if not rows:
+            return 0
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for row in rows:
+                pipe.exists(SESSION_KEY.format(jti=row.token_jti))
+            existing = await pipe.execute()
+
+        missing = [row for row, exists in zip(rows, existing) if not exists]
+        if not missing:
+            return 0
+
+        last_id = await self.redis.incrby(SESSION_SEQ_KEY, len(missing))
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for session_id, row in enumerate(missing, start=last_id - len(missing) + 1):
+                ttl_seconds = max(int((row.expires_at - now).total_seconds()), 1)
+                session_key = SESSION_KEY.format(jti=row.token_jti)
+                user_key = USER_SESSIONS_KEY.format(user_id=row.user_id)
+                pipe.hset(session_key, mapping={
+                    "id": str(session_id),
+                    "user_id": str(row.user_id),
+                    "token_jti": row.token_jti,
+                    "device_info": row.device_info or "",
+                    "ip_address": row.ip_address or "",
+                    "created_at": row.created_at.isoformat() if row.created_at else "",
+                    "expires_at": row.expires_at.isoformat(),
+                    "is_active": "1" if row.is_active else "0",
+                })
+                pipe.expire(session_key, ttl_seconds)
+                pipe.sadd(user_key, row.token_jti)
+                pipe.expire(user_key, max(ttl_seconds, settings.REDIS_SESSION_TTL))
+            await pipe.execute()
+
+        logger.info(f"📥 {len(missing)} sesiones de tbl_user_sessions copiadas a Redis")
+        return len(missing)
+
+    async def _get_user_sessions(self, user_id: int) -> List[Dict[str, str]]:
+        """
+        Obtiene los hashes de sesión de un usuario y limpia del set los jti expirados
+        """
+        user_key = USER_SESSIONS_KEY.format(user_id=user_id)
+        jtis = list(await self.redis.smembers(user_key))
+        if not jtis:
+            return []
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for jti in jtis:
+                pipe.hgetall(SESSION_KEY.format(jti=jti))
+            hashes = await pipe.execute()
+
+        expired = [jti for jti, session in zip(jtis, hashes) if not session]
+        if expired:
+            await self.redis.srem(user_key, *expired)
+
+        # Se ignoran hashes parciales (sin `id`) que no corresponden a una sesión completa
+        return [session for session in hashes if session and "id" in session]
+
+    async def _deactivate_jtis(self, jtis: List[str]) -> None:
+        """
+        Marca sesiones como inactivas (se conservan hasta su TTL para poder
+        responder a las verificaciones de revocación)
+        """
+        if not jtis:
+            return
+
+        deactivate = self.redis.register_script(_DEACTIVATE_SESSIONS_SCRIPT)
+        await deactivate(keys=[SESSION_KEY.format(jti=jti) for jti in jtis])
+
+        if self.write_through:
+            await self.db.execute(
+                update(UserSessionModel)
+                .where(UserSessionModel.token_jti.in_(jtis))
+                .values(is_active=False)
+            )
+            await self.db.commit()
+
+    @staticmethod
+    def _serialize(session: Dict[str, str]) -> Dict[str, Any]:
+        """Convierte el hash de Redis al formato de respuesta de la API"""
+        return {
+            "id": int(session["id"]),
+            "token_jti": session["token_jti"],
+            "device_info": session.get("device_info") or None,
+            "ip_address": session.get("ip_address") or None,
+            "created_at": session.get("created_at") or None,
+            "expires_at": session.get("expires_at") or None,
+            "is_active": session.get("is_active") == "1"
+        }
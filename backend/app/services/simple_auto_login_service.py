@@ -207,6 +207,34 @@ class SimpleAutoLoginService:
         await db.commit()
         logger.info(f"Token creado para usuario {user_id} (token_id: {token_id})")
     
+    async def bulk_insert_user_tokens(self, db, user_tokens: List[tuple], expires_at=None):
+        """
+        Registra varios tokens de auto-login con un solo INSERT multi-fila.
+        Los token_id deben ser UUIDs recién generados; no hace commit.
+        
+        Args:
+            db: Sesión de base de datos
+            user_tokens: Lista de (token_id, user_id)
+            expires_at: Fecha de expiración común (si no se pasa, usa 24h por defecto)
+        """
+        from app.models.used_auto_login_token_model import UsedAutoLoginTokenModel
+        from sqlalchemy import insert
+        
+        if not user_tokens:
+            return
+        
+        now = colombia_now()
+        if expires_at is None:
+            expires_at = now + timedelta(hours=24)
+        
+        await db.execute(
+            insert(UsedAutoLoginTokenModel).values([
+                {'token_id': token_id, 'user_id': user_id, 'created_at': now, 'expires_at': expires_at}
+                for token_id, user_id in user_tokens
+            ])
+        )
+        logger.info(f"{len(user_tokens)} tokens de auto-login registrados en bloque")
+    
     async def get_valid_tokens_for_users(self, db, user_ids: List[int]) -> Dict[int, Optional[Dict]]:
         """
         Obtiene los tokens válidos (no expirados) para una lista de usuarios.
@@ -1,7 +1,9 @@
+import time
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.models.system_config_model import SystemConfigModel
 from app.services.encryption_service import encryption_service
+from app.core.config import settings
 from app.core.logging_config import get_logger
 from typing import Optional, Dict, List
 from app.core.exceptions import ServiceException
@@ -9,6 +11,19 @@ from datetime import date
 
 logger = get_logger(__name__)
 
+# Registro de configuraciones SMTP_* activas (desencriptadas) cacheado por proceso.
+# Se invalida al escribir cualquier clave SMTP_* desde este proceso; los demás
+# procesos (workers de Gunicorn y Celery) lo recargan al vencer el TTL.
+_smtp_registry: Optional[Dict[str, Optional[str]]] = None
+_smtp_registry_loaded_at = 0.0
+
+
+def invalidate_smtp_registry() -> None:
+    """Descarta el registro SMTP cacheado en este proceso"""
+    global _smtp_registry
+    _smtp_registry = None
+
+
 class SystemConfigService:
     """
     Servicio para gestionar configuraciones del sistema
@@ -119,6 +134,8 @@ class SystemConfigService:
                 logger.info(f"Configuración creada: {config_key}")
             
             await self.db.commit()
+            if config_key.startswith("SMTP_"):
+                invalidate_smtp_registry()
             await self.db.refresh(config)
             return config
             
@@ -676,25 +693,62 @@ class SystemConfigService:
 
     MAX_SMTP_ACCOUNTS = 10
 
+    async def _get_smtp_registry(self) -> Dict[str, Optional[str]]:
+        """
+        Retorna todas las configuraciones SMTP_* activas, desencriptadas, en un dict
+        clave -> valor. Se carga con una sola consulta y se cachea en el proceso
+        durante SMTP_REGISTRY_CACHE_TTL segundos. Las claves que no se pudieron
+        desencriptar quedan con valor None.
+        """
+        global _smtp_registry, _smtp_registry_loaded_at
+
+        ttl = settings.SMTP_REGISTRY_CACHE_TTL
+        if _smtp_registry is not None and ttl > 0 and time.monotonic() - _smtp_registry_loaded_at < ttl:
+            return _smtp_registry
+
+        stmt = select(
+            SystemConfigModel.str_config_key,
+            SystemConfigModel.str_config_value,
+            SystemConfigModel.bln_is_encrypted
+        ).where(
+            SystemConfigModel.str_config_key.like("SMTP_%"),
+            SystemConfigModel.bln_is_active == True
+        )
+        result = await self.db.execute(stmt)
+
+        registry = {}
+        for key, value, is_encrypted in result.all():
+            if is_encrypted and value:
+                try:
+                    value = encryption_service.decrypt(value)
+                except Exception as e:
+                    logger.error(f"Error al desencriptar {key}: {str(e)}")
+                    value = None
+            registry[key] = value
+
+        _smtp_registry = registry
+        _smtp_registry_loaded_at = time.monotonic()
+        return registry
+
     async def _get_legacy_smtp_as_account(self) -> Optional[Dict]:
         """
         Lee las credenciales SMTP legacy (SMTP_HOST/USER/etc.) y las
         devuelve con forma de cuenta multi-cuenta (id=1).
         Retorna None si no hay credenciales legacy.
         """
-        legacy = await self.get_smtp_credentials()
+        legacy = await self._get_smtp_registry()
         if not legacy.get("SMTP_USER"):
             return None
 
         raw_user = legacy["SMTP_USER"]
         return {
             "_is_legacy": True,
-            "HOST": legacy.get("SMTP_HOST", "smtp.gmail.com"),
-            "PORT": legacy.get("SMTP_PORT", "587"),
+            "HOST": legacy.get("SMTP_HOST") or "smtp.gmail.com",
+            "PORT": legacy.get("SMTP_PORT") or "587",
             "USER": raw_user,
-            "PASSWORD": legacy.get("SMTP_PASSWORD", ""),
-            "FROM_EMAIL": legacy.get("SMTP_FROM_EMAIL", ""),
-            "FROM_NAME": legacy.get("SMTP_FROM_NAME", "GIRAMASTER - Sistema de Asambleas"),
+            "PASSWORD": legacy.get("SMTP_PASSWORD") or "",
+            "FROM_EMAIL": legacy.get("SMTP_FROM_EMAIL") or "",
+            "FROM_NAME": legacy.get("SMTP_FROM_NAME") or "GIRAMASTER - Sistema de Asambleas",
             "DAILY_LIMIT": "500",
             "NAME": "Cuenta Principal",
         }
@@ -705,11 +759,11 @@ class SystemConfigService:
         Idempotente y tolerante a fallos parciales: verifica campo a campo si ya fue migrado.
         """
         # Verificar si la migración completa ya ocurrió (usuario y contraseña presentes)
-        existing_user = await self.get_config("SMTP_1_USER", decrypt=False, silent=True)
-        if existing_user:
+        registry = await self._get_smtp_registry()
+        if "SMTP_1_USER" in registry:
             return  # Ya migrado con datos completos
 
-        legacy = await self.get_smtp_credentials()
+        legacy = {key: value for key, value in registry.items() if value}
         if not legacy.get("SMTP_USER"):
             return  # Nada que migrar
 
@@ -746,19 +800,20 @@ class SystemConfigService:
         except Exception as e:
             logger.warning(f"Migración SMTP falló (no crítico): {e}")
 
+        registry = await self._get_smtp_registry()
         today = date.today().isoformat()
         accounts = []
 
         for i in range(1, self.MAX_SMTP_ACCOUNTS + 1):
-            name = await self.get_config(f"SMTP_{i}_NAME", decrypt=False, silent=True)
+            name = registry.get(f"SMTP_{i}_NAME")
             if not name:
                 break
 
-            user_raw = await self.get_config(f"SMTP_{i}_USER", decrypt=True, silent=True)
-            exceeded_date = await self.get_config(f"SMTP_{i}_EXCEEDED_DATE", decrypt=False, silent=True)
-            daily_limit_raw = await self.get_config(f"SMTP_{i}_DAILY_LIMIT", decrypt=False, silent=True)
-            host = await self.get_config(f"SMTP_{i}_HOST", decrypt=False, silent=True) or "smtp.gmail.com"
-            port_raw = await self.get_config(f"SMTP_{i}_PORT", decrypt=False, silent=True)
+            user_raw = registry.get(f"SMTP_{i}_USER")
+            exceeded_date = registry.get(f"SMTP_{i}_EXCEEDED_DATE")
+            daily_limit_raw = registry.get(f"SMTP_{i}_DAILY_LIMIT")
+            host = registry.get(f"SMTP_{i}_HOST") or "smtp.gmail.com"
+            port_raw = registry.get(f"SMTP_{i}_PORT")
 
             masked_user = ("***" + user_raw[-8:]) if user_raw and len(user_raw) > 8 else ("***" if user_raw else None)
 
@@ -798,10 +853,11 @@ class SystemConfigService:
         Retorna credenciales desencriptadas de una cuenta SMTP específica.
         Para cuenta 1: si no existen claves SMTP_1_*, usa credenciales legacy como fallback.
         """
+        registry = await self._get_smtp_registry()
         prefix = f"SMTP_{account_id}_"
         creds = {}
         for key in ["HOST", "PORT", "USER", "PASSWORD", "FROM_EMAIL", "FROM_NAME", "DAILY_LIMIT", "NAME"]:
-            value = await self.get_config(f"{prefix}{key}", decrypt=True, silent=True)
+            value = registry.get(f"{prefix}{key}")
             if value:
                 creds[key] = value
 
@@ -820,11 +876,11 @@ class SystemConfigService:
         Retorna el nombre de una cuenta SMTP.
         Para cuenta 1: fallback a 'Cuenta Principal' si no existe clave multi-cuenta pero sí hay legacy.
         """
-        name = await self.get_config(f"SMTP_{account_id}_NAME", decrypt=False, silent=True)
+        registry = await self._get_smtp_registry()
+        name = registry.get(f"SMTP_{account_id}_NAME")
         if not name and account_id == 1:
             # Verificar si existe cuenta legacy
-            legacy_user = await self.get_config("SMTP_USER", decrypt=False, silent=True)
-            if legacy_user:
+            if "SMTP_USER" in registry:
                 return "Cuenta Principal"
         return name
 
@@ -834,13 +890,13 @@ class SystemConfigService:
             await self._migrate_legacy_smtp_keys()
         except Exception:
             pass
+        registry = await self._get_smtp_registry()
         for i in range(1, self.MAX_SMTP_ACCOUNTS + 1):
-            name = await self.get_config(f"SMTP_{i}_NAME", decrypt=False, silent=True)
+            name = registry.get(f"SMTP_{i}_NAME")
             if not name:
                 # Verificar también si es la cuenta 1 con datos legacy
                 if i == 1:
-                    legacy_user = await self.get_config("SMTP_USER", decrypt=False, silent=True)
-                    if legacy_user:
+                    if "SMTP_USER" in registry:
                         continue  # La cuenta 1 "existe" como legacy
                 return i
         return None  # Límite alcanzado
@@ -850,36 +906,46 @@ class SystemConfigService:
         Retorna la primera cuenta SMTP disponible (no excedida hoy) con credenciales completas.
         Con fallback a credenciales legacy si no hay cuentas multi-cuenta configuradas.
         """
+        accounts = await self.get_available_smtp_accounts(limit=1)
+        return accounts[0] if accounts else None
+
+    async def get_available_smtp_accounts(self, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Retorna las cuentas SMTP disponibles (no excedidas hoy) con credenciales completas,
+        en orden de ID. El dispatcher del outbox reparte los correos entre todas ellas.
+        Con fallback a credenciales legacy si no hay cuentas multi-cuenta configuradas.
+        """
         try:
             await self._migrate_legacy_smtp_keys()
         except Exception:
             pass
 
+        registry = await self._get_smtp_registry()
         today = date.today().isoformat()
+        accounts = []
 
         for i in range(1, self.MAX_SMTP_ACCOUNTS + 1):
-            name = await self.get_config(f"SMTP_{i}_NAME", decrypt=False, silent=True)
+            name = registry.get(f"SMTP_{i}_NAME")
             if not name:
                 break
 
-            exceeded_date = await self.get_config(f"SMTP_{i}_EXCEEDED_DATE", decrypt=False, silent=True)
-            if exceeded_date == today:
+            if registry.get(f"SMTP_{i}_EXCEEDED_DATE") == today:
                 logger.info(f"Cuenta SMTP {i} ('{name}') excedida hoy, saltando...")
                 continue
 
-            user = await self.get_config(f"SMTP_{i}_USER", decrypt=True, silent=True)
-            password = await self.get_config(f"SMTP_{i}_PASSWORD", decrypt=True, silent=True)
+            user = registry.get(f"SMTP_{i}_USER")
+            password = registry.get(f"SMTP_{i}_PASSWORD")
 
             if not user or not password:
                 continue
 
-            host = await self.get_config(f"SMTP_{i}_HOST", decrypt=False, silent=True) or "smtp.gmail.com"
-            port_raw = await self.get_config(f"SMTP_{i}_PORT", decrypt=False, silent=True)
-            from_email = await self.get_config(f"SMTP_{i}_FROM_EMAIL", decrypt=False, silent=True) or user
-            from_name = await self.get_config(f"SMTP_{i}_FROM_NAME", decrypt=False, silent=True) or "GIRAMASTER"
-            daily_limit = int(await self.get_config(f"SMTP_{i}_DAILY_LIMIT", decrypt=False, silent=True) or 500)
+            host = registry.get(f"SMTP_{i}_HOST") or "smtp.gmail.com"
+            port_raw = registry.get(f"SMTP_{i}_PORT")
+            from_email = registry.get(f"SMTP_{i}_FROM_EMAIL") or user
+            from_name = registry.get(f"SMTP_{i}_FROM_NAME") or "GIRAMASTER"
+            daily_limit = int(registry.get(f"SMTP_{i}_DAILY_LIMIT") or 500)
 
-            return {
+            accounts.append({
                 "id": i,
                 "name": name,
                 "host": host,
@@ -890,13 +956,18 @@ class SystemConfigService:
                 "from_name": from_name,
                 "daily_limit": daily_limit,
                 "email_enabled": True,
-            }
+            })
+            if limit and len(accounts) >= limit:
+                return accounts
+
+        if accounts:
+            return accounts
 
         # Fallback final: usar credenciales legacy directamente
         legacy_account = await self._get_legacy_smtp_as_account()
         if legacy_account and legacy_account.get("PASSWORD"):
             user = legacy_account["USER"]
-            return {
+            accounts.append({
                 "id": 1,
                 "name": legacy_account["NAME"],
                 "host": legacy_account["HOST"],
@@ -907,9 +978,9 @@ class SystemConfigService:
                 "from_name": legacy_account.get("FROM_NAME", "GIRAMASTER"),
                 "daily_limit": int(legacy_account["DAILY_LIMIT"]),
                 "email_enabled": True,
-            }
+            })
 
-        return None
+        return accounts
 
     async def mark_smtp_account_exceeded(self, account_id: int) -> None:
         """Marca una cuenta SMTP como excedida para el día de hoy."""
@@ -979,6 +1050,7 @@ class SystemConfigService:
                 config.bln_is_active = False
 
         await self.db.commit()
+        invalidate_smtp_registry()
         logger.info(f"Cuenta SMTP {account_id} eliminada")
         return True
 
@@ -992,5 +1064,6 @@ class SystemConfigService:
         if config:
             config.bln_is_active = False
             await self.db.commit()
+            invalidate_smtp_registry()
         logger.info(f"Límite de cuenta SMTP {account_id} restablecido manualmente")
         return True
@@ -2,17 +2,21 @@ from datetime import datetime
 from app.utils.timezone_utils import colombia_now
 from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import and_, select
+from sqlalchemy import and_, join, select
+from sqlalchemy.engine import Row
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import selectinload
 
 from app.models.user_model import UserModel
 from app.models.data_user_model import DataUserModel
 from app.models.rol_model import RolModel
+from app.models.meeting_model import MeetingModel
+from app.models.meeting_invitation_model import MeetingInvitationModel
 from app.schemas.user_schema import UserCreate, UserUpdate, UserResponse
 from app.schemas.data_user_schema import DataUserCreate, DataUserResponse
 from app.schemas.rol_schema import RolResponse
 from app.core.exceptions import ResourceNotFoundException, ServiceException
+from app.auth.principal import AuthenticatedPrincipal, principal_cache
 
 import logging
 
@@ -183,6 +187,112 @@ class UserService:
           details={"original_error": str(e), "username": username}
         )
         
+    async def get_principal_by_username(self, username: str) -> Optional[AuthenticatedPrincipal]:
+      """ Obtiene los datos del usuario autenticado, usando la caché de principales
+
+      Carga en una sola consulta el usuario, su rol y su unidad residencial.
+      Usar en lugar de get_user_by_username cuando solo se necesitan id, rol,
+      acceso o unidad (no retorna el modelo ORM).
+
+      Args:
+        username (str): El nombre de usuario del token
+
+      Returns:
+        Optional[AuthenticatedPrincipal]: El principal o None si el usuario no existe
+      """
+      user_name = username.lower().strip()
+
+      principal = await principal_cache.get(user_name)
+      if principal:
+        return principal
+
+      try:
+        result = await self.db.execute(
+            select(
+                UserModel.id,
+                UserModel.str_username,
+                UserModel.int_id_rol,
+                RolModel.str_name,
+                UserModel.bln_allow_entry,
+                UserModel.int_data_user_id,
+                UserResidentialUnitModel.int_residential_unit_id
+            )
+            .join(RolModel, RolModel.id == UserModel.int_id_rol)
+            .outerjoin(UserResidentialUnitModel, UserResidentialUnitModel.int_user_id == UserModel.id)
+            .where(UserModel.str_username == user_name)
+            .limit(1)
+        )
+        row = result.first()
+      except Exception as e:
+        raise ServiceException(
+          message=f"Error al obtener el usuario: {str(e)}",
+          error_code="GET_USER_BY_USERNAME_ERROR",
+          details={"original_error": str(e), "username": username}
+        )
+
+      if not row:
+        return None
+
+      principal = AuthenticatedPrincipal(
+        id=row.id,
+        str_username=row.str_username,
+        int_id_rol=row.int_id_rol,
+        str_rol_name=row.str_name,
+        bln_allow_entry=bool(row.bln_allow_entry),
+        int_data_user_id=row.int_data_user_id,
+        int_residential_unit_id=row.int_residential_unit_id
+      )
+      await principal_cache.set(principal)
+      return principal
+
+    async def get_login_context(self, username: str) -> Optional[Row]:
+      """ Obtiene en una sola consulta todo lo que necesita el login
+
+      Une el usuario con sus datos personales, el nombre de su rol y, si existe,
+      su invitación a una reunión "En Curso".
+
+      Args:
+        username (str): El nombre de usuario
+
+      Returns:
+        Optional[Row]: Fila con UserModel, DataUserModel, str_rol_name,
+          MeetingModel y MeetingInvitationModel (estos dos últimos None si no hay
+          reunión activa), o None si el usuario no existe
+      """
+      user_name = username.lower().strip()
+
+      active_invitation = join(
+        MeetingInvitationModel,
+        MeetingModel,
+        and_(
+          MeetingModel.id == MeetingInvitationModel.int_meeting_id,
+          MeetingModel.str_status == "En Curso"
+        )
+      )
+
+      try:
+        result = await self.db.execute(
+            select(
+                UserModel,
+                DataUserModel,
+                RolModel.str_name.label("str_rol_name"),
+                MeetingModel,
+                MeetingInvitationModel
+            )
+            .join(RolModel, RolModel.id == UserModel.int_id_rol)
+            .outerjoin(DataUserModel, DataUserModel.id == UserModel.int_data_user_id)
+            .outerjoin(active_invitation, MeetingInvitationModel.int_user_id == UserModel.id)
+            .where(UserModel.str_username == user_name)
+            .limit(1)
+        )
+        return result.first()
+      except Exception as e:
+        raise ServiceException(
+          message=f"Error al obtener el usuario: {str(e)}",
+          error_code="GET_USER_BY_USERNAME_ERROR",
+          details={"original_error": str(e), "username": username}
+        )
+
     async def enable_all_coowners_by_meeting(self, meeting_id: int) -> dict:
       """
       Habilita todos los copropietarios de una reunión específica.
@@ -238,6 +348,7 @@ class UserService:
           )
           await self.db.execute(update_query)
           await self.db.commit()
+          await principal_cache.invalidate_user_ids(user_ids)
           
           logger.info(f"✅ Habilitados {disabled_count} copropietarios de la reunión {meeting_id}")
           
@@ -339,6 +450,7 @@ class UserService:
 
             await self.db.commit()
             await self.db.refresh(user)
+            await principal_cache.invalidate_user_ids([user.id])
 
             logger.info(f"✅ Acceso habilitado para {data_user.str_email} (user_id={user_id})")
 
@@ -500,6 +612,7 @@ class UserService:
             
             await self.db.commit()
             await self.db.refresh(user)
+            await principal_cache.invalidate_user_ids([user.id])
             
             # Enviar correo de notificación (opcional)
             if send_email:
@@ -582,6 +695,7 @@ class UserService:
             
             enabled_count = 0
             already_enabled_count = 0
+            enabled_user_ids = []
             
             for user, data_user in coowners:
                 if user.bln_allow_entry:
@@ -590,6 +704,7 @@ class UserService:
                     user.bln_allow_entry = True
                     user.updated_at = colombia_now()
                     enabled_count += 1
+                    enabled_user_ids.append(user.id)
                     
                     # Enviar correo individual (opcional)
                     if send_emails:
@@ -600,6 +715,7 @@ class UserService:
                             logger.warning(f"Error enviando correo a {data_user.str_email}: {email_error}")
             
             await self.db.commit()
+            await principal_cache.invalidate_user_ids(enabled_user_ids)
             
             logger.info(
                 f"✅ Habilitados {enabled_count} copropietarios en unit_id={unit_id}. "
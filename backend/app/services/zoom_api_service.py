@@ -6,6 +6,7 @@ from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
 from app.core.logging_config import get_logger
+from app.core.redis_client import get_redis
 
 logger = get_logger(__name__)
 
@@ -112,6 +113,20 @@ class ZoomAPIService:
                 "Configura ZOOM_ACCOUNT_ID, ZOOM_CLIENT_ID y ZOOM_CLIENT_SECRET en el .env"
             )
         
+        # Token compartido entre workers y réplicas (cada instancia del servicio es por request)
+        cache_key = f"zoom:token:{self.account_id}:{self.client_id}"
+        try:
+            r = get_redis()
+            cached_token = await r.get(cache_key)
+            if cached_token:
+                ttl = await r.ttl(cache_key)
+                self._access_token = cached_token
+                self._token_expiry = time.time() + max(ttl, 0)
+                logger.debug("Usando token de acceso de Zoom cacheado en Redis")
+                return self._access_token
+        except Exception as e:
+            logger.warning(f"No se pudo leer el token de Zoom de Redis: {e}")
+        
         try:
             logger.info("Obteniendo nuevo access token de Zoom OAuth...")
             
@@ -143,6 +158,12 @@ class ZoomAPIService:
                 expires_in = token_data.get("expires_in", 3600)
                 self._token_expiry = time.time() + expires_in - 300
                 
+                if expires_in > 300:
+                    try:
+                        await get_redis().set(cache_key, self._access_token, ex=expires_in - 300)
+                    except Exception as e:
+                        logger.warning(f"No se pudo guardar el token de Zoom en Redis: {e}")
+                
                 logger.info(f"Access token de Zoom obtenido exitosamente (expira en {expires_in}s)")
                 return self._access_token
             else:
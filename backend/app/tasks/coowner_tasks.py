@@ -1,12 +1,11 @@
-import asyncio
 from app.celery_app import celery_app
-from app.core.config import settings
+from app.tasks.worker_runtime import run_async, get_task_redis, get_task_session_maker
 from app.core.logging_config import get_logger
 
 logger = get_logger(__name__)
 
 COOWNER_TASK_KEY = "coowner_task"
-BATCH_SIZE = 50
+BATCH_SIZE = 500
 
 
 @celery_app.task(bind=True, name='app.tasks.coowner_tasks.bulk_toggle_access_task')
@@ -14,22 +13,19 @@ def bulk_toggle_access_task(self, user_ids: list, unit_id: int, enabled: bool, c
     logger.info(f"🔄 bulk_toggle_access_task iniciada: task_id={task_id}, unit_id={unit_id}, enabled={enabled}, count={len(user_ids)}")
 
     async def _run():
-        import redis.asyncio as aioredis
-        from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-        from sqlalchemy.orm import sessionmaker
-        from sqlalchemy import select, and_, delete
+        from sqlalchemy import select, and_, delete, insert, update, func
         from app.models.user_model import UserModel
         from app.models.user_residential_unit_model import UserResidentialUnitModel
         from app.models.meeting_model import MeetingModel
         from app.models.meeting_invitation_model import MeetingInvitationModel
         from app.utils.timezone_utils import colombia_now
+        from app.auth.principal import principal_cache
         from decimal import Decimal
         import uuid as _uuid
 
-        engine = create_async_engine(settings.ASYNC_DATABASE_URL, echo=False, pool_pre_ping=True)
-        async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async_session_maker = get_task_session_maker()
 
-        r = await aioredis.from_url(settings.REDIS_URL)
+        r = get_task_redis()
         key = f"{COOWNER_TASK_KEY}:{task_id}"
         total = len(user_ids)
 
@@ -81,114 +77,135 @@ def bulk_toggle_access_task(self, user_ids: list, unit_id: int, enabled: bool, c
                     if programmed_meeting_ids:
                         logger.info(f"📋 Reuniones programadas a limpiar: {programmed_meeting_ids}")
 
-            # Procesar en batches
+            # Procesar en batches: cada batch es un número fijo de sentencias
+            # (lectura, UPDATE ... IN, DELETE/INSERT de invitaciones y recálculo de totales)
             email_task_id = ''
             all_to_email = []
             for batch_start in range(0, total, BATCH_SIZE):
                 batch = user_ids[batch_start:batch_start + BATCH_SIZE]
-                batch_new_invitations = []
-                batch_to_email = []
-                batch_removed_invitations = []
 
-                async with async_session_maker() as db:
-                    for uid in batch:
-                        try:
-                            result = await db.execute(
-                                select(UserModel, UserResidentialUnitModel)
-                                .join(UserResidentialUnitModel, UserModel.id == UserResidentialUnitModel.int_user_id)
-                                .where(
-                                    and_(
-                                        UserModel.id == uid,
-                                        UserResidentialUnitModel.int_residential_unit_id == unit_id
-                                    )
+                try:
+                    async with async_session_maker() as db:
+                        result = await db.execute(
+                            select(
+                                UserModel.id,
+                                UserModel.bln_allow_entry,
+                                UserResidentialUnitModel.bool_is_admin,
+                                UserResidentialUnitModel.str_apartment_number,
+                                UserResidentialUnitModel.dec_default_voting_weight,
+                            )
+                            .join(UserResidentialUnitModel, UserModel.id == UserResidentialUnitModel.int_user_id)
+                            .where(
+                                and_(
+                                    UserModel.id.in_(batch),
+                                    UserResidentialUnitModel.int_residential_unit_id == unit_id
                                 )
                             )
-                            row = result.first()
-                            if not row:
-                                failed += 1
-                                continue
-
-                            user, user_unit = row
-
-                            if user.bln_allow_entry == enabled:
-                                already_in_state += 1
-                                continue
+                        )
+                        rows_by_id = {row.id: row for row in result.all()}
+
+                        batch_toggled = []
+                        batch_failed = 0
+                        batch_already_in_state = 0
+                        for uid in dict.fromkeys(batch):
+                            row = rows_by_id.get(uid)
+                            if row is None:
+                                batch_failed += 1
+                            elif row.bln_allow_entry == enabled:
+                                batch_already_in_state += 1
+                            else:
+                                batch_toggled.append(uid)
+
+                        if batch_toggled:
+                            await db.execute(
+                                update(UserModel)
+                                .where(UserModel.id.in_(batch_toggled))
+                                .values(bln_allow_entry=enabled, updated_at=colombia_now())
+                                .execution_options(synchronize_session=False)
+                            )
 
-                            user.bln_allow_entry = enabled
-                            user.updated_at = colombia_now()
+                            touched_meeting_ids = []
 
                             if not enabled and programmed_meeting_ids:
                                 await db.execute(
-                                    delete(MeetingInvitationModel).where(
+                                    delete(MeetingInvitationModel)
+                                    .where(
                                         and_(
                                             MeetingInvitationModel.int_meeting_id.in_(programmed_meeting_ids),
-                                            MeetingInvitationModel.int_user_id == uid
+                                            MeetingInvitationModel.int_user_id.in_(batch_toggled)
                                         )
                                     )
+                                    .execution_options(synchronize_session=False)
                                 )
-                                batch_removed_invitations.append(uid)
+                                touched_meeting_ids = programmed_meeting_ids
 
                             if enabled and active_meeting_id:
-                                existing = await db.execute(
-                                    select(MeetingInvitationModel).where(
+                                invited_result = await db.execute(
+                                    select(MeetingInvitationModel.int_user_id).where(
                                         and_(
                                             MeetingInvitationModel.int_meeting_id == active_meeting_id,
-                                            MeetingInvitationModel.int_user_id == uid
+                                            MeetingInvitationModel.int_user_id.in_(batch_toggled)
                                         )
                                     )
                                 )
-                                if not existing.scalar_one_or_none():
-                                    is_admin_no_apt = user_unit.bool_is_admin and not user_unit.str_apartment_number
-                                    quorum_val = Decimal("0") if is_admin_no_apt else (user_unit.dec_default_voting_weight or Decimal("0"))
-                                    apt_number = "ADMIN" if is_admin_no_apt else (user_unit.str_apartment_number or "N/A")
-
-                                    inv = MeetingInvitationModel(
-                                        int_meeting_id=active_meeting_id,
-                                        int_user_id=uid,
-                                        dec_voting_weight=quorum_val,
-                                        dec_quorum_base=quorum_val,
-                                        str_apartment_number=apt_number,
-                                        str_invitation_status="pending",
-                                        str_response_status="no_response",
-                                        dat_sent_at=colombia_now(),
-                                        int_delivery_attemps=0,
-                                        bln_will_attend=False,
-                                        bln_actually_attended=False,
-                                        created_by=created_by,
-                                        updated_by=created_by
-                                    )
-                                    db.add(inv)
-                                    batch_new_invitations.append(uid)
-
-                                batch_to_email.append(uid)
-
-                            successful += 1
-
-                        except Exception as e:
-                            logger.warning(f"⚠️ Error procesando user_id={uid}: {e}")
-                            failed += 1
+                                already_invited = set(invited_result.scalars().all())
+
+                                now = colombia_now()
+                                new_invitations = []
+                                for uid in batch_toggled:
+                                    if uid in already_invited:
+                                        continue
+                                    row = rows_by_id[uid]
+                                    is_admin_no_apt = row.bool_is_admin and not row.str_apartment_number
+                                    quorum_val = Decimal("0") if is_admin_no_apt else (row.dec_default_voting_weight or Decimal("0"))
+                                    apt_number = "ADMIN" if is_admin_no_apt else (row.str_apartment_number or "N/A")
+                                    new_invitations.append({
+                                        'int_meeting_id': active_meeting_id,
+                                        'int_user_id': uid,
+                                        'dec_voting_weight': quorum_val,
+                                        'dec_quorum_base': quorum_val,
+                                        'str_apartment_number': apt_number,
+                                        'str_invitation_status': "pending",
+                                        'str_response_status': "no_response",
+                                        'dat_sent_at': now,
+                                        'int_delivery_attemps': 0,
+                                        'bln_will_attend': False,
+                                        'bln_actually_attended': False,
+                                        'created_by': created_by,
+                                        'updated_by': created_by,
+                                    })
+
+                                if new_invitations:
+                                    await db.execute(insert(MeetingInvitationModel), new_invitations)
+                                    touched_meeting_ids = [active_meeting_id]
+
+                                all_to_email.extend(batch_toggled)
+
+                            # Recalcular el total de invitados con un solo agregado correlacionado
+                            if touched_meeting_ids:
+                                invitation_count = (
+                                    select(func.count(MeetingInvitationModel.id))
+                                    .where(MeetingInvitationModel.int_meeting_id == MeetingModel.id)
+                                    .scalar_subquery()
+                                )
+                                await db.execute(
+                                    update(MeetingModel)
+                                    .where(MeetingModel.id.in_(touched_meeting_ids))
+                                    .values(int_total_invitated=invitation_count)
+                                    .execution_options(synchronize_session=False)
+                                )
 
-                    await db.commit()
+                        await db.commit()
 
-                # Decrementar contador en reuniones programadas por invitaciones eliminadas
-                if batch_removed_invitations and programmed_meeting_ids:
-                    async with async_session_maker() as upd_db:
-                        for mid in programmed_meeting_ids:
-                            mtg = await upd_db.get(MeetingModel, mid)
-                            if mtg and mtg.int_total_invitated:
-                                mtg.int_total_invitated = max(0, mtg.int_total_invitated - len(batch_removed_invitations))
-                        await upd_db.commit()
+                    successful += len(batch_toggled)
+                    failed += batch_failed
+                    already_in_state += batch_already_in_state
 
-                # Actualizar contador de invitados solo para invitaciones nuevas
-                if batch_new_invitations and active_meeting_id:
-                    async with async_session_maker() as upd_db:
-                        mtg = await upd_db.get(MeetingModel, active_meeting_id)
-                        if mtg:
-                            mtg.int_total_invitated = (mtg.int_total_invitated or 0) + len(batch_new_invitations)
-                            await upd_db.commit()
+                    await principal_cache.invalidate_user_ids(batch_toggled, redis_client=r)
 
-                if batch_to_email:
-                    all_to_email.extend(batch_to_email)
+                except Exception as e:
+                    logger.warning(f"⚠️ Error procesando batch desde user_id={batch[0]}: {e}")
+                    failed += len(batch)
 
                 # Actualizar progreso
                 processed = batch_start + len(batch)
@@ -238,16 +255,8 @@ def bulk_toggle_access_task(self, user_ids: list, unit_id: int, enabled: bool, c
                 'error_msg': str(e)[:500],
             })
             await r.expire(key, 3600)
-        finally:
-            await r.close()
-            await engine.dispose()
 
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        loop.run_until_complete(_run())
-    finally:
-        loop.close()
+    run_async(_run())
 
 
 @celery_app.task(bind=True, name='app.tasks.coowner_tasks.bulk_delete_task')
@@ -255,18 +264,15 @@ def bulk_delete_task(self, user_ids: list, unit_id: int, deleting_user_role: int
     logger.info(f"🗑️ bulk_delete_task iniciada: task_id={task_id}, unit_id={unit_id}, count={len(user_ids)}")
 
     async def _run():
-        import redis.asyncio as aioredis
-        from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-        from sqlalchemy.orm import sessionmaker
-        from sqlalchemy import select, delete, and_
+        from sqlalchemy import select, delete, and_, or_
         from app.models.user_model import UserModel
         from app.models.data_user_model import DataUserModel
         from app.models.user_residential_unit_model import UserResidentialUnitModel
+        from app.auth.principal import principal_cache
 
-        engine = create_async_engine(settings.ASYNC_DATABASE_URL, echo=False, pool_pre_ping=True)
-        async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async_session_maker = get_task_session_maker()
 
-        r = await aioredis.from_url(settings.REDIS_URL)
+        r = get_task_redis()
         key = f"{COOWNER_TASK_KEY}:{task_id}"
         total = len(user_ids)
 
@@ -284,58 +290,69 @@ def bulk_delete_task(self, user_ids: list, unit_id: int, deleting_user_role: int
         failed = 0
 
         try:
+            # Cada batch es un número fijo de sentencias: el conjunto permitido se
+            # calcula en una consulta y cada tabla se limpia con un solo DELETE ... IN
             for batch_start in range(0, total, BATCH_SIZE):
-                batch = user_ids[batch_start:batch_start + BATCH_SIZE]
-
-                async with async_session_maker() as db:
-                    for uid in batch:
-                        try:
-                            result = await db.execute(
-                                select(UserModel, UserResidentialUnitModel)
-                                .join(UserResidentialUnitModel, UserModel.id == UserResidentialUnitModel.int_user_id)
-                                .where(
-                                    and_(
-                                        UserModel.id == uid,
-                                        UserResidentialUnitModel.int_residential_unit_id == unit_id
-                                    )
-                                )
-                            )
-                            row = result.first()
-                            if not row:
-                                failed += 1
-                                continue
-
-                            user, user_unit = row
+                batch = list(dict.fromkeys(user_ids[batch_start:batch_start + BATCH_SIZE]))
 
-                            # Solo SuperAdmin puede eliminar admins
-                            is_target_admin = user_unit.bool_is_admin or (user.int_id_rol == 2)
-                            if is_target_admin and deleting_user_role != 1:
-                                failed += 1
-                                continue
-
-                            data_user_id = user.int_data_user_id
+                try:
+                    async with async_session_maker() as db:
+                        conditions = [
+                            UserModel.id.in_(batch),
+                            UserResidentialUnitModel.int_residential_unit_id == unit_id,
+                        ]
+                        # Solo SuperAdmin puede eliminar admins
+                        if deleting_user_role != 1:
+                            conditions.append(or_(
+                                UserResidentialUnitModel.bool_is_admin.is_(None),
+                                UserResidentialUnitModel.bool_is_admin.is_(False),
+                            ))
+                            conditions.append(UserModel.int_id_rol != 2)
+
+                        result = await db.execute(
+                            select(UserModel.id, UserModel.int_data_user_id)
+                            .join(UserResidentialUnitModel, UserModel.id == UserResidentialUnitModel.int_user_id)
+                            .where(and_(*conditions))
+                        )
+                        data_user_by_id = {row.id: row.int_data_user_id for row in result.all()}
+                        permitted_ids = list(data_user_by_id)
 
+                        if permitted_ids:
                             await db.execute(
                                 delete(UserResidentialUnitModel).where(
                                     and_(
-                                        UserResidentialUnitModel.int_user_id == uid,
+                                        UserResidentialUnitModel.int_user_id.in_(permitted_ids),
                                         UserResidentialUnitModel.int_residential_unit_id == unit_id
                                     )
                                 )
                             )
-                            await db.execute(delete(UserModel).where(UserModel.id == uid))
-                            if data_user_id:
-                                await db.execute(delete(DataUserModel).where(DataUserModel.id == data_user_id))
-                            successful += 1
+                            await db.execute(delete(UserModel).where(UserModel.id.in_(permitted_ids)))
+
+                            # Los DataUsers solo se eliminan si ningún otro usuario los referencia
+                            data_user_ids = list({did for did in data_user_by_id.values() if did})
+                            if data_user_ids:
+                                still_ref = await db.execute(
+                                    select(UserModel.int_data_user_id).where(
+                                        UserModel.int_data_user_id.in_(data_user_ids)
+                                    )
+                                )
+                                keep_ids = {row[0] for row in still_ref.all()}
+                                deletable = [did for did in data_user_ids if did not in keep_ids]
+                                if deletable:
+                                    await db.execute(delete(DataUserModel).where(DataUserModel.id.in_(deletable)))
 
-                        except Exception as e:
-                            logger.warning(f"⚠️ Error eliminando user_id={uid}: {e}")
-                            failed += 1
+                        await db.commit()
 
-                    await db.commit()
+                    successful += len(permitted_ids)
+                    failed += len(batch) - len(permitted_ids)
+                    await principal_cache.invalidate_user_ids(permitted_ids, redis_client=r)
+
+                except Exception as e:
+                    logger.warning(f"⚠️ Error eliminando batch desde user_id={batch[0]}: {e}")
+                    failed += len(batch)
 
                 # Actualizar progreso
-                processed = batch_start + len(batch)
+                processed = min(batch_start + BATCH_SIZE, total)
                 pct = max(1, int((processed / total) * 100)) if total > 0 else 100
                 await r.hset(key, mapping={
                     'current': str(processed),
@@ -362,13 +379,5 @@ def bulk_delete_task(self, user_ids: list, unit_id: int, deleting_user_role: int
                 'error_msg': str(e)[:500],
             })
             await r.expire(key, 3600)
-        finally:
-            await r.close()
-            await engine.dispose()
-
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        loop.run_until_complete(_run())
-    finally:
-        loop.close()
+
+    run_async(_run())
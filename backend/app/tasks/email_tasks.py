@@ -1,16 +1,24 @@
-import asyncio
 import secrets
 import string
 import threading
+import uuid
 from typing import List, Dict, Any
 from datetime import datetime
 from app.utils.timezone_utils import colombia_now
+from celery import group
 from app.celery_app import celery_app
+from app.tasks.worker_runtime import run_async, get_task_redis, get_task_session_maker
 from app.utils.email_sender import EmailSender
-from app.core.logging_config import get_logger
+from app.utils.email_templates import get_email_template
+from app.services.email_outbox_service import (
+    EMAIL_TASK_PROGRESS_TTL,
+    EmailOutboxService,
+    increment_email_task_progress,
+    request_outbox_dispatch,
+)
 from app.core.config import settings
+from app.core.logging_config import get_logger
 from app.core.security import security_manager
-from pathlib import Path
 
 logger = get_logger(__name__)
 
@@ -41,11 +49,8 @@ class EmailTaskProgress:
     @staticmethod
     def set_progress(task_id: str, current: int, total: int, status: str = 'processing'):
         """Actualiza el progreso en Redis"""
-        import redis.asyncio as aioredis
-        from app.core.config import settings
-        
         async def _set():
-            r = await aioredis.from_url(settings.REDIS_URL)
+            r = get_task_redis()
             key = f"email_task:{task_id}"
             await r.hset(key, mapping={
                 'current': str(current),
@@ -55,22 +60,15 @@ class EmailTaskProgress:
             })
             await r.expire(key, 3600)
         
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(_set())
-        loop.close()
+        run_async(_set())
     
     @staticmethod
     def get_progress(task_id: str) -> Dict[str, Any]:
         """Obtiene el progreso desde Redis"""
-        import redis.asyncio as aioredis
-        from app.core.config import settings
-        
         async def _get():
-            r = await aioredis.from_url(settings.REDIS_URL)
+            r = get_task_redis()
             key = f"email_task:{task_id}"
             data = await r.hgetall(key)
-            await r.close()
             
             if data:
                 return {
@@ -81,78 +79,50 @@ class EmailTaskProgress:
                 }
             return {'current': 0, 'total': 0, 'status': 'unknown', 'progress': 0}
         
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(_get())
-        loop.close()
-        return result
+        return run_async(_get())
 
 
-def run_async(coro):
-    """Ejecuta una corrutina en un nuevo event loop"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(coro)
-    finally:
-        loop.close()
+def _chunked(ids: List[int], size: int) -> List[List[int]]:
+    """Divide una lista de IDs en trozos de a lo sumo `size` elementos"""
+    size = max(size, 1)
+    return [ids[start:start + size] for start in range(0, len(ids), size)]
 
 
-@celery_app.task(bind=True, name='app.tasks.email_tasks.send_bulk_emails')
-def send_bulk_emails(self, resident_ids: List[int], unit_id: int, task_id: str, frontend_url: str = None, template_name: str = 'email_coproprietario_credentials'):
+async def _enqueue_credential_emails(
+    resident_ids: List[int],
+    unit_id: int,
+    task_id: str,
+    frontend_url: str,
+    template_name: str
+) -> Dict[str, int]:
     """
-    Tarea Celery para enviar correos electrónicos de credenciales de forma masiva.
-    Genera tokens y prepara emails dentro de la tarea (no en el endpoint).
-    
-    Args:
-        resident_ids: Lista de IDs de usuarios
-        unit_id: ID de la unidad residencial
-        task_id: ID de la tarea para tracking
-        frontend_url: URL del frontend
-        template_name: Nombre de la plantilla a usar (default: 'email_coproprietario_credentials')
-                      Opciones: 'email_coproprietario_credentials', 'email_guest_credentials'
+    Prepara y deja en el outbox los correos de credenciales de un trozo de residentes.
+    Los residentes que no se pudieron preparar se suman como fallidos al progreso
+    compartido email_task:{task_id}; los encolados los suma el dispatcher al enviarlos.
     """
-    logger.info(f"📧 Starting bulk credentials send: {len(resident_ids)} residents, unit_id={unit_id}, template={template_name}")
+    from sqlalchemy import select, and_
+    from app.models.user_model import UserModel
+    from app.models.data_user_model import DataUserModel
+    from app.models.user_residential_unit_model import UserResidentialUnitModel
+    from app.models.residential_unit_model import ResidentialUnitModel
+    from app.services.email_notification_service import EmailNotificationService
+    from app.services.simple_auto_login_service import SimpleAutoLoginService
+    from app.services.support_service import SupportService
     
-    async def _send_emails():
-        import redis.asyncio as aioredis
-        from sqlalchemy import select, and_
-        from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-        from sqlalchemy.orm import sessionmaker
-        from app.models.user_model import UserModel
-        from app.models.data_user_model import DataUserModel
-        from app.models.user_residential_unit_model import UserResidentialUnitModel
-        from app.models.residential_unit_model import ResidentialUnitModel
-        from app.services.email_notification_service import EmailNotificationService
-        from app.services.simple_auto_login_service import SimpleAutoLoginService
-        from jinja2 import Template
-        
-        engine = create_async_engine(settings.ASYNC_DATABASE_URL, echo=False, pool_pre_ping=True)
-        async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-        
-        r = await aioredis.from_url(settings.REDIS_URL)
-        key = f"email_task:{task_id}"
-        
-        total = len(resident_ids)
-        
-        await r.hset(key, mapping={
-            'current': '0',
-            'total': str(total),
-            'status': 'processing',
-            'progress': '0'
-        })
-        await r.expire(key, 3600)
-        
+    async_session_maker = get_task_session_maker()
+    r = get_task_redis()
+    
+    resident_ids = list(dict.fromkeys(resident_ids))
+    queued = 0
+    
+    try:
         async with async_session_maker() as db:
             query = select(ResidentialUnitModel).where(ResidentialUnitModel.id == unit_id)
             result = await db.execute(query)
             residential_unit = result.scalar_one_or_none()
             
             if not residential_unit:
-                logger.error(f"Unidad residencial {unit_id} no encontrada")
-                await r.hset(key, mapping={'status': 'failed', 'progress': '0'})
-                await r.close()
-                return {'error': 'Unidad no encontrada'}
+                raise ValueError(f"Unidad residencial {unit_id} no encontrada")
             
             # Usar la plantilla especificada o la default
             valid_templates = {
@@ -160,54 +130,66 @@ def send_bulk_emails(self, resident_ids: List[int], unit_id: int, task_id: str,
                 'email_guest_credentials': 'email_guest_credentials.html'
             }
             template_filename = valid_templates.get(template_name, 'email_coproprietario_credentials.html')
-            template_path = Path(__file__).parent.parent / "templates" / template_filename
-            with open(template_path, 'r', encoding='utf-8') as f:
-                template_content = f.read()
-            
-            template = Template(template_content)
+            template = get_email_template(template_filename)
             auto_login_service = SimpleAutoLoginService()
             notification_service = EmailNotificationService(db)
             
             # Obtener información de soporte técnico UNA SOLA VEZ antes del loop
-            from app.services.support_service import SupportService
             support_service = SupportService(db)
             support_data = await support_service.get_support_info(unit_id)
             
+            # Fase 1: todos los destinatarios del trozo en una sola consulta
+            query = (
+                select(UserModel, DataUserModel, UserResidentialUnitModel)
+                .join(DataUserModel, UserModel.int_data_user_id == DataUserModel.id)
+                .join(UserResidentialUnitModel, UserModel.id == UserResidentialUnitModel.int_user_id)
+                .where(
+                    and_(
+                        UserModel.id.in_(resident_ids),
+                        UserResidentialUnitModel.int_residential_unit_id == unit_id
+                    )
+                )
+            )
+            result = await db.execute(query)
+            rows_by_user_id = {row[0].id: row for row in result.all()}
+            
+            recipients = []
+            for user_id in resident_ids:
+                row = rows_by_user_id.get(user_id)
+                if not row:
+                    logger.warning(f"Usuario {user_id} no encontrado en unidad {unit_id}")
+                    continue
+                recipients.append(row)
+            
+            # Fase 2: tokens en memoria, un INSERT de tokens y uno de notificaciones
+            token_ids = [str(uuid.uuid4()) for _ in recipients]
+            auto_login_tokens = [
+                auto_login_service.generate_auto_login_token_with_id(
+                    username=user.str_username,
+                    token_id=token_id,
+                    expiration_hours=24
+                )
+                for (user, _, _), token_id in zip(recipients, token_ids)
+            ]
+            
+            await auto_login_service.bulk_insert_user_tokens(
+                db, [(token_id, user.id) for (user, _, _), token_id in zip(recipients, token_ids)]
+            )
+            notification_ids = await notification_service.create_notifications_bulk(
+                [user.id for user, _, _ in recipients],
+                template="resend_credentials",
+                status="pending"
+            )
+            
+            # Fase 3: renderizado
             emails_data = []
+            failed_notification_ids = []
+            subject = f"Bienvenido a GIRAMASTER - {residential_unit.str_name}"
             
-            for idx, user_id in enumerate(resident_ids):
+            for (user, data_user, user_unit), auto_login_token, notification_id in zip(
+                recipients, auto_login_tokens, notification_ids
+            ):
                 try:
-                    current = idx + 1
-                    if current % 50 == 0 or current == total:
-                        progress_pct = int((current / total) * 100) if total > 0 else 0
-                        await r.hset(key, mapping={
-                            'current': str(current),
-                            'total': str(total),
-                            'status': 'processing',
-                            'progress': str(progress_pct)
-                        })
-                        await r.expire(key, 3600)
-                    
-                    query = (
-                        select(UserModel, DataUserModel, UserResidentialUnitModel)
-                        .join(DataUserModel, UserModel.int_data_user_id == DataUserModel.id)
-                        .join(UserResidentialUnitModel, UserModel.id == UserResidentialUnitModel.int_user_id)
-                        .where(
-                            and_(
-                                UserModel.id == user_id,
-                                UserResidentialUnitModel.int_residential_unit_id == unit_id
-                            )
-                        )
-                    )
-                    result = await db.execute(query)
-                    user_data = result.first()
-                    
-                    if not user_data:
-                        logger.warning(f"Usuario {user_id} no encontrado en unidad {unit_id}")
-                        continue
-                    
-                    user, data_user, user_unit = user_data
-                    
                     # Generar contraseña temporal para el usuario
                     temp_password = generate_temp_password(
                         data_user.str_firstname,
@@ -215,33 +197,6 @@ def send_bulk_emails(self, resident_ids: List[int], unit_id: int, task_id: str,
                         user_unit.str_apartment_number
                     )
                     
-                    auto_login_token = auto_login_service.generate_auto_login_token(
-                        username=user.str_username,
-                        expiration_hours=24
-                    )
-                    
-                    token_payload = auto_login_service.decode_auto_login_token(auto_login_token)
-                    token_id = token_payload.get('token_id') if token_payload else None
-                    
-                    if token_id:
-                        try:
-                            await auto_login_service.upsert_user_token(db, token_id, user.id, None)
-                            await db.flush()
-                        except Exception as token_err:
-                            logger.warning(f"Token ya existe o error guardando token: {token_err}")
-                            await db.rollback()
-                    
-                    notification = await notification_service.create_notification(
-                        user_id=user.id,
-                        template="resend_credentials",
-                        status="pending",
-                        meeting_id=None
-                    )
-                    
-                    if not frontend_url:
-                        raise ValueError("frontend_url es requerido para generar URL de auto-login")
-                    auto_login_url = f"{frontend_url}/auto-login/{auto_login_token}"
-                    
                     html_content = template.render(
                         firstname=data_user.str_firstname,
                         lastname=data_user.str_lastname,
@@ -252,97 +207,128 @@ def send_bulk_emails(self, resident_ids: List[int], unit_id: int, task_id: str,
                         voting_weight=float(user_unit.dec_default_voting_weight or 0),
                         user_email=data_user.str_email,
                         phone=data_user.str_phone,
-                        auto_login_url=auto_login_url,
+                        auto_login_url=f"{frontend_url}/auto-login/{auto_login_token}",
                         support_name=support_data.get("str_support_name") if support_data else None,
                         support_email=support_data.get("str_support_email") if support_data else None,
                         support_phone=support_data.get("str_support_phone") if support_data else None,
                         support_whatsapp=support_data.get("str_support_whatsapp") if support_data else None,
                     )
                     
-                    subject = f"Bienvenido a GIRAMASTER - {residential_unit.str_name}"
-                    
                     emails_data.append({
                         'to_emails': [data_user.str_email],
                         'subject': subject,
                         'html_content': html_content,
                         'text_content': None,
                         'attach_logo': True,
-                        'notification_id': notification.id
+                        'notification_id': notification_id
                     })
                     
                 except Exception as e:
-                    logger.error(f"Error preparing credentials for user_id={user_id}: {e}")
-                    try:
-                        await db.rollback()
-                    except:
-                        pass
-            
-            await db.commit()
-            
-            email_sender = EmailSender(db)
-            
-            all_successful = 0
-            all_failed = 0
-            all_details = []
-            
-            batch_size = 100
-            for batch_start in range(0, len(emails_data), batch_size):
-                batch_end = min(batch_start + batch_size, len(emails_data))
-                batch = emails_data[batch_start:batch_end]
-                
-                logger.info(f"📦 Enviando batch {batch_start//batch_size + 1}: {len(batch)} emails")
-                
-                result = await email_sender.send_batch_optimized(batch, batch_size=len(batch))
-                
-                for i, detail in enumerate(result.get('detalles', [])):
-                    idx = batch_start + i
-                    if idx < len(emails_data):
-                        notif_id = emails_data[idx].get('notification_id')
-                        if notif_id:
-                            status = "sent" if detail.get('status') == 'success' else "failed"
-                            await notification_service.update_status(notif_id, status=status, commit=False)
-                
-                all_successful += result.get('exitosos', 0)
-                all_failed += result.get('fallidos', 0)
-                all_details.extend(result.get('detalles', []))
-                
-                current = batch_end
-                progress_pct = int((current / total) * 100) if total > 0 else 0
-                
-                await r.hset(key, mapping={
-                    'current': str(current),
-                    'total': str(total),
-                    'status': 'processing',
-                    'progress': str(progress_pct)
-                })
-                await r.expire(key, 3600)
+                    logger.error(f"Error preparing credentials for user_id={user.id}: {e}")
+                    failed_notification_ids.append(notification_id)
             
+            # Fase 4: tokens, notificaciones y outbox en una sola transacción
+            await EmailOutboxService(db).enqueue_many(emails_data, task_id=task_id)
+            await notification_service.update_status_bulk(failed_notification_ids, status="failed")
             await db.commit()
-            await engine.dispose()
-            
-            await r.hset(key, mapping={
-                'current': str(total),
-                'total': str(total),
-                'status': 'completed',
-                'progress': '100',
-                'successful': str(all_successful),
-                'failed': str(all_failed)
-            })
-            await r.expire(key, 3600)
-            await r.close()
-            
-            logger.info(f"✅ Bulk credentials send completed: {all_successful} successful, {all_failed} failed")
-            
-            return {
-                'total': total,
-                'successful': all_successful,
-                'failed': all_failed,
-                'details': all_details
-            }
+            queued = len(emails_data)
+    
+    except Exception as e:
+        logger.error(f"❌ Error preparando trozo de credenciales (task_id={task_id}): {e}")
+    
+    not_queued = len(resident_ids) - queued
+    await increment_email_task_progress(r, task_id, failed=not_queued)
+    if queued:
+        request_outbox_dispatch()
+    
+    logger.info(f"📦 Trozo de credenciales: {queued} encolados, {not_queued} sin preparar (task_id={task_id})")
+    return {'queued': queued, 'failed': not_queued}
+
+
+@celery_app.task(bind=True, name='app.tasks.email_tasks.send_bulk_emails')
+def send_bulk_emails(self, resident_ids: List[int], unit_id: int, task_id: str, frontend_url: str = None, template_name: str = 'email_coproprietario_credentials'):
+    """
+    Tarea Celery para enviar correos electrónicos de credenciales de forma masiva.
+    Genera tokens y prepara emails dentro de la tarea (no en el endpoint) y los deja
+    en el outbox; el envío y el progreso final los registra dispatch_email_outbox.
+    
+    Los envíos de más de EMAIL_FANOUT_CHUNK_SIZE residentes se reparten en subtareas
+    prepare_credential_emails_chunk que corren en paralelo en los workers y suman
+    al mismo progreso email_task:{task_id}.
+    
+    Args:
+        resident_ids: Lista de IDs de usuarios
+        unit_id: ID de la unidad residencial
+        task_id: ID de la tarea para tracking
+        frontend_url: URL del frontend
+        template_name: Nombre de la plantilla a usar (default: 'email_coproprietario_credentials')
+                      Opciones: 'email_coproprietario_credentials', 'email_guest_credentials'
+    """
+    logger.info(f"📧 Starting bulk credentials send: {len(resident_ids)} residents, unit_id={unit_id}, template={template_name}")
+    
+    async def _send_emails():
+        from sqlalchemy import select
+        from app.models.residential_unit_model import ResidentialUnitModel
+        
+        async_session_maker = get_task_session_maker()
+        
+        r = get_task_redis()
+        key = f"email_task:{task_id}"
+        
+        unique_ids = list(dict.fromkeys(resident_ids))
+        total = len(unique_ids)
+        
+        await r.hset(key, mapping={
+            'current': '0',
+            'total': str(total),
+            'status': 'processing',
+            'progress': '0',
+            'successful': '0',
+            'failed': '0'
+        })
+        await r.expire(key, EMAIL_TASK_PROGRESS_TTL)
+        
+        async with async_session_maker() as db:
+            query = select(ResidentialUnitModel.id).where(ResidentialUnitModel.id == unit_id)
+            result = await db.execute(query)
+            if result.scalar_one_or_none() is None:
+                logger.error(f"Unidad residencial {unit_id} no encontrada")
+                await r.hset(key, mapping={'status': 'failed', 'progress': '0'})
+                return {'error': 'Unidad no encontrada'}
+        
+        if not frontend_url:
+            logger.error("frontend_url es requerido para generar URL de auto-login")
+            await r.hset(key, mapping={'status': 'failed', 'progress': '0'})
+            return {'error': 'frontend_url es requerido'}
+        
+        if not unique_ids:
+            await r.hset(key, mapping={'status': 'completed', 'progress': '100'})
+            return {'total': 0, 'chunks': 0}
+        
+        chunks = _chunked(unique_ids, settings.EMAIL_FANOUT_CHUNK_SIZE)
+        if len(chunks) == 1:
+            result = await _enqueue_credential_emails(unique_ids, unit_id, task_id, frontend_url, template_name)
+            return {'total': total, 'chunks': 1, **result}
+        
+        group(
+            prepare_credential_emails_chunk.s(chunk, unit_id, task_id, frontend_url, template_name)
+            for chunk in chunks
+        ).apply_async(queue='email_tasks')
+        
+        logger.info(f"🔀 Bulk credentials repartido en {len(chunks)} subtareas (task_id={task_id})")
+        return {'total': total, 'chunks': len(chunks)}
     
     return run_async(_send_emails())
 
 
+@celery_app.task(bind=True, name='app.tasks.email_tasks.prepare_credential_emails_chunk')
+def prepare_credential_emails_chunk(self, resident_ids: List[int], unit_id: int, task_id: str, frontend_url: str, template_name: str = 'email_coproprietario_credentials'):
+    """
+    Subtarea de send_bulk_emails: prepara y encola las credenciales de un trozo de residentes.
+    """
+    return run_async(_enqueue_credential_emails(resident_ids, unit_id, task_id, frontend_url, template_name))
+
+
 @celery_app.task(bind=True, name='app.tasks.email_tasks.send_single_email')
 def send_single_email(self, to_emails: List[str], subject: str, html_content: str, 
                       text_content: str = None, attach_logo: bool = True):
@@ -369,136 +355,102 @@ def send_single_email(self, to_emails: List[str], subject: str, html_content: st
     return run_async(_send())
 
 
-@celery_app.task(bind=True, name='app.tasks.email_tasks.send_meeting_invitations')
-def send_meeting_invitations(self, meeting_id: int, task_id: str, frontend_url: str = None, user_ids: list = None):
+async def _enqueue_meeting_invitations(
+    meeting_id: int,
+    user_ids: List[int],
+    task_id: str,
+    frontend_url: str
+) -> Dict[str, int]:
     """
-    Tarea Celery para enviar invitaciones de reunión con auto-login.
+    Prepara y deja en el outbox las invitaciones de un trozo de usuarios de la reunión.
+    Igual que en credenciales, los no preparados suman como fallidos al progreso
+    compartido y los encolados los suma el dispatcher.
     """
-    logger.info(f"📧 Starting meeting invitations for meeting_id={meeting_id}, task_id={task_id}, user_ids={user_ids}")
-    
-    async def _send_invitations():
-        import redis.asyncio as aioredis
-        from sqlalchemy import select
-        from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-        from sqlalchemy.orm import sessionmaker
-        from app.models.meeting_model import MeetingModel
-        from app.models.residential_unit_model import ResidentialUnitModel
-        from app.models.user_model import UserModel
-        from app.models.data_user_model import DataUserModel
-        from app.models.user_residential_unit_model import UserResidentialUnitModel
-        from app.models.meeting_invitation_model import MeetingInvitationModel
-        from app.services.email_notification_service import EmailNotificationService
-        from app.services.simple_auto_login_service import SimpleAutoLoginService
-        from jinja2 import Template
-        
-        engine = create_async_engine(settings.ASYNC_DATABASE_URL, echo=False, pool_pre_ping=True)
-        async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-        
-        r = await aioredis.from_url(settings.REDIS_URL)
-        
+    from decimal import Decimal
+    from sqlalchemy import select
+    from app.models.meeting_model import MeetingModel
+    from app.models.residential_unit_model import ResidentialUnitModel
+    from app.models.user_model import UserModel
+    from app.models.data_user_model import DataUserModel
+    from app.models.user_residential_unit_model import UserResidentialUnitModel
+    from app.services.email_notification_service import EmailNotificationService
+    from app.services.simple_auto_login_service import SimpleAutoLoginService
+    from app.services.support_service import SupportService
+
+    async_session_maker = get_task_session_maker()
+    r = get_task_redis()
+
+    user_ids = list(dict.fromkeys(user_ids))
+    queued = 0
+
+    try:
         async with async_session_maker() as db:
             query = select(MeetingModel).where(MeetingModel.id == meeting_id)
             result = await db.execute(query)
             meeting = result.scalar_one_or_none()
-            
+
             if not meeting:
-                logger.error(f"Reunión {meeting_id} no encontrada")
-                await r.hset(f"email_task:{task_id}", mapping={'status': 'failed', 'progress': '0'})
-                await r.close()
-                return {'error': 'Reunión no encontrada'}
-            
+                raise ValueError(f"Reunión {meeting_id} no encontrada")
+
             query = select(ResidentialUnitModel).where(ResidentialUnitModel.id == meeting.int_id_residential_unit)
             result = await db.execute(query)
             residential_unit = result.scalar_one_or_none()
-            
-            base_filter = UserResidentialUnitModel.int_residential_unit_id == meeting.int_id_residential_unit
-            
-            if user_ids and len(user_ids) > 0:
-                query = select(UserModel, DataUserModel, UserResidentialUnitModel).join(
-                    DataUserModel, UserModel.int_data_user_id == DataUserModel.id
-                ).join(
-                    UserResidentialUnitModel, UserModel.id == UserResidentialUnitModel.int_user_id
-                ).where(
-                    base_filter & (UserModel.id.in_(user_ids))
-                )
-            else:
-                query = select(UserModel, DataUserModel, UserResidentialUnitModel).join(
-                    DataUserModel, UserModel.int_data_user_id == DataUserModel.id
-                ).join(
-                    UserResidentialUnitModel, UserModel.id == UserResidentialUnitModel.int_user_id
-                ).where(base_filter)
-            
+
+            query = select(UserModel, DataUserModel, UserResidentialUnitModel).join(
+                DataUserModel, UserModel.int_data_user_id == DataUserModel.id
+            ).join(
+                UserResidentialUnitModel, UserModel.id == UserResidentialUnitModel.int_user_id
+            ).where(
+                (UserResidentialUnitModel.int_residential_unit_id == meeting.int_id_residential_unit)
+                & (UserModel.id.in_(user_ids))
+            )
             result = await db.execute(query)
-            users_data = result.all()
-            
-            total = len(users_data)
-            successful = 0
-            failed = 0
-            
-            logger.info(f"👥 Total usuarios a invitar: {total}")
-            
+            users_data = list({row[0].id: row for row in result.all()}.values())
+
             auto_login_service = SimpleAutoLoginService()
             notification_service = EmailNotificationService(db)
 
-            template_path = Path(__file__).parent.parent / "templates" / "email_meeting_invitation.html"
-            with open(template_path, 'r', encoding='utf-8') as f:
-                template_content = f.read()
-
             meeting_date = meeting.dat_schedule_date.strftime('%d/%m/%Y') if meeting.dat_schedule_date else ''
             meeting_time = meeting.dat_schedule_date.strftime('%H:%M') if meeting.dat_schedule_date else ''
 
-            template = Template(template_content)
+            template = get_email_template("email_meeting_invitation.html")
             meeting_year = str(colombia_now().year)
-            email_sender = EmailSender(db)
 
-            from app.services.support_service import SupportService
             support_service = SupportService(db)
             support_data = await support_service.get_support_info(meeting.int_id_residential_unit)
 
-            from decimal import Decimal
-            from sqlalchemy import update as sa_update
+            # Fase 1: tokens en memoria, un INSERT de tokens y uno de notificaciones
+            token_meeting_id = meeting_id if meeting.str_modality == "presencial" else None
+            token_ids = [str(uuid.uuid4()) for _ in users_data]
+            auto_login_tokens = [
+                auto_login_service.generate_auto_login_token_with_id(
+                    username=user.str_username,
+                    token_id=token_id,
+                    expiration_hours=24,
+                    meeting_id=token_meeting_id
+                )
+                for (user, _, _), token_id in zip(users_data, token_ids)
+            ]
 
-            await r.hset(f"email_task:{task_id}", mapping={
-                'current': '0', 'total': str(total), 'status': 'processing', 'progress': '0',
-                'meeting_title': meeting.str_title
-            })
-            await r.expire(f"email_task:{task_id}", 3600)
+            await auto_login_service.bulk_insert_user_tokens(
+                db, [(token_id, user.id) for (user, _, _), token_id in zip(users_data, token_ids)]
+            )
+            notification_ids = await notification_service.create_notifications_bulk(
+                [user.id for user, _, _ in users_data],
+                template="meeting_invite",
+                status="pending",
+                meeting_id=meeting_id
+            )
 
-            # Fase 1: preparar todos los correos y crear notificaciones
+            # Fase 2: renderizado; la invitación se marca como enviada cuando el
+            # dispatcher confirma el correo (ver metadata)
             emails_to_send = []
-            notifications_map = {}  # user_id → notification.id
-            for user, data_user, user_residential_unit in users_data:
+            failed_notification_ids = []
+            for (user, data_user, user_residential_unit), auto_login_token, notification_id in zip(
+                users_data, auto_login_tokens, notification_ids
+            ):
                 try:
-                    notification = await notification_service.create_notification(
-                        user_id=user.id,
-                        template="meeting_invite",
-                        status="pending",
-                        meeting_id=meeting_id
-                    )
-                    notifications_map[user.id] = notification.id
-
-                    auto_login_token = auto_login_service.generate_auto_login_token(
-                        username=user.str_username,
-                        expiration_hours=24,
-                        meeting_id=meeting_id if meeting.str_modality == "presencial" else None
-                    )
-
-                    # Persistir el token en BD para que el endpoint de auto-login lo valide
-                    token_payload = auto_login_service.decode_auto_login_token(auto_login_token)
-                    token_id = token_payload.get('token_id') if token_payload else None
-                    if token_id:
-                        try:
-                            await auto_login_service.upsert_user_token(db, token_id, user.id, None)
-                            await db.flush()
-                        except Exception as token_err:
-                            logger.warning(f"Error guardando token de auto-login: {token_err}")
-                            await db.rollback()
-
-                    auto_login_url = None
-                    if auto_login_token:
-                        if not frontend_url:
-                            raise ValueError("frontend_url es requerido para generar URL de auto-login")
-                        auto_login_url = f"{frontend_url}/auto-login/{auto_login_token}"
+                    auto_login_url = f"{frontend_url}/auto-login/{auto_login_token}"
 
                     html_content = template.render(
                         user_name=f"{data_user.str_firstname} {data_user.str_lastname}",
@@ -522,121 +474,136 @@ def send_meeting_invitations(self, meeting_id: int, task_id: str, frontend_url:
                         support_phone=support_data.get("str_support_phone") if support_data else None,
                         support_whatsapp=support_data.get("str_support_whatsapp") if support_data else None,
                     )
+                    quorum = user_residential_unit.dec_default_voting_weight if user_residential_unit and user_residential_unit.dec_default_voting_weight else Decimal('1.0')
                     emails_to_send.append({
                         'to_emails': [data_user.str_email],
                         'subject': f"Invitación: {meeting.str_title}",
                         'html_content': html_content,
-                        '_user_id': user.id,
-                        '_email': data_user.str_email,
-                        '_quorum': user_residential_unit.dec_default_voting_weight if user_residential_unit and user_residential_unit.dec_default_voting_weight else Decimal('1.0'),
-                        '_apartment': user_residential_unit.str_apartment_number if user_residential_unit else "N/A",
+                        'notification_id': notification_id,
+                        'metadata': {
+                            'meeting_invitation': {
+                                'meeting_id': meeting_id,
+                                'user_id': user.id,
+                                'voting_weight': str(quorum),
+                                'apartment_number': user_residential_unit.str_apartment_number if user_residential_unit else "N/A",
+                                'created_by': meeting.created_by,
+                            }
+                        },
                     })
                 except Exception as e:
                     logger.error(f"❌ Error preparando correo para user_id={user.id}: {e}")
-                    failed += 1
-
-            # Fase 2: enviar todos con una sola conexión SMTP
-            email_to_uid = {e['_email']: e['_user_id'] for e in emails_to_send}
-            batch_stats = await email_sender.send_batch_optimized(emails_to_send)
-
-            # Fase 3: procesar resultados y actualizar DB en bulk
-            successful_ids = []
-            failed_ids = []
-            for detail in batch_stats.get('detalles', []):
-                email = detail['to'][0] if detail.get('to') else None
-                uid = email_to_uid.get(email)
-                if not uid:
-                    continue
-                if detail.get('status') == 'exitoso':
-                    successful_ids.append(uid)
-                    successful += 1
-                else:
-                    failed_ids.append(uid)
-                    failed += 1
-
-            # Bulk update notificaciones
-            for uid in successful_ids:
-                notif_id = notifications_map.get(uid)
-                if notif_id:
-                    await notification_service.update_status(notif_id, status="sent", commit=False)
-            for uid in failed_ids:
-                notif_id = notifications_map.get(uid)
-                if notif_id:
-                    await notification_service.update_status(notif_id, status="failed", commit=False)
-
-            # Bulk update invitaciones exitosas
-            if successful_ids:
-                await db.execute(
-                    sa_update(MeetingInvitationModel)
-                    .where(
-                        MeetingInvitationModel.int_meeting_id == meeting_id,
-                        MeetingInvitationModel.int_user_id.in_(successful_ids)
-                    )
-                    .values(
-                        str_invitation_status="sent",
-                        dat_sent_at=colombia_now(),
-                        int_delivery_attemps=MeetingInvitationModel.int_delivery_attemps + 1,
-                        updated_at=colombia_now()
-                    )
-                )
-
-            # Crear invitaciones faltantes (usuarios que no tenían registro)
-            inv_result = await db.execute(
-                select(MeetingInvitationModel.int_user_id).where(
-                    MeetingInvitationModel.int_meeting_id == meeting_id,
-                    MeetingInvitationModel.int_user_id.in_(successful_ids)
-                )
-            )
-            existing_inv_ids = {row[0] for row in inv_result.all()}
-            for email_data in emails_to_send:
-                uid = email_data['_user_id']
-                if uid in successful_ids and uid not in existing_inv_ids:
-                    db.add(MeetingInvitationModel(
-                        int_meeting_id=meeting_id,
-                        int_user_id=uid,
-                        dec_voting_weight=email_data['_quorum'],
-                        dec_quorum_base=email_data['_quorum'],
-                        str_apartment_number=email_data['_apartment'],
-                        str_invitation_status="sent",
-                        str_response_status="no_response",
-                        dat_sent_at=colombia_now(),
-                        int_delivery_attemps=1,
-                        bln_will_attend=False,
-                        bln_actually_attended=False,
-                        created_by=meeting.created_by,
-                        updated_by=meeting.created_by
-                    ))
+                    failed_notification_ids.append(notification_id)
 
+            # Fase 3: tokens, notificaciones y outbox en una sola transacción
+            await EmailOutboxService(db).enqueue_many(emails_to_send, task_id=task_id)
+            await notification_service.update_status_bulk(failed_notification_ids, status="failed")
             await db.commit()
+            queued = len(emails_to_send)
 
-            meeting.int_total_invitated = total
-            meeting.updated_at = colombia_now()
-            await db.commit()
-            await engine.dispose()
+    except Exception as e:
+        logger.error(f"❌ Error preparando trozo de invitaciones (meeting_id={meeting_id}, task_id={task_id}): {e}")
+
+    not_queued = len(user_ids) - queued
+    await increment_email_task_progress(r, task_id, failed=not_queued)
+    if queued:
+        request_outbox_dispatch()
+
+    logger.info(f"📦 Trozo de invitaciones: {queued} encoladas, {not_queued} sin preparar (task_id={task_id})")
+    return {'queued': queued, 'failed': not_queued}
+
+
+@celery_app.task(bind=True, name='app.tasks.email_tasks.send_meeting_invitations')
+def send_meeting_invitations(self, meeting_id: int, task_id: str, frontend_url: str = None, user_ids: list = None):
+    """
+    Tarea Celery para enviar invitaciones de reunión con auto-login.
+    Prepara los correos y los deja en el outbox; dispatch_email_outbox los envía,
+    marca las invitaciones como enviadas y completa el progreso.
+
+    Con más de EMAIL_FANOUT_CHUNK_SIZE invitados la preparación se reparte en
+    subtareas prepare_meeting_invitations_chunk que corren en paralelo.
+    """
+    logger.info(f"📧 Starting meeting invitations for meeting_id={meeting_id}, task_id={task_id}, user_ids={user_ids}")
+    
+    async def _send_invitations():
+        from sqlalchemy import select
+        from app.models.meeting_model import MeetingModel
+        from app.models.user_model import UserModel
+        from app.models.data_user_model import DataUserModel
+        from app.models.user_residential_unit_model import UserResidentialUnitModel
+        
+        async_session_maker = get_task_session_maker()
+        
+        r = get_task_redis()
+        key = f"email_task:{task_id}"
+        
+        async with async_session_maker() as db:
+            query = select(MeetingModel).where(MeetingModel.id == meeting_id)
+            result = await db.execute(query)
+            meeting = result.scalar_one_or_none()
             
-            await r.hset(f"email_task:{task_id}", mapping={
-                'current': str(total),
-                'total': str(total),
-                'status': 'completed',
-                'progress': '100',
-                'successful': str(successful),
-                'failed': str(failed)
+            if not meeting:
+                logger.error(f"Reunión {meeting_id} no encontrada")
+                await r.hset(key, mapping={'status': 'failed', 'progress': '0'})
+                return {'error': 'Reunión no encontrada'}
+            
+            query = select(UserModel.id).join(
+                DataUserModel, UserModel.int_data_user_id == DataUserModel.id
+            ).join(
+                UserResidentialUnitModel, UserModel.id == UserResidentialUnitModel.int_user_id
+            ).where(UserResidentialUnitModel.int_residential_unit_id == meeting.int_id_residential_unit)
+            if user_ids:
+                query = query.where(UserModel.id.in_(user_ids))
+            
+            result = await db.execute(query)
+            invited_ids = list(dict.fromkeys(row[0] for row in result.all()))
+            total = len(invited_ids)
+            meeting_title = meeting.str_title
+            
+            logger.info(f"👥 Total usuarios a invitar: {total}")
+            
+            await r.hset(key, mapping={
+                'current': '0', 'total': str(total), 'status': 'processing', 'progress': '0',
+                'successful': '0', 'failed': '0', 'meeting_title': meeting_title
             })
-            await r.expire(f"email_task:{task_id}", 3600)
-            await r.close()
+            await r.expire(key, EMAIL_TASK_PROGRESS_TTL)
             
-            logger.info(f"✅ Meeting invitations completed: {successful} successful, {failed} failed")
+            if not frontend_url:
+                logger.error("frontend_url es requerido para generar URL de auto-login")
+                await r.hset(key, mapping={'status': 'failed', 'progress': '0'})
+                return {'error': 'frontend_url es requerido'}
             
-            return {
-                'total': total,
-                'successful': successful,
-                'failed': failed,
-                'meeting_title': meeting.str_title
-            }
+            meeting.int_total_invitated = total
+            meeting.updated_at = colombia_now()
+            await db.commit()
+        
+        if not invited_ids:
+            await r.hset(key, mapping={'status': 'completed', 'progress': '100'})
+            return {'total': 0, 'chunks': 0, 'meeting_title': meeting_title}
+        
+        chunks = _chunked(invited_ids, settings.EMAIL_FANOUT_CHUNK_SIZE)
+        if len(chunks) == 1:
+            result = await _enqueue_meeting_invitations(meeting_id, invited_ids, task_id, frontend_url)
+            return {'total': total, 'chunks': 1, 'meeting_title': meeting_title, **result}
+        
+        group(
+            prepare_meeting_invitations_chunk.s(meeting_id, chunk, task_id, frontend_url)
+            for chunk in chunks
+        ).apply_async(queue='email_tasks')
+        
+        logger.info(f"🔀 Invitaciones repartidas en {len(chunks)} subtareas (task_id={task_id})")
+        return {'total': total, 'chunks': len(chunks), 'meeting_title': meeting_title}
     
     return run_async(_send_invitations())
 
 
+@celery_app.task(bind=True, name='app.tasks.email_tasks.prepare_meeting_invitations_chunk')
+def prepare_meeting_invitations_chunk(self, meeting_id: int, user_ids: List[int], task_id: str, frontend_url: str):
+    """
+    Subtarea de send_meeting_invitations: prepara y encola las invitaciones de un trozo de usuarios.
+    """
+    return run_async(_enqueue_meeting_invitations(meeting_id, user_ids, task_id, frontend_url))
+
+
 @celery_app.task(bind=True, name='app.tasks.email_tasks.send_qr_email')
 def send_qr_email(self, user_id: int, recipient_email: str = None, frontend_url: str = None):
     """
@@ -646,22 +613,17 @@ def send_qr_email(self, user_id: int, recipient_email: str = None, frontend_url:
     logger.info(f"📧 Starting QR email send for user_id={user_id}")
     
     async def _send_qr():
-        import redis.asyncio as aioredis
         from sqlalchemy import select
-        from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-        from sqlalchemy.orm import sessionmaker
         from app.models.user_model import UserModel
         from app.models.data_user_model import DataUserModel
         from app.models.user_residential_unit_model import UserResidentialUnitModel
         from app.models.residential_unit_model import ResidentialUnitModel
         from app.services.qr_service import qr_service
         from app.services.email_service import EmailService
-        from app.core.config import settings
         from app.core.security import security_manager
         from pathlib import Path
         
-        engine = create_async_engine(settings.ASYNC_DATABASE_URL, echo=False, pool_pre_ping=True)
-        async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async_session_maker = get_task_session_maker()
         
         try:
             async with async_session_maker() as db:
@@ -724,8 +686,6 @@ def send_qr_email(self, user_id: int, recipient_email: str = None, frontend_url:
         except Exception as e:
             logger.error(f"❌ Error sending QR email: {str(e)}")
             return {'success': False, 'error': str(e)}
-        finally:
-            await engine.dispose()
     
     return run_async(_send_qr())
 
@@ -751,26 +711,16 @@ def send_welcome_email(
     logger.info(f"📧 Starting welcome email for {user_email}")
     
     async def _send_welcome():
-        from sqlalchemy.ext.asyncio import create_async_engine
-        from sqlalchemy.orm import sessionmaker
-        from app.core.config import settings
-        from jinja2 import Template
-        from pathlib import Path
-        
-        engine = create_async_engine(settings.ASYNC_DATABASE_URL, echo=False, pool_pre_ping=True)
-        async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async_session_maker = get_task_session_maker()
         
         try:
             async with async_session_maker() as db:
-                template_path = Path(__file__).parent.parent / "templates" / "email_coproprietario_credentials.html"
-                
-                if not template_path.exists():
-                    logger.error(f"Template de email no encontrado: {template_path}")
+                try:
+                    template = get_email_template("email_coproprietario_credentials.html")
+                except FileNotFoundError as e:
+                    logger.error(f"Template de email no encontrado: {e}")
                     return {'success': False, 'error': 'Template no encontrado'}
                 
-                with open(template_path, 'r', encoding='utf-8') as f:
-                    html_template = f.read()
-                
                 name_parts = user_name.split(' ', 1)
                 firstname = name_parts[0] if name_parts else user_name
                 lastname = name_parts[1] if len(name_parts) > 1 else ''
@@ -781,7 +731,6 @@ def send_welcome_email(
                         raise ValueError("frontend_url es requerido para generar URL de auto-login")
                     auto_login_url = f"{frontend_url}/auto-login/{auto_login_token}"
                 
-                template = Template(html_template)
                 # El voting_weight ya viene guardado en escala porcentual (0-100), no como fracción
                 voting_weight_percent = float(voting_weight)
 
@@ -812,8 +761,6 @@ def send_welcome_email(
         except Exception as e:
             logger.error(f"❌ Error sending welcome email: {str(e)}")
             return {'success': False, 'error': str(e)}
-        finally:
-            await engine.dispose()
     
     return run_async(_send_welcome())
 
@@ -833,19 +780,13 @@ def send_single_credential_email(
     
     async def _send_credential():
         from sqlalchemy import select, and_
-        from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-        from sqlalchemy.orm import sessionmaker
         from app.models.user_model import UserModel
         from app.models.data_user_model import DataUserModel
         from app.models.user_residential_unit_model import UserResidentialUnitModel
         from app.models.residential_unit_model import ResidentialUnitModel
         from app.services.simple_auto_login_service import simple_auto_login_service
-        from app.core.config import settings
-        from jinja2 import Template
-        from pathlib import Path
         
-        engine = create_async_engine(settings.ASYNC_DATABASE_URL, echo=False, pool_pre_ping=True)
-        async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async_session_maker = get_task_session_maker()
         
         try:
             async with async_session_maker() as db:
@@ -902,12 +843,7 @@ def send_single_credential_email(
                     'email_guest_credentials': 'email_guest_credentials.html'
                 }
                 template_filename = valid_templates.get(template_name, 'email_coproprietario_credentials.html')
-                template_path = Path(__file__).parent.parent / "templates" / template_filename
-                
-                with open(template_path, 'r', encoding='utf-8') as f:
-                    template_content = f.read()
-                
-                template = Template(template_content)
+                template = get_email_template(template_filename)
                 if not frontend_url:
                     raise ValueError("frontend_url es requerido para generar URL de auto-login")
                 auto_login_url = f"{frontend_url}/auto-login/{auto_login_token}"
@@ -951,7 +887,26 @@ def send_single_credential_email(
         except Exception as e:
             logger.error(f"❌ Error sending credential email: {str(e)}")
             return {'success': False, 'error': str(e)}
-        finally:
-            await engine.dispose()
     
-    return run_async(_send_credential())
\ No newline at end of file
+    return run_async(_send_credential())
+
+
+@celery_app.task(bind=True, name='app.tasks.email_tasks.dispatch_email_outbox')
+def dispatch_email_outbox(self, max_rounds: int = 50):
+    """
+    Tarea Celery que drena el outbox de correos (tbl_email_outbox).
+    La encolan los productores al hacer commit; al terminar se reprograma sola
+    para los correos diferidos por token bucket, los reintentos con backoff, los
+    liberados tras un 5.4.5 y los que dejó un worker caído.
+    Varias instancias pueden correr en paralelo: cada una reclama filas distintas.
+    """
+    async def _dispatch():
+        from app.services.email_outbox_service import EmailOutboxDispatcher
+        
+        async_session_maker = get_task_session_maker()
+        
+        async with async_session_maker() as db:
+            dispatcher = EmailOutboxDispatcher(db, get_task_redis())
+            return await dispatcher.run(max_rounds=max_rounds)
+    
+    return run_async(_dispatch())
\ No newline at end of file
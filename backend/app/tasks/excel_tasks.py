@@ -1,9 +1,9 @@
-import asyncio
 import base64
 
 from app.celery_app import celery_app
-from app.core.config import settings
+from app.tasks.worker_runtime import run_async, get_task_redis, get_task_session_maker
 from app.core.logging_config import get_logger
+from app.utils.excel_upload_store import EXCEL_UPLOAD_KEY
 
 logger = get_logger(__name__)
 
@@ -11,23 +11,24 @@ EXCEL_TASK_KEY = "excel_task"
 
 
 @celery_app.task(bind=True, name='app.tasks.excel_tasks.process_excel_upload')
-def process_excel_upload(self, file_content_b64: str, unit_id: int, created_by: int, task_id: str):
+def process_excel_upload(self, file_ref: str, unit_id: int, created_by: int, task_id: str, import_mode: str = "replace"):
     """
     Procesa un archivo Excel de copropietarios en segundo plano.
     Actualiza progreso en Redis y despacha la tarea de emails al completar.
+
+    file_ref es la key de Redis guardada por store_excel_upload. Por compatibilidad
+    con mensajes encolados antes del cambio también acepta el contenido en base64.
+    El archivo se borra solo cuando la importación termina: si el worker muere y la
+    tarea se reentrega (acks_late) el reintento todavía lo encuentra.
     """
     logger.info(f"📊 Iniciando Excel upload task: task_id={task_id}, unit_id={unit_id}")
 
     async def _run():
-        import redis.asyncio as aioredis
-        from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-        from sqlalchemy.orm import sessionmaker
         from app.services.residential_unit_service import ResidentialUnitService
 
-        engine = create_async_engine(settings.ASYNC_DATABASE_URL, echo=False, pool_pre_ping=True)
-        async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async_session_maker = get_task_session_maker()
 
-        r = await aioredis.from_url(settings.REDIS_URL)
+        r = get_task_redis()
         key = f"{EXCEL_TASK_KEY}:{task_id}"
 
         await r.hset(key, mapping={
@@ -42,25 +43,21 @@ def process_excel_upload(self, file_content_b64: str, unit_id: int, created_by:
         })
         await r.expire(key, 7200)
 
-        try:
-            import pandas as pd
-            import io as _io
-
-            file_content = base64.b64decode(file_content_b64)
-
-            # Obtener el total de filas antes de procesar para mostrarlo desde el inicio
-            df_preview = pd.read_excel(_io.BytesIO(file_content))
-            total_rows_count = len(df_preview)
-            del df_preview
-
-            await r.hset(key, mapping={
-                'total': str(total_rows_count),
-                'progress': '1',  # sliver visible desde el inicio
-            })
-            await r.expire(key, 7200)
+        is_stored_upload = file_ref.startswith(f"{EXCEL_UPLOAD_KEY}:")
 
+        try:
+            if is_stored_upload:
+                file_content = await r.get(file_ref)
+                if file_content is None:
+                    raise ValueError("El archivo de la carga expiró o no existe. Súbelo de nuevo.")
+            else:
+                file_content = base64.b64decode(file_ref)
+
+            # El servicio reporta el total (dimensión de la hoja) con current=0 al abrir
+            # el archivo, sin parsearlo dos veces
             async def on_progress(current: int, total: int):
                 pct = int((current / total) * 100) if total > 0 else 0
+                pct = max(pct, 1)  # sliver visible desde el inicio
                 await r.hset(key, mapping={
                     'current': str(current),
                     'total': str(total),
@@ -77,6 +74,7 @@ def process_excel_upload(self, file_content_b64: str, unit_id: int, created_by:
                     unit_id=unit_id,
                     created_by=created_by,
                     progress_callback=on_progress,
+                    import_mode=import_mode,
                 )
 
             await r.hset(key, mapping={
@@ -88,8 +86,11 @@ def process_excel_upload(self, file_content_b64: str, unit_id: int, created_by:
                 'successful': str(results['successful']),
                 'failed': str(results['failed']),
                 'email_task_id': '',
+                **{k: str(v) for k, v in results.get('diff', {}).items()},
             })
             await r.expire(key, 7200)
+            if is_stored_upload:
+                await r.delete(file_ref)
             logger.info(f"✅ Excel task completada: task_id={task_id}, exitosos={results['successful']}, fallidos={results['failed']}")
 
         except Exception as e:
@@ -101,13 +102,5 @@ def process_excel_upload(self, file_content_b64: str, unit_id: int, created_by:
                 'error_msg': str(e)[:500],
             })
             await r.expire(key, 3600)
-        finally:
-            await r.close()
-            await engine.dispose()
-
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        loop.run_until_complete(_run())
-    finally:
-        loop.close()
+
+    run_async(_run())
@@ -0,0 +1,126 @@
+"""
+Recursos compartidos por las tareas de un proceso worker de Celery.
+
+Cada proceso hijo del pool prefork mantiene un único event loop, un engine
+de SQLAlchemy con su pool de conexiones y un cliente Redis, creados al iniciar
+el proceso (worker_process_init) y reutilizados por todas las tareas que ejecuta.
+Los objetos asyncio quedan atados al loop en que se crean, por eso todas las
+tareas deben correr sus corrutinas con run_async de este módulo.
+"""
+import asyncio
+
+from celery.signals import worker_process_init, worker_process_shutdown
+
+from app.core.config import settings
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+TASK_DB_POOL_SIZE = 5
+TASK_DB_MAX_OVERFLOW = 5
+TASK_DB_POOL_RECYCLE = 1800
+
+_loop = None
+_engine = None
+_session_maker = None
+_redis = None
+
+
+def _reset():
+    """Descarta referencias heredadas del proceso padre (no son válidas tras el fork)"""
+    global _loop, _engine, _session_maker, _redis
+    _loop = None
+    _engine = None
+    _session_maker = None
+    _redis = None
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Retorna el event loop persistente del proceso (lo crea si no existe)"""
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop
+
+
+def run_async(coro):
+    """Ejecuta una corrutina en el event loop persistente del proceso"""
+    return get_loop().run_until_complete(coro)
+
+
+def get_task_engine():
+    """Engine de SQLAlchemy compartido por las tareas del proceso"""
+    global _engine
+    if _engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        _engine = create_async_engine(
+            settings.ASYNC_DATABASE_URL,
+            echo=False,
+            pool_pre_ping=True,
+            pool_size=TASK_DB_POOL_SIZE,
+            max_overflow=TASK_DB_MAX_OVERFLOW,
+            pool_recycle=TASK_DB_POOL_RECYCLE,
+        )
+    return _engine
+
+
+def get_task_session_maker():
+    """Fábrica de sesiones asíncronas ligada al engine del proceso"""
+    global _session_maker
+    if _session_maker is None:
+        from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+        _session_maker = async_sessionmaker(
+            get_task_engine(), class_=AsyncSession, expire_on_commit=False
+        )
+    return _session_maker
+
+
+def get_task_redis():
+    """
+    Cliente Redis compartido por las tareas del proceso.
+
+    No decodifica respuestas (retorna bytes), igual que los clientes que
+    creaban las tareas con `aioredis.from_url(settings.REDIS_URL)`.
+    """
+    global _redis
+    if _redis is None:
+        import redis.asyncio as aioredis
+
+        _redis = aioredis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        )
+    return _redis
+
+
+async def _close_resources():
+    if _redis is not None:
+        await _redis.aclose()
+    if _engine is not None:
+        await _engine.dispose()
+
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    """Prepara el loop del proceso hijo; engine y Redis se crean en el primer uso"""
+    _reset()
+    get_loop()
+    logger.info("⚙️ Worker de tareas inicializado con loop persistente")
+
+
+@worker_process_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    """Cierra Redis, el pool de la base de datos y el loop al terminar el proceso"""
+    if _loop is None or _loop.is_closed():
+        return
+    try:
+        _loop.run_until_complete(_close_resources())
+    except Exception as e:
+        logger.warning(f"Error cerrando recursos del worker: {e}")
+    finally:
+        _loop.close()
+        _reset()
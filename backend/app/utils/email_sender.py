@@ -1,12 +1,15 @@
 """
 Utilidad para el envío de correos electrónicos usando Gmail SMTP.
 Soporta múltiples cuentas SMTP con failover automático al exceder límite diario.
+Los envíos async usan aiosmtplib y reparten los lotes entre varias conexiones por cuenta.
 """
+import asyncio
 import smtplib
 import ssl
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.image import MIMEImage
+import aiosmtplib
+from email.message import EmailMessage, MIMEPart
+from email.policy import SMTP
+from email.utils import formataddr
 from typing import List, Optional, Dict, Any, Tuple
 from pathlib import Path
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -33,6 +36,37 @@ def _is_gmail_limit_error(error: Exception) -> bool:
     return any(indicator in error_str for indicator in _GMAIL_LIMIT_INDICATORS)
 
 
+def _is_permanent_rejection(error: Exception) -> bool:
+    """
+    Detecta un rechazo definitivo del destinatario o del mensaje (respuesta 5xx).
+
+    Debe evaluarse después de _is_gmail_limit_error: el 550 5.4.5 es un límite de
+    la cuenta y no del correo. SMTPSenderRefused no se considera definitivo porque
+    depende de la cuenta remitente y el correo puede salir por otra.
+    """
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        codes = [recipient.code for recipient in error.recipients]
+        return bool(codes) and all(500 <= code < 600 for code in codes)
+    if isinstance(error, aiosmtplib.SMTPDataError):
+        return 500 <= error.code < 600
+    return False
+
+
+# Claves del email que se copian a su detalle para reconciliar resultados
+_DETAIL_PASSTHROUGH_KEYS = ("notification_id", "outbox_id")
+
+
+def _batch_detail(email_data: dict, status: str, error: Optional[str] = None) -> dict:
+    """Detalle por email de un envío por lote; conserva notification_id/outbox_id si el productor los incluyó."""
+    detail = {"to": email_data.get("to_emails", []), "status": status}
+    if error is not None:
+        detail["error"] = error
+    for key in _DETAIL_PASSTHROUGH_KEYS:
+        if email_data.get(key) is not None:
+            detail[key] = email_data[key]
+    return detail
+
+
 class EmailSender:
     """
     Clase para manejar el envío de correos electrónicos.
@@ -46,6 +80,7 @@ class EmailSender:
         self.db = db
         self._credentials_loaded = False
         self._credentials = {}
+        self._logo_part: Optional[MIMEPart] = None
 
         self.logo_path = Path(__file__).parent.parent / "templates" / "static" / "img" / "LogoGira.gif"
 
@@ -124,23 +159,33 @@ class EmailSender:
                 self._load_credentials_from_env()
             self._credentials_loaded = True
 
-    def _attach_logo(self, message: MIMEMultipart) -> bool:
-        try:
-            if not self.logo_path.exists():
-                logger.warning("Logo no encontrado, correo se enviará sin logo")
-                return False
-
-            with open(self.logo_path, 'rb') as img_file:
-                img = MIMEImage(img_file.read())
-                img.add_header('Content-ID', '<logo>')
-                img.add_header('Content-Disposition', 'inline', filename='LogoGira.gif')
-                message.attach(img)
+    def _load_logo_part(self) -> Optional[MIMEPart]:
+        """
+        Parte MIME inline del logo, codificada en base64 una sola vez por instancia.
+        La misma parte se adjunta a todos los mensajes (solo se lee al serializar).
+        """
+        if self._logo_part is not None:
+            return self._logo_part
 
-            return True
+        if not self.logo_path.exists():
+            logger.warning("Logo no encontrado, correo se enviará sin logo")
+            return None
 
+        try:
+            logo_part = MIMEPart(policy=SMTP)
+            logo_part.set_content(
+                self.logo_path.read_bytes(),
+                maintype='image',
+                subtype='gif',
+                disposition='inline',
+                filename='LogoGira.gif',
+                cid='<logo>'
+            )
+            self._logo_part = logo_part
+            return logo_part
         except Exception as e:
-            logger.error(f"Error al adjuntar logo: {str(e)}")
-            return False
+            logger.error(f"Error al cargar logo: {str(e)}")
+            return None
 
     def _build_message(
         self,
@@ -151,45 +196,81 @@ class EmailSender:
         from_name: str,
         text_content: Optional[str] = None,
         cc_emails: Optional[List[str]] = None,
-        attach_logo: bool = True,
-        logo_data: Optional[bytes] = None
-    ) -> MIMEMultipart:
-        """Construye el objeto MIMEMultipart listo para enviar."""
-        message = MIMEMultipart("related")
+        attach_logo: bool = True
+    ) -> EmailMessage:
+        """
+        Construye el EmailMessage listo para enviar (serializar con as_bytes()).
+        El logo va en un multipart/related junto al HTML; el cuerpo se codifica en
+        quoted-printable para que el mensaje sea 7-bit sin depender de 8BITMIME.
+        """
+        message = EmailMessage(policy=SMTP)
         message["Subject"] = subject
-        message["From"] = f"{from_name} <{from_email}>"
+        message["From"] = formataddr((from_name, from_email))
         message["To"] = ", ".join(to_emails)
 
         if cc_emails:
             message["Cc"] = ", ".join(cc_emails)
 
-        msg_alternative = MIMEMultipart("alternative")
-        message.attach(msg_alternative)
-
         if text_content:
-            msg_alternative.attach(MIMEText(text_content, "plain", "utf-8"))
-
-        msg_alternative.attach(MIMEText(html_content, "html", "utf-8"))
+            message.set_content(text_content, charset="utf-8", cte="quoted-printable")
+            message.add_alternative(html_content, subtype="html", charset="utf-8", cte="quoted-printable")
+        else:
+            message.set_content(html_content, subtype="html", charset="utf-8", cte="quoted-printable")
 
         if attach_logo:
-            if logo_data:
-                img = MIMEImage(logo_data)
-                img.add_header('Content-ID', '<logo>')
-                img.add_header('Content-Disposition', 'inline', filename='LogoGira.gif')
-                message.attach(img)
-            else:
-                self._attach_logo(message)
+            logo_part = self._load_logo_part()
+            if logo_part is not None:
+                html_part = message.get_body(("html",))
+                html_part.make_related()
+                html_part.attach(logo_part)
 
         return message
 
-    def _load_logo_data(self) -> Optional[bytes]:
-        if self.logo_path.exists():
-            try:
-                with open(self.logo_path, 'rb') as f:
-                    return f.read()
-            except Exception as e:
-                logger.warning(f"No se pudo cargar el logo: {e}")
-        return None
+    # ------------------------------------------------------------------
+    # Conexiones SMTP async
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    async def _open_smtp_connection(account: dict) -> aiosmtplib.SMTP:
+        """Abre y autentica una conexión SMTP async (TLS implícito en 465, STARTTLS en el resto)."""
+        port = int(account['port'])
+        implicit_tls = port == 465
+        smtp = aiosmtplib.SMTP(
+            hostname=account['host'],
+            port=port,
+            use_tls=implicit_tls,
+            start_tls=settings.SMTP_STARTTLS and not implicit_tls,
+            timeout=settings.SMTP_TIMEOUT,
+        )
+        await smtp.connect()
+        await smtp.login(account['user'], account['password'])
+        return smtp
+
+    @staticmethod
+    async def _close_smtp_connection(smtp: aiosmtplib.SMTP) -> None:
+        try:
+            await smtp.quit()
+        except Exception:
+            smtp.close()
+
+    async def _open_smtp_pool(self, account: dict, size: int) -> List[aiosmtplib.SMTP]:
+        """
+        Abre hasta `size` conexiones autenticadas para la cuenta.
+        La primera se abre sola para que los errores de autenticación o de límite
+        se propaguen; las demás son opcionales y se descartan si fallan.
+        """
+        connections = [await self._open_smtp_connection(account)]
+        if size > 1:
+            extra = await asyncio.gather(
+                *(self._open_smtp_connection(account) for _ in range(size - 1)),
+                return_exceptions=True
+            )
+            for conn in extra:
+                if isinstance(conn, Exception):
+                    logger.warning(f"⚠️ No se pudo abrir conexión SMTP adicional: {conn}")
+                else:
+                    connections.append(conn)
+        return connections
 
     # ------------------------------------------------------------------
     # Envío individual (sync — .env solamente, backward compatible)
@@ -247,7 +328,7 @@ class EmailSender:
                     all_recipients.extend(cc_emails)
                 if bcc_emails:
                     all_recipients.extend(bcc_emails)
-                server.sendmail(account_creds['from_email'], all_recipients, message.as_string())
+                server.sendmail(account_creds['from_email'], all_recipients, message.as_bytes())
 
             logger.info(f"✅ Email enviado exitosamente a {len(to_emails)} destinatario(s)")
             return True
@@ -283,7 +364,7 @@ class EmailSender:
         if not self.db:
             # Modo .env
             await self._ensure_credentials_loaded()
-            return self._send_single_with_creds(
+            return await self._send_single_with_creds(
                 self._credentials, to_emails, subject, html_content,
                 text_content, cc_emails, bcc_emails, attach_logo
             )
@@ -302,7 +383,7 @@ class EmailSender:
                 raise AllSmtpAccountsExceededException()
 
             tried.add(account['id'])
-            success, rate_limited = self._send_single_with_account(
+            success, rate_limited = await self._send_single_with_account(
                 account, to_emails, subject, html_content,
                 text_content, cc_emails, bcc_emails, attach_logo
             )
@@ -317,7 +398,7 @@ class EmailSender:
 
             return success
 
-    def _send_single_with_creds(
+    async def _send_single_with_creds(
         self,
         creds: dict,
         to_emails, subject, html_content,
@@ -340,13 +421,13 @@ class EmailSender:
             'from_email': creds.get('from_email'),
             'from_name': creds.get('from_name'),
         }
-        success, _ = self._send_single_with_account(
+        success, _ = await self._send_single_with_account(
             account, to_emails, subject, html_content,
             text_content, cc_emails, bcc_emails, attach_logo
         )
         return success
 
-    def _send_single_with_account(
+    async def _send_single_with_account(
         self,
         account: dict,
         to_emails: List[str],
@@ -367,32 +448,31 @@ class EmailSender:
                 account['from_email'], account['from_name'],
                 text_content, cc_emails, attach_logo
             )
-            context = ssl.create_default_context()
-            with smtplib.SMTP(account['host'], account['port']) as server:
-                server.ehlo()
-                server.starttls(context=context)
-                server.ehlo()
-                server.login(account['user'], account['password'])
-                all_recipients = to_emails.copy()
-                if cc_emails:
-                    all_recipients.extend(cc_emails)
-                if bcc_emails:
-                    all_recipients.extend(bcc_emails)
-                server.sendmail(account['from_email'], all_recipients, message.as_string())
+            all_recipients = to_emails.copy()
+            if cc_emails:
+                all_recipients.extend(cc_emails)
+            if bcc_emails:
+                all_recipients.extend(bcc_emails)
+
+            smtp = await self._open_smtp_connection(account)
+            try:
+                await smtp.sendmail(account['from_email'], all_recipients, message.as_bytes())
+            finally:
+                await self._close_smtp_connection(smtp)
 
             logger.info(f"✅ Email enviado exitosamente a {len(to_emails)} destinatario(s)")
             return True, False
 
-        except (smtplib.SMTPDataError, smtplib.SMTPSenderRefused, smtplib.SMTPRecipientsRefused) as e:
+        except (aiosmtplib.SMTPDataError, aiosmtplib.SMTPSenderRefused, aiosmtplib.SMTPRecipientsRefused) as e:
             if _is_gmail_limit_error(e):
                 logger.warning(f"⚠️ Límite de Gmail detectado: {str(e)}")
                 return False, True
             logger.error(f"❌ Error SMTP al enviar email: {str(e)}")
             return False, False
-        except smtplib.SMTPAuthenticationError as e:
+        except aiosmtplib.SMTPAuthenticationError as e:
             logger.error(f"❌ Error de autenticación SMTP: {str(e)}")
             return False, False
-        except smtplib.SMTPException as e:
+        except aiosmtplib.SMTPException as e:
             if _is_gmail_limit_error(e):
                 return False, True
             logger.error(f"❌ Error SMTP: {str(e)}")
@@ -493,6 +573,32 @@ class EmailSender:
         # Multi-cuenta con failover
         return await self._send_batch_with_failover(emails_data, stats)
 
+    async def send_batch_with_account(
+        self,
+        account: dict,
+        emails_data: List[Dict[str, Any]]
+    ) -> Tuple[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Envía un lote con una cuenta SMTP concreta, sin failover.
+        Lo usa el dispatcher del outbox, que decide qué cuenta toma cada correo.
+
+        Retorna (rate_limited, stats, no_enviados): si la cuenta alcanzó el límite
+        de Gmail, no_enviados son los correos que no se alcanzaron a intentar.
+        """
+        stats = {
+            "total": len(emails_data),
+            "exitosos": 0,
+            "fallidos": 0,
+            "detalles": []
+        }
+        if not emails_data:
+            return False, stats, []
+
+        rate_limited, stats, still_pending = await self._send_emails_via_connection(
+            account, list(enumerate(emails_data)), stats, indexed=True
+        )
+        return rate_limited, stats, [email_data for _, email_data in still_pending]
+
     async def _send_batch_single_account(
         self,
         emails_data: List[Dict[str, Any]],
@@ -522,8 +628,7 @@ class EmailSender:
             'from_name': self._credentials.get('from_name'),
         }
 
-        logo_data = self._load_logo_data()
-        stats, _ = await self._send_emails_via_connection(account, emails_data, stats, logo_data)
+        stats, _ = await self._send_emails_via_connection(account, emails_data, stats)
         return stats
 
     async def _send_batch_with_failover(
@@ -539,7 +644,6 @@ class EmailSender:
         from app.core.exceptions import AllSmtpAccountsExceededException
 
         config_service = SystemConfigService(self.db)
-        logo_data = self._load_logo_data()
 
         # Lista de (índice_original, email_data) pendientes de enviar
         pending: List[Tuple[int, Dict]] = list(enumerate(emails_data))
@@ -551,11 +655,10 @@ class EmailSender:
                 # Todas las cuentas excedidas — marcar los restantes como fallidos
                 for _, email_data in pending:
                     stats["fallidos"] += 1
-                    stats["detalles"].append({
-                        "to": email_data.get("to_emails", []),
-                        "status": "limite_excedido",
-                        "error": "Todas las cuentas SMTP han excedido su límite diario"
-                    })
+                    stats["detalles"].append(_batch_detail(
+                        email_data, "limite_excedido",
+                        "Todas las cuentas SMTP han excedido su límite diario"
+                    ))
                 logger.error(
                     f"❌ Todas las cuentas SMTP excedidas. "
                     f"{len(pending)} correos sin enviar."
@@ -570,7 +673,7 @@ class EmailSender:
             )
 
             rate_limited, stats, still_pending = await self._send_emails_via_connection(
-                account, pending, stats, logo_data, indexed=True
+                account, pending, stats, indexed=True
             )
 
             if rate_limited:
@@ -590,11 +693,15 @@ class EmailSender:
         account: dict,
         emails: List,
         stats: Dict,
-        logo_data: Optional[bytes],
         indexed: bool = False
     ):
         """
-        Abre una conexión SMTP y envía la lista de emails.
+        Abre un pool de conexiones SMTP para la cuenta y reparte los emails entre ellas.
+
+        Cada conexión toma el siguiente email pendiente de un iterador compartido,
+        de modo que hasta SMTP_CONNECTIONS_PER_ACCOUNT mensajes viajan en paralelo.
+        Al detectar el límite de Gmail en cualquier conexión se deja de tomar
+        emails y los no enviados se devuelven para la siguiente cuenta.
 
         indexed=False: emails es List[Dict]
         indexed=True:  emails es List[Tuple[int, Dict]] (con índice original)
@@ -603,88 +710,19 @@ class EmailSender:
           - (stats, []) cuando indexed=False
           - (rate_limited: bool, stats, still_pending: List[Tuple]) cuando indexed=True
         """
-        context = ssl.create_default_context()
-
-        def _items():
-            return emails if not indexed else emails
+        pool_size = max(1, min(settings.SMTP_CONNECTIONS_PER_ACCOUNT, len(emails)))
 
         try:
-            with smtplib.SMTP(account['host'], account['port']) as server:
-                server.ehlo()
-                server.starttls(context=context)
-                server.ehlo()
-                server.login(account['user'], account['password'])
-                logger.info(
-                    f"✅ Conexión SMTP establecida con cuenta {account.get('id', '?')}, "
-                    f"enviando {len(emails)} emails..."
-                )
-
-                remaining_pending = []
-                rate_limited = False
-
-                for item in _items():
-                    if indexed:
-                        idx, email_data = item
-                    else:
-                        email_data = item
-
-                    if rate_limited:
-                        if indexed:
-                            remaining_pending.append(item)
-                        continue
-
-                    try:
-                        to_emails = email_data.get('to_emails', [])
-                        subject = email_data.get('subject', '')
-                        html_content = email_data.get('html_content', '')
-                        text_content = email_data.get('text_content')
-
-                        message = self._build_message(
-                            to_emails, subject, html_content,
-                            account['from_email'], account['from_name'],
-                            text_content, None, True, logo_data
-                        )
-
-                        server.sendmail(account['from_email'], to_emails, message.as_string())
-                        stats["exitosos"] += 1
-                        stats["detalles"].append({"to": to_emails, "status": "exitoso"})
-
-                    except (smtplib.SMTPDataError, smtplib.SMTPSenderRefused, smtplib.SMTPRecipientsRefused) as e:
-                        if _is_gmail_limit_error(e):
-                            logger.warning(f"⚠️ Límite Gmail detectado en item {idx if indexed else '?'}: {e}")
-                            rate_limited = True
-                            if indexed:
-                                remaining_pending.append(item)
-                        else:
-                            logger.error(f"❌ Error SMTP al enviar a {to_emails}: {e}")
-                            stats["fallidos"] += 1
-                            stats["detalles"].append({"to": to_emails, "status": "error", "error": str(e)})
-
-                    except Exception as e:
-                        logger.error(f"❌ Error al enviar a {email_data.get('to_emails')}: {e}")
-                        stats["fallidos"] += 1
-                        stats["detalles"].append({"to": email_data.get('to_emails', []), "status": "error", "error": str(e)})
-
-                logger.info(
-                    f"📊 Lote completado (cuenta {account.get('id', '?')}): "
-                    f"{stats['exitosos']} exitosos, {stats['fallidos']} fallidos"
-                )
+            connections = await self._open_smtp_pool(account, pool_size)
 
-                if indexed:
-                    return rate_limited, stats, remaining_pending
-                return stats, []
-
-        except smtplib.SMTPAuthenticationError as e:
+        except aiosmtplib.SMTPAuthenticationError as e:
             logger.error(f"❌ Error de autenticación SMTP (cuenta {account.get('id', '?')}): {e}")
             if indexed:
                 # Auth failure — no retries, all pending fail
                 for item in emails:
                     _, email_data = item
                     stats["fallidos"] += 1
-                    stats["detalles"].append({
-                        "to": email_data.get("to_emails", []),
-                        "status": "error_autenticacion"
-                    })
+                    stats["detalles"].append(_batch_detail(email_data, "error_autenticacion"))
                 return False, stats, []
             stats["fallidos"] = stats["total"]
             return stats, []
@@ -701,11 +739,96 @@ class EmailSender:
                 for item in emails:
                     _, email_data = item
                     stats["fallidos"] += 1
-                    stats["detalles"].append({
-                        "to": email_data.get("to_emails", []),
-                        "status": "error_conexion",
-                        "error": str(e)
-                    })
+                    stats["detalles"].append(_batch_detail(email_data, "error_conexion", str(e)))
                 return False, stats, []
             stats["fallidos"] += len(emails)
             return stats, []
+
+        logger.info(
+            f"✅ {len(connections)} conexión(es) SMTP establecidas con cuenta {account.get('id', '?')}, "
+            f"enviando {len(emails)} emails..."
+        )
+
+        # Iterador compartido por todas las conexiones: cada email se toma una sola vez
+        items = iter(enumerate(emails))
+        outcomes: Dict[int, Dict[str, Any]] = {}
+        remaining_pending: List[Tuple[int, Any]] = []
+        rate_limited = False
+
+        async def _drain(smtp: aiosmtplib.SMTP):
+            nonlocal rate_limited
+            for pos, item in items:
+                email_data = item[1] if indexed else item
+
+                if rate_limited:
+                    if indexed:
+                        remaining_pending.append((pos, item))
+                    continue
+
+                to_emails = email_data.get('to_emails', [])
+                try:
+                    message = self._build_message(
+                        to_emails, email_data.get('subject', ''), email_data.get('html_content', ''),
+                        account['from_email'], account['from_name'],
+                        email_data.get('text_content'), None, True
+                    )
+
+                    await smtp.sendmail(account['from_email'], to_emails, message.as_bytes())
+                    stats["exitosos"] += 1
+                    outcomes[pos] = _batch_detail(email_data, "exitoso")
+
+                except (aiosmtplib.SMTPDataError, aiosmtplib.SMTPSenderRefused, aiosmtplib.SMTPRecipientsRefused) as e:
+                    if _is_gmail_limit_error(e):
+                        logger.warning(f"⚠️ Límite Gmail detectado en item {item[0] if indexed else pos}: {e}")
+                        rate_limited = True
+                        if indexed:
+                            remaining_pending.append((pos, item))
+                    else:
+                        logger.error(f"❌ Error SMTP al enviar a {to_emails}: {e}")
+                        stats["fallidos"] += 1
+                        status = "rechazado" if _is_permanent_rejection(e) else "error"
+                        outcomes[pos] = _batch_detail(email_data, status, str(e))
+
+                except aiosmtplib.SMTPServerDisconnected as e:
+                    logger.warning(f"⚠️ Conexión SMTP cerrada al enviar a {to_emails}: {e}")
+                    stats["fallidos"] += 1
+                    outcomes[pos] = _batch_detail(email_data, "error", str(e))
+                    try:
+                        await smtp.connect()
+                        await smtp.login(account['user'], account['password'])
+                    except Exception as reconnect_error:
+                        # Las demás conexiones siguen tomando emails del iterador compartido
+                        logger.warning(f"⚠️ No se pudo reconectar SMTP: {reconnect_error}")
+                        return
+
+                except Exception as e:
+                    logger.error(f"❌ Error al enviar a {to_emails}: {e}")
+                    stats["fallidos"] += 1
+                    outcomes[pos] = _batch_detail(email_data, "error", str(e))
+
+        try:
+            await asyncio.gather(*(_drain(smtp) for smtp in connections))
+        finally:
+            await asyncio.gather(
+                *(self._close_smtp_connection(smtp) for smtp in connections),
+                return_exceptions=True
+            )
+
+        # Emails que quedaron sin tomar porque todas las conexiones se cayeron
+        for pos, item in items:
+            email_data = item[1] if indexed else item
+            stats["fallidos"] += 1
+            outcomes[pos] = _batch_detail(email_data, "error_conexion", "Conexión SMTP perdida")
+
+        # Detalles en el mismo orden de entrada, sin importar qué conexión terminó primero
+        stats["detalles"].extend(outcomes[pos] for pos in sorted(outcomes))
+
+        logger.info(
+            f"📊 Lote completado (cuenta {account.get('id', '?')}): "
+            f"{stats['exitosos']} exitosos, {stats['fallidos']} fallidos"
+        )
+
+        if indexed:
+            remaining_pending.sort(key=lambda entry: entry[0])
+            return rate_limited, stats, [item for _, item in remaining_pending]
+        return stats, []
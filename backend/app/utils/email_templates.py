@@ -0,0 +1,48 @@
+"""
+Entorno Jinja2 compartido para las plantillas de correo.
+
+Las plantillas se compilan una sola vez por proceso y el bytecode se guarda en
+disco para que otros procesos (workers de Gunicorn y Celery) no las recompilen.
+Solo en desarrollo se revisa la fecha de modificación de los archivos.
+"""
+from pathlib import Path
+
+from app.core.config import settings
+
+TEMPLATES_DIR = Path(__file__).parent.parent / "templates"
+
+_environment = None
+
+
+def get_template_environment():
+    """Retorna el Environment de Jinja2 del proceso (lo crea en el primer uso)"""
+    global _environment
+    if _environment is None:
+        from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+        _environment = Environment(
+            loader=FileSystemLoader(str(TEMPLATES_DIR), encoding="utf-8"),
+            bytecode_cache=FileSystemBytecodeCache(pattern="giramaster_%s.cache"),
+            auto_reload=settings.ENVIRONMENT == "development",
+        )
+    return _environment
+
+
+def get_email_template(template_name: str):
+    """
+    Retorna la plantilla compilada (desde la caché en memoria si ya se cargó).
+
+    Raises:
+        FileNotFoundError: Si la plantilla no existe en app/templates
+    """
+    from jinja2 import TemplateNotFound
+
+    try:
+        return get_template_environment().get_template(template_name)
+    except TemplateNotFound as e:
+        raise FileNotFoundError(str(TEMPLATES_DIR / template_name)) from e
+
+
+def render_email_template(template_name: str, **context) -> str:
+    """Renderiza una plantilla de correo con el contexto dado"""
+    return get_email_template(template_name).render(**context)
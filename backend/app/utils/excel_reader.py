@@ -0,0 +1,63 @@
+"""
+Lectura de archivos Excel fila por fila con openpyxl en modo read-only.
+Evita construir DataFrames: la memoria se mantiene plana sin importar el número de filas.
+"""
+from io import BytesIO
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+class ExcelRowReader:
+    """
+    Lector en streaming de la primera hoja de un Excel.
+
+    La primera fila se toma como encabezado y cada fila siguiente se entrega
+    como dict {columna: valor}. Las filas completamente vacías se omiten.
+
+    Uso:
+        with ExcelRowReader(file_content) as reader:
+            missing = reader.missing_columns([...])
+            for row_number, row in reader.rows():
+                ...
+    """
+
+    def __init__(self, file_content: bytes):
+        from openpyxl import load_workbook
+
+        self._workbook = load_workbook(BytesIO(file_content), read_only=True, data_only=True)
+        self._sheet = self._workbook.worksheets[0]
+        self._rows = self._sheet.iter_rows(values_only=True)
+
+        header = next(self._rows, None) or ()
+        self.columns: List[str] = [str(value).strip() if value is not None else "" for value in header]
+
+    def __enter__(self) -> "ExcelRowReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._workbook.close()
+
+    @property
+    def total_rows(self) -> int:
+        """Filas de datos según la dimensión declarada en la hoja (0 si no la declara)."""
+        max_row = self._sheet.max_row
+        return max(max_row - 1, 0) if max_row else 0
+
+    def missing_columns(self, required: List[str]) -> List[str]:
+        """Retorna las columnas requeridas que no están en el encabezado."""
+        present = set(self.columns)
+        return [column for column in required if column not in present]
+
+    def rows(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Genera (número de fila en la hoja, dict de valores) para cada fila con datos."""
+        columns = self.columns
+        for row_number, values in enumerate(self._rows, start=2):
+            if values is None or all(value is None or value == "" for value in values):
+                continue
+            yield row_number, {
+                column: value
+                for column, value in zip(columns, values)
+                if column
+            }
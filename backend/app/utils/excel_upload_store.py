@@ -0,0 +1,33 @@
+"""
+Almacenamiento temporal en Redis de los Excel subidos para procesarse en Celery.
+
+Vive fuera de app.tasks para que la API no cargue el paquete de tareas (ni sus
+dependencias de worker) solo para guardar el archivo.
+"""
+
+EXCEL_UPLOAD_KEY = "excel_upload"
+EXCEL_UPLOAD_TTL = 7200
+EXCEL_UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+async def store_excel_upload(file, task_id: str) -> str:
+    """
+    Guarda el archivo subido en Redis (con TTL) por trozos y retorna la referencia
+    que recibe la tarea, para no enviar el Excel en base64 por el broker.
+
+    Args:
+        file: UploadFile de FastAPI
+        task_id: ID de la tarea de carga
+
+    Returns:
+        Key de Redis con el contenido del archivo
+    """
+    from app.core.redis_client import get_redis_bytes
+
+    r = get_redis_bytes()
+    key = f"{EXCEL_UPLOAD_KEY}:{task_id}"
+    await r.delete(key)
+    while chunk := await file.read(EXCEL_UPLOAD_CHUNK_SIZE):
+        await r.append(key, chunk)
+    await r.expire(key, EXCEL_UPLOAD_TTL)
+    return key
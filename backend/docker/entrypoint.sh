@@ -5,6 +5,9 @@ SERVICE="${SERVICE:-backend}"
 
 case "$SERVICE" in
     backend)
+        if [ "${WEB_CONCURRENCY:-1}" -gt 1 ]; then
+            exec gunicorn app.main:app -c gunicorn.conf.py
+        fi
         exec uvicorn app.main:app --host 0.0.0.0 --port 8000
         ;;
     celery)
@@ -13,9 +16,12 @@ case "$SERVICE" in
     celery-beat)
         exec celery -A app.celery_app beat -l info --scheduler celery.beat:PersistentScheduler
         ;;
+    init-db)
+        exec python -m app.cli init-db
+        ;;
     *)
         echo "Unknown service: $SERVICE"
-        echo "Valid services: backend, celery, celery-beat"
+        echo "Valid services: backend, celery, celery-beat, init-db"
         exit 1
         ;;
 esac
@@ -0,0 +1,45 @@
+"""
+Configuración de gunicorn para servir la API con varios procesos
+
+Uso: gunicorn app.main:app -c gunicorn.conf.py
+
+El número de workers sale de WEB_CONCURRENCY. La creación de tablas y la
+semilla se ejecutan una sola vez en el proceso master antes de hacer fork,
+y los workers arrancan solo verificando la conexión.
+"""
+import asyncio
+
+from app.core.config import settings
+
+bind = f"{settings.HOST}:{settings.PORT}"
+workers = settings.WEB_CONCURRENCY
+worker_class = "uvicorn.workers.UvicornWorker"
+loglevel = settings.LOG_LEVEL.lower()
+accesslog = "-" if settings.ENVIRONMENT == "development" else None
+
+# Los workers uvicorn reportan heartbeat desde el event loop, así que las
+# conexiones SSE largas no disparan este timeout
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+
+
+def on_starting(server):
+  """Inicializa la base de datos una sola vez, antes de crear los workers"""
+  if not settings.DB_INIT_ON_STARTUP:
+    return
+
+  from app.core.database import init_db, close_db
+
+  async def _init():
+    try:
+      await init_db()
+    finally:
+      # No heredar conexiones abiertas del master en los workers
+      await close_db()
+
+  asyncio.run(_init())
+  server.log.info("Base de datos inicializada en el master")
+
+  # Los workers se crean con fork y heredan este valor
+  settings.DB_INIT_ON_STARTUP = False
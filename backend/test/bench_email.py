@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Benchmark del pipeline de correo contra un sink SMTP local (aiosmtpd)
+
+Levanta un servidor SMTP en 127.0.0.1 que acepta AUTH sin TLS y cuenta los
+mensajes por cuenta, y registra N cuentas SMTP ficticias que apuntan a él
+(reemplazando en memoria el registro de SystemConfigService, sin tocar
+tbl_system_config). Con --limit cada cuenta responde como Gmail
+("550 5.4.5 Daily user sending limit exceeded") después de aceptar ese número
+de mensajes, para ejercitar el failover entre cuentas.
+
+Escenarios:
+  batch  EmailSender.send_batch_optimized sobre N destinatarios sintéticos.
+         No necesita base de datos ni Redis. Fases: render, build, send.
+  task   send_bulk_emails (prepara y encola en el outbox) seguido de
+         dispatch_email_outbox, ejecutados en este proceso con la base de datos
+         y el Redis del .env y los residentes de --unit-id. Escribe tokens,
+         notificaciones y filas del outbox: usar solo con una base de desarrollo
+         y sin workers/beat de Celery apuntando a ella (enviarían por Gmail).
+
+Uso (desde backend/, con el .env cargado y `pip install aiosmtpd`):
+    python test/bench_email.py batch -n 2000 --accounts 3 --limit 800
+    python test/bench_email.py batch -n 500 --latency-ms 150
+    python test/bench_email.py task --unit-id 1 -n 500
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ["SMTP_STARTTLS"] = "false"
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult, LoginPassword
+
+from app.core.config import settings
+from app.services.system_config_service import SystemConfigService
+
+# IDs altos para no compartir token bucket en Redis con las cuentas reales
+SINK_ACCOUNT_BASE_ID = 900
+GMAIL_LIMIT_REPLY = "550 5.4.5 Daily user sending limit exceeded."
+
+
+class SinkHandler:
+    """Acepta y descarta mensajes; simula el límite diario de Gmail por cuenta"""
+
+    def __init__(self, limit_per_account: int = 0, latency_ms: int = 0):
+        self.limit_per_account = limit_per_account
+        self.latency = latency_ms / 1000
+        self.accepted = Counter()
+        self.rejected = Counter()
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.accepted.clear()
+            self.rejected.clear()
+
+    async def handle_DATA(self, server, session, envelope):
+        auth = session.auth_data
+        login = auth.login.decode() if isinstance(auth, LoginPassword) else str(auth)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        with self._lock:
+            if self.limit_per_account and self.accepted[login] >= self.limit_per_account:
+                self.rejected[login] += 1
+                return GMAIL_LIMIT_REPLY
+            self.accepted[login] += 1
+        return "250 OK"
+
+
+def _authenticator(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=True, auth_data=auth_data)
+
+
+class SinkAccounts:
+    """Registro en memoria de cuentas SMTP que apuntan al sink"""
+
+    def __init__(self, port: int, count: int, daily_limit: int):
+        self.accounts = [
+            {
+                "id": SINK_ACCOUNT_BASE_ID + i,
+                "name": f"Sink {i}",
+                "host": "127.0.0.1",
+                "port": port,
+                "user": f"sink{i}@bench.local",
+                "password": "bench",
+                "from_email": f"sink{i}@bench.local",
+                "from_name": "GIRAMASTER Bench",
+                "daily_limit": daily_limit,
+                "email_enabled": True,
+            }
+            for i in range(1, count + 1)
+        ]
+        self.exceeded = set()
+
+    def install(self):
+        """Reemplaza los métodos de cuentas SMTP de SystemConfigService por este registro"""
+        registry = self
+
+        async def get_available_smtp_accounts(service, limit=None):
+            available = [a for a in registry.accounts if a["id"] not in registry.exceeded]
+            return available[:limit] if limit else available
+
+        async def get_available_smtp_account(service):
+            available = await get_available_smtp_accounts(service, limit=1)
+            return available[0] if available else None
+
+        async def mark_smtp_account_exceeded(service, account_id):
+            registry.exceeded.add(account_id)
+
+        SystemConfigService.get_available_smtp_accounts = get_available_smtp_accounts
+        SystemConfigService.get_available_smtp_account = get_available_smtp_account
+        SystemConfigService.mark_smtp_account_exceeded = mark_smtp_account_exceeded
+
+
+def _template_context(i: int) -> dict:
+    return {
+        "firstname": f"Residente{i}",
+        "lastname": "Bench",
+        "username": f"residente{i}",
+        "password": "abcd1234!@",
+        "residential_unit_name": "Conjunto Bench",
+        "apartment_number": str(100 + i),
+        "voting_weight": 1.0,
+        "user_email": f"residente{i}@bench.local",
+        "phone": "3000000000",
+        "auto_login_url": f"http://bench.local/auto-login/token-{i}",
+        "support_name": "Soporte",
+        "support_email": "soporte@bench.local",
+        "support_phone": None,
+        "support_whatsapp": None,
+    }
+
+
+def _report(name: str, count: int, seconds: float):
+    rate = count / seconds if seconds > 0 else 0
+    print(f"  {name:10} {seconds:8.3f} s  {rate:10.1f} msg/s")
+
+
+def _report_sink(handler: SinkHandler, registry: SinkAccounts):
+    for account in registry.accounts:
+        user = account["user"]
+        flag = " (excedida)" if account["id"] in registry.exceeded else ""
+        print(f"  {user:24} aceptados={handler.accepted[user]:6} rechazados={handler.rejected[user]:4}{flag}")
+
+
+async def bench_batch(args, handler: SinkHandler, registry: SinkAccounts):
+    from app.core.exceptions import AllSmtpAccountsExceededException
+    from app.utils.email_sender import EmailSender
+    from app.utils.email_templates import render_email_template
+
+    n = args.num
+
+    start = time.perf_counter()
+    html = [render_email_template("email_coproprietario_credentials.html", **_template_context(i)) for i in range(n)]
+    render_s = time.perf_counter() - start
+
+    emails = [
+        {
+            "to_emails": [f"residente{i}@bench.local"],
+            "subject": "Bienvenido a GIRAMASTER - Conjunto Bench",
+            "html_content": html[i],
+            "notification_id": i + 1,
+        }
+        for i in range(n)
+    ]
+
+    # Cualquier objeto no nulo activa el modo multi-cuenta (las cuentas salen del registro)
+    sender = EmailSender(db=object())
+    account = registry.accounts[0]
+
+    start = time.perf_counter()
+    for email in emails:
+        sender._build_message(
+            email["to_emails"], email["subject"], email["html_content"],
+            account["from_email"], account["from_name"]
+        ).as_bytes()
+    build_s = time.perf_counter() - start
+
+    handler.reset()
+    start = time.perf_counter()
+    try:
+        stats = await sender.send_batch_optimized(emails)
+        outcome = Counter(detail["status"] for detail in stats["detalles"])
+    except AllSmtpAccountsExceededException as e:
+        outcome = Counter({"limite_excedido": e.details.get("emails_no_enviados", 0)})
+    send_s = time.perf_counter() - start
+    delivered = sum(handler.accepted.values())
+
+    print(
+        f"batch: {n} correos, {len(registry.accounts)} cuentas, "
+        f"{settings.SMTP_CONNECTIONS_PER_ACCOUNT} conexiones/cuenta, "
+        f"límite={args.limit or '∞'}, latencia={args.latency_ms} ms"
+    )
+    _report("render", n, render_s)
+    _report("build", n, build_s)
+    _report("send", delivered, send_s)
+    _report("total", delivered, render_s + send_s)
+    print(f"  resultados: {dict(outcome)}")
+    _report_sink(handler, registry)
+
+
+def bench_task(args, handler: SinkHandler, registry: SinkAccounts):
+    import app.services.email_outbox_service as email_outbox_service
+    import app.tasks.email_tasks as email_tasks
+    from sqlalchemy import select
+    from app.models.user_residential_unit_model import UserResidentialUnitModel
+    from app.services.email_outbox_service import SmtpTokenBucket
+    from app.tasks.worker_runtime import run_async, get_task_redis, get_task_session_maker
+
+    # Todo en este proceso: sin subtareas ni dispatcher por el broker
+    settings.EMAIL_FANOUT_CHUNK_SIZE = 10 ** 9
+    email_tasks.request_outbox_dispatch = lambda: None
+    email_outbox_service.request_outbox_dispatch = lambda countdown=None: None
+
+    async def _resident_ids():
+        async with get_task_session_maker()() as db:
+            result = await db.execute(
+                select(UserResidentialUnitModel.int_user_id)
+                .where(UserResidentialUnitModel.int_residential_unit_id == args.unit_id)
+                .limit(args.num)
+            )
+            return [row[0] for row in result.all()]
+
+    async def _reset_buckets():
+        r = get_task_redis()
+        await r.delete(*(f"{SmtpTokenBucket.KEY_PREFIX}:{a['id']}" for a in registry.accounts))
+
+    async def _progress(task_id):
+        data = await get_task_redis().hgetall(f"email_task:{task_id}")
+        return {k.decode(): v.decode() for k, v in data.items()}
+
+    resident_ids = run_async(_resident_ids())
+    if not resident_ids:
+        print(f"La unidad {args.unit_id} no tiene residentes")
+        return
+    run_async(_reset_buckets())
+
+    task_id = f"bench-{uuid.uuid4()}"
+    handler.reset()
+
+    start = time.perf_counter()
+    prepared = email_tasks.send_bulk_emails.run(resident_ids, args.unit_id, task_id, "http://bench.local")
+    prepare_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    dispatched = email_tasks.dispatch_email_outbox.run(max_rounds=10 ** 6)
+    dispatch_s = time.perf_counter() - start
+    delivered = sum(handler.accepted.values())
+
+    print(
+        f"task: {len(resident_ids)} residentes de la unidad {args.unit_id}, "
+        f"{len(registry.accounts)} cuentas, límite={args.limit or '∞'}, latencia={args.latency_ms} ms"
+    )
+    _report("prepare", len(resident_ids), prepare_s)
+    _report("dispatch", delivered, dispatch_s)
+    _report("total", delivered, prepare_s + dispatch_s)
+    print(f"  send_bulk_emails: {prepared}")
+    print(f"  dispatcher: {dispatched}")
+    print(f"  progreso: {run_async(_progress(task_id))}")
+    _report_sink(handler, registry)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de envío de correos contra un sink SMTP local")
+    parser.add_argument("scenario", choices=["batch", "task"])
+    parser.add_argument("-n", "--num", type=int, default=1000, help="Destinatarios sintéticos (o máximo de residentes en task)")
+    parser.add_argument("--accounts", type=int, default=2, help="Cuentas SMTP que apuntan al sink")
+    parser.add_argument("--limit", type=int, default=0, help="Mensajes aceptados por cuenta antes del error 5.4.5 (0 = sin límite)")
+    parser.add_argument("--daily-limit", type=int, default=10 ** 6, help="DAILY_LIMIT de las cuentas (token bucket del dispatcher)")
+    parser.add_argument("--latency-ms", type=int, default=0, help="Latencia simulada por mensaje en el sink")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--unit-id", type=int, help="Unidad residencial para el escenario task")
+    args = parser.parse_args()
+
+    if args.scenario == "task" and not args.unit_id:
+        parser.error("el escenario task requiere --unit-id")
+
+    settings.SMTP_STARTTLS = False
+    handler = SinkHandler(limit_per_account=args.limit, latency_ms=args.latency_ms)
+    controller = Controller(
+        handler,
+        hostname="127.0.0.1",
+        port=args.port,
+        authenticator=_authenticator,
+        auth_require_tls=False,
+    )
+    controller.start()
+
+    registry = SinkAccounts(args.port, args.accounts, args.daily_limit)
+    registry.install()
+
+    try:
+        if args.scenario == "batch":
+            asyncio.run(bench_batch(args, handler, registry))
+        else:
+            bench_task(args, handler, registry)
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
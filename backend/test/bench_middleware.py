@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark de los middlewares de seguridad y rate limiting
+
+Compara requests/segundo de la pila anterior (BaseHTTPMiddleware) contra la
+implementación ASGI pura de app/middleware, llamando a la aplicación ASGI
+directamente (sin red) para medir solo el overhead de los middlewares.
+
+Uso (desde backend/, con el .env cargado):
+    RATE_LIMIT_BACKEND=memory python test/bench_middleware.py [num_requests]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("RATE_LIMIT_BACKEND", "memory")
+
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from app.core.security import rate_limiter
+from app.middleware.rate_limit import RateLimitMiddleware
+from app.middleware.security_headers import SecurityHeadersMiddleware
+
+NUM_REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+# Límite alto para que ambas pilas recorran siempre la ruta permitida (sin 429)
+_get_limits = rate_limiter.get_limits_for_endpoint
+rate_limiter.get_limits_for_endpoint = lambda method, path: {
+    **_get_limits(method, path), "max_requests": 10 ** 9
+}
+
+
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    """Versión anterior (BaseHTTPMiddleware) reducida a la ruta feliz"""
+
+    async def dispatch(self, request, call_next):
+        limits = rate_limiter.get_limits_for_endpoint(request.method, request.url.path)
+        _, info = await rate_limiter.is_allowed(
+            key=f"general_{request.method}_{request.client.host}",
+            max_requests=limits["max_requests"],
+            window_minutes=limits["window_minutes"]
+        )
+        response = await call_next(request)
+        response.headers["X-RateLimit-Limit"] = str(limits["max_requests"])
+        response.headers["X-RateLimit-Remaining"] = str(info["remaining_requests"])
+        response.headers["X-RateLimit-Reset"] = str(info["reset_time"])
+        return response
+
+
+class LegacySecurityHeadersMiddleware(BaseHTTPMiddleware):
+    """Versión anterior (BaseHTTPMiddleware): headers copiados de la nueva"""
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.reference = SecurityHeadersMiddleware(app)
+
+    async def dispatch(self, request, call_next):
+        response = await call_next(request)
+        for name, value in self.reference.headers.items():
+            response.headers[name] = value
+        for name, value in self.reference.default_headers.items():
+            response.headers[name] = value
+        return response
+
+
+async def ping(request):
+    return JSONResponse({"ok": True})
+
+
+async def events(request):
+    async def stream():
+        for i in range(3):
+            yield f"data: {i}\n\n"
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+def build_app(rate_limit_cls, security_cls):
+    app = Starlette(routes=[Route("/ping", ping), Route("/events", events)])
+    app.add_middleware(rate_limit_cls)
+    app.add_middleware(security_cls)
+    return app
+
+
+async def run(app, path: str, num_requests: int) -> float:
+    """Ejecuta num_requests GET contra la app ASGI y retorna requests/segundo"""
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    def scope():
+        return {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"bench")],
+            "client": ("127.0.0.1", 50000),
+            "server": ("bench", 80),
+        }
+
+    # Calentamiento (construcción de la pila de middlewares)
+    for _ in range(100):
+        await app(scope(), receive, send)
+
+    start = time.perf_counter()
+    for _ in range(num_requests):
+        await app(scope(), receive, send)
+    return num_requests / (time.perf_counter() - start)
+
+
+async def main():
+    legacy = build_app(LegacyRateLimitMiddleware, LegacySecurityHeadersMiddleware)
+    asgi = build_app(RateLimitMiddleware, SecurityHeadersMiddleware)
+
+    print(f"Requests por escenario: {NUM_REQUESTS} (backend rate limit: {rate_limiter.backend})")
+    for path in ("/ping", "/events"):
+        before = await run(legacy, path, NUM_REQUESTS)
+        after = await run(asgi, path, NUM_REQUESTS)
+        print(
+            f"{path:8} BaseHTTPMiddleware: {before:10.0f} req/s | "
+            f"ASGI puro: {after:10.0f} req/s | x{after / before:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())